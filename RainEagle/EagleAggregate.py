@@ -0,0 +1,174 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import time
+import calendar
+from collections import namedtuple
+
+__all__ = ['SummationAggregator', 'BucketTotal']
+
+BucketTotal = namedtuple('BucketTotal',
+                         ['start', 'end', 'delivered', 'received', 'count'])
+BucketTotal.__doc__ = """
+    totals for one bucket of SummationAggregator
+
+        start, end      bucket interval ( unix time, end exclusive )
+        delivered       kWh delivered during the bucket
+        received        kWh received during the bucket
+        count           number of readings in the bucket
+"""
+
+
+class SummationAggregator:
+    """
+        Single pass aggregation of summation readings
+
+        Feed it ( timestamp, delivered, received ) records in time
+        order, eg: SummationRecords from Eagle.iter_history() or rows
+        from a MeterStore, and it keeps the deltas between readings,
+        the largest deltas and the totals per time bucket.
+
+        args:
+            bucket      "day", "hour" or a number of seconds
+            localtime   bucket on local time ( default ) rather than UTC
+            max_delta   deltas of max_delta or more ( meter resets ) are
+                        left out of the max_delta_* values
+
+        Only O(1) state is kept; the bucket boundaries are computed
+        once per bucket, not once per record.  Local time buckets
+        follow daylight saving time: the days it starts and ends are
+        23 and 25 hours long, and a bucket of seconds that the change
+        cuts through is shortened so buckets never overlap.
+
+            agg = SummationAggregator("day")
+            for rec in eg.iter_history() :
+                done = agg.feed(rec)
+                if done :
+                    print(done)
+            print(agg.close())
+    """
+    def __init__(self, bucket="day", localtime=True, max_delta=1000):
+        if bucket not in ("day", "hour") :
+            bucket = int(bucket)
+            if bucket <= 0 :
+                raise ValueError("bucket must be 'day', 'hour' or a positive number of seconds")
+        self.bucket = bucket
+        self.localtime = localtime
+        self.max_delta = max_delta
+
+        self.last_delivered = None
+        self.last_received = None
+        self.delta_delivered = 0.0
+        self.delta_received = 0.0
+        self.max_delta_delivered = 0.0
+        self.max_delta_received = 0.0
+
+        self.bucket_start = None
+        self.bucket_end = None
+        self.bucket_delivered = 0.0
+        self.bucket_received = 0.0
+        self.bucket_count = 0
+
+    def _bounds(self, ts):
+        """
+            returns (start, end) of the bucket holding ts
+        """
+        ts = int(ts)
+        if self.localtime :
+            tm = time.localtime(ts)
+            to_ts = time.mktime
+        else :
+            tm = time.gmtime(ts)
+            to_ts = calendar.timegm
+
+        if self.bucket == "day" :
+            start = to_ts((tm.tm_year, tm.tm_mon, tm.tm_mday, 0, 0, 0, 0, 0, -1))
+            # mktime normalizes the day after the end of the month
+            end = to_ts((tm.tm_year, tm.tm_mon, tm.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+        elif self.bucket == "hour" :
+            start = ts - tm.tm_min * 60 - tm.tm_sec
+            end = start + 3600
+        else :
+            offset = tm.tm_gmtoff if self.localtime else 0
+            start = ts - (ts + offset) % self.bucket
+            end = start + self.bucket
+        return int(start), int(end)
+
+    def feed(self, rec):
+        """
+            add one ( timestamp, delivered, received ) reading
+
+            the deltas to the previous reading are left in
+            delta_delivered and delta_received
+
+            returns the BucketTotal of the previous bucket when
+            rec is the first reading of a new bucket, otherwise None
+        """
+        ts, delivered, received = rec[0], rec[1], rec[2]
+
+        if self.last_delivered is None :
+            dd = dr = 0.0
+        else :
+            dd = delivered - self.last_delivered
+            dr = received - self.last_received
+        self.last_delivered = delivered
+        self.last_received = received
+        self.delta_delivered = dd
+        self.delta_received = dr
+
+        if self.max_delta_delivered < dd < self.max_delta :
+            self.max_delta_delivered = dd
+        if self.max_delta_received < dr < self.max_delta :
+            self.max_delta_received = dr
+
+        done = None
+        if self.bucket_start is None or not self.bucket_start <= ts < self.bucket_end :
+            prev_end = self.bucket_end
+            done = self._finish()
+            start, end = self._bounds(ts)
+            if prev_end is not None and start < prev_end <= ts :
+                # the utc offset changed since the previous bucket
+                start = prev_end
+            self.bucket_start, self.bucket_end = start, end
+
+        self.bucket_delivered += dd
+        self.bucket_received += dr
+        self.bucket_count += 1
+        return done
+
+    def _finish(self):
+        if not self.bucket_count :
+            return None
+        done = BucketTotal(self.bucket_start, self.bucket_end,
+                           self.bucket_delivered, self.bucket_received,
+                           self.bucket_count)
+        self.bucket_delivered = 0.0
+        self.bucket_received = 0.0
+        self.bucket_count = 0
+        return done
+
+    def close(self):
+        """
+            returns the BucketTotal of the current ( partial ) bucket,
+            or None if there is none
+        """
+        done = self._finish()
+        self.bucket_start = self.bucket_end = None
+        return done
+
+    def aggregate(self, records):
+        """
+            feed all records, generate the BucketTotal of each
+            bucket as it completes ( the last one is partial )
+        """
+        feed = self.feed
+        for rec in records :
+            done = feed(rec)
+            if done is not None :
+                yield done
+        done = self.close()
+        if done is not None :
+            yield done
@@ -0,0 +1,511 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import asyncio
+import json
+import xml.etree.ElementTree as ET
+from time import perf_counter
+
+from .EagleClass import Eagle, RainEagleResponseError, _copy_result, _idempotent, \
+    _et2d, _soc_time, _soc_hex
+from .EagleDecode import decode_summation
+from .EagleFlight import AsyncSingleFlight
+from .EagleSocket import _wrap_start, _wrap_end
+from .EagleHTTP import CGI_PATH, _split_addr
+from .EagleDeadline import AsyncHedger, deadline, current, budget, check
+
+__all__ = ['AsyncEagle', 'AsyncHTTPTransport', 'AsyncSocketTransport']
+
+
+class AsyncHTTPTransport:
+    """
+        Pool of keep-alive HTTP connections to EAGLE gateways
+        built on asyncio streams
+
+        args:
+            maxsize     idle connections kept per gateway
+                        (0 closes the connection after every request)
+            timeout     seconds allowed for each request
+
+        see also HTTPTransport
+    """
+    def __init__(self, maxsize=1, timeout=10):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._idle = dict()
+
+    async def _get_conn(self, addr):
+        """
+            returns a (reader, writer, reused) tuple
+        """
+        idle = self._idle.get(addr)
+        while idle :
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof() :
+                return reader, writer, True
+            writer.close()
+        host, port = _split_addr(addr)
+        reader, writer = await asyncio.open_connection(host, port)
+        return reader, writer, False
+
+    def _put_conn(self, addr, reader, writer):
+        idle = self._idle.setdefault(addr, [])
+        if len(idle) < self.maxsize :
+            idle.append((reader, writer))
+        else :
+            writer.close()
+
+    async def request(self, addr, body, headers=None, path=CGI_PATH,
+                      timing=None, idempotent=False):
+        """
+            POST body to gateway at addr
+            ( timing and idempotent, see HTTPTransport.request() )
+
+            returns (http_status, response_body) tuple
+        """
+        hdrs = {"Host": addr,
+                "Content-Type": "application/x-www-form-urlencoded",
+                "Content-Length": str(len(body))}
+        if self.maxsize < 1 :
+            hdrs["Connection"] = "close"
+        if headers :
+            hdrs.update(headers)
+
+        head = ["POST {0} HTTP/1.1".format(path)]
+        for k, v in hdrs.items() :
+            if isinstance(v, bytes) :
+                v = v.decode('latin-1')
+            head.append("{0}: {1}".format(k, v))
+        req = ("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body
+
+        if timing is not None :
+            timing['request_bytes'] = len(body)
+        timeout = budget(current(), self.timeout)
+        if timeout :
+            return await asyncio.wait_for(
+                self._request(addr, req, timing, idempotent), timeout)
+        return await self._request(addr, req, timing, idempotent)
+
+    async def _request(self, addr, req, timing=None, idempotent=False):
+        if timing is not None :
+            t0 = perf_counter()
+        while True :
+            reader, writer, reused = await self._get_conn(addr)
+            sent = False
+            try :
+                if timing is not None :
+                    timing['connect'] = 0.0 if reused else perf_counter() - t0
+                writer.write(req)
+                await writer.drain()
+                sent = True
+                status, will_close, the_page = await self._read_response(
+                    reader, timing, t0 if timing is not None else None)
+            except (ConnectionError, asyncio.IncompleteReadError) :
+                writer.close()
+                if reused and (idempotent or not sent) :
+                    continue
+                raise
+            except BaseException :
+                # includes cancellation by wait_for()
+                writer.close()
+                raise
+            break
+
+        if will_close :
+            writer.close()
+        else :
+            self._put_conn(addr, reader, writer)
+
+        if timing is not None :
+            timing['response_bytes'] = len(the_page)
+        return status, the_page
+
+    @staticmethod
+    async def _read_response(reader, timing=None, t0=None):
+        """
+            returns (http_status, will_close, body) tuple
+        """
+        status_line = await reader.readline()
+        if not status_line :
+            raise ConnectionResetError("connection closed by device")
+        if timing is not None :
+            timing['first_byte'] = perf_counter() - t0
+        version, status = status_line.split(None, 2)[:2]
+        status = int(status)
+
+        headers = dict()
+        while True :
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b"") :
+                break
+            k, _, v = line.decode('latin-1').partition(':')
+            headers[k.strip().lower()] = v.strip()
+
+        conn_hdr = headers.get('connection', '').lower()
+        if version == b"HTTP/1.0" :
+            will_close = conn_hdr != 'keep-alive'
+        else :
+            will_close = conn_hdr == 'close'
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked' :
+            chunks = []
+            while True :
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0 :
+                    # skip trailers
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b"") :
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            the_page = b"".join(chunks)
+        elif 'content-length' in headers :
+            the_page = await reader.readexactly(int(headers['content-length']))
+        else :
+            the_page = await reader.read()
+            will_close = True
+
+        return status, will_close, the_page
+
+    def close(self):
+        """
+            close all idle connections
+        """
+        idle, self._idle = self._idle, dict()
+        for conns in idle.values() :
+            for reader, writer in conns :
+                writer.close()
+
+
+class AsyncSocketTransport:
+    """
+        Transport for the socket API of the EAGLE ( port 5002 )
+        built on asyncio streams
+
+        see also SocketTransport
+    """
+    def __init__(self, timeout=10, bufsize=16384):
+        self.timeout = timeout
+        self.bufsize = bufsize
+
+    async def command(self, addr, port, body, timing=None):
+        """
+            send body to the device, returns the parsed
+            "Response" wrapper element
+        """
+        timeout = budget(current(), self.timeout)
+        if timeout :
+            return await asyncio.wait_for(
+                self._command(addr, port, body, timing), timeout)
+        return await self._command(addr, port, body, timing)
+
+    async def _command(self, addr, port, body, timing=None):
+        root = None
+        async for _, root in self.iterparse(addr, port, body, timing=timing) :
+            pass
+        return root
+
+    async def _recv(self, addr, port, body, timing=None):
+        """
+            async generator of the responce to body as it is received
+        """
+        host = _split_addr(addr)[0]
+        if timing is not None :
+            t0 = perf_counter()
+            received = 0
+        when = current()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, int(port)),
+            budget(when, self.timeout))
+        try :
+            if timing is not None :
+                timing['connect'] = perf_counter() - t0
+                timing['request_bytes'] = len(body)
+            writer.write(body)
+            await writer.drain()
+            while True :
+                # as the socket timeout of SocketTransport, a gateway
+                # that stalls part way through can't hang the reader
+                data = await asyncio.wait_for(reader.read(self.bufsize),
+                                              budget(when, self.timeout))
+                if not data :
+                    break
+                if timing is not None :
+                    if not received :
+                        timing['first_byte'] = perf_counter() - t0
+                    received += len(data)
+                    timing['response_bytes'] = received
+                yield data
+        finally :
+            writer.close()
+
+    async def iterparse(self, addr, port, body, events=("end",), timing=None):
+        """
+            async generator of (event, element) tuples
+            see SocketTransport.iterparse()
+
+            the timeout ( cut to the time left inside a deadline() )
+            applies to the connect and to every read
+        """
+        parser = ET.XMLPullParser(events)
+        parser.feed(_wrap_start)
+        chunks = self._recv(addr, port, body, timing)
+        try :
+            async for data in chunks :
+                parser.feed(data)
+                for ev in parser.read_events() :
+                    yield ev
+        finally :
+            await chunks.aclose()
+        parser.feed(_wrap_end)
+        for ev in parser.read_events() :
+            yield ev
+        parser.close()
+
+    async def read(self, addr, port, body, timing=None):
+        """
+            send body to the device, returns the raw responce bytes
+            ( the timeout applies to each read, as in iterparse() )
+        """
+        out = bytearray()
+        async for data in self._recv(addr, port, body, timing) :
+            out += data
+        return bytes(out)
+
+
+class AsyncEagle(Eagle):
+    """
+        asyncio version of Eagle
+
+        Takes the same args as Eagle and supports the same commands,
+        each command returns an awaitable :
+
+            eg = AsyncEagle(addr="10.1.1.39")
+            usage = await eg.get_usage_data()
+
+        AsyncEagle is always lazy, no I/O is done when the object is
+        created; the macid is determined ( and the firmware checked )
+        by the first command or an explicit "await eg.connect()"
+    """
+    _transport_class = AsyncHTTPTransport
+    _flight_class = AsyncSingleFlight
+    _soc_transport_class = AsyncSocketTransport
+    _hedge_class = AsyncHedger
+
+    def __init__(self, *args, **kwargs):
+        kwargs['lazy'] = True
+        self._connect_lock = asyncio.Lock()
+        Eagle.__init__(self, *args, **kwargs)
+
+    async def connect(self):
+        """
+            determine the macid ( if not given ) and check the firmware
+            version of the device
+        """
+        async with self._connect_lock :
+            if self._preloaded :
+                return
+            dev_fw_ver = self._load_identity()
+            if not self.macid :
+                self.device_info = json.loads(
+                    await self._send_http_comm("get_device_list"))
+                self.macid = self.device_info['device_mac_id[0]']
+                if self.debug :
+                    print("Init DeviceMacId = ", self.macid)
+            if self.checkfw :
+                if dev_fw_ver is None :
+                    mysetting = json.loads(
+                        await self._send_http_comm("get_setting_data"))
+                    dev_fw_ver = mysetting['device_fw_version']
+                self._check_firmware(dev_fw_ver)
+            self._save_identity(dev_fw_ver)
+            self._preloaded = True
+
+    async def close(self):
+        """
+            close any open connections to the device
+        """
+        self.transport.close()
+        if self._hedge is not None :
+            self._hedge.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _http_command(self, cmd, MacId=None, **kwargs):
+        with deadline(self.call_deadline) :
+            if not self._preloaded :
+                await self.connect()
+            key = self._command_key(cmd, MacId, kwargs)
+            generation = None
+            if self.cache is not None and self.cache.cacheable(cmd) :
+                generation = self.cache.generation
+                ret = self.cache.get(key)
+                if ret is not None :
+                    return _copy_result(ret)
+            fetch = self._fetch
+            if self._hedge is not None and _idempotent(cmd) :
+                fetch = self._hedged_fetch
+            if self._flight is not None and _idempotent(cmd) :
+                ret, shared = await self._flight.do(key, fetch, cmd, MacId, kwargs)
+                if shared :
+                    return _copy_result(ret)
+            else :
+                ret = await fetch(cmd, MacId, kwargs)
+            self._cache_update(key, cmd, ret, generation)
+            return ret
+
+    def _convert(self, ret, func):
+        async def _converted():
+            return func(await ret)
+        return _converted()
+
+    async def _fetch(self, cmd, MacId, kwargs):
+        if self.stats is None :
+            ret = json.loads(await self._send_http_comm(cmd, MacId=MacId,
+                                                        **kwargs))
+            check()
+            return ret
+        timing = self.stats.start(self.addr, cmd, "http")
+        try :
+            comm_responce = await self._send_http_comm(cmd, MacId=MacId,
+                                                       _timing=timing, **kwargs)
+            t = perf_counter()
+            ret = json.loads(comm_responce)
+            timing['decode'] = perf_counter() - t
+            check()
+        except BaseException as e :
+            # includes cancellation by a Fleet deadline
+            timing['error'] = e
+            raise
+        finally :
+            self.stats.observe(timing)
+        return ret
+
+    async def iter_history(self, start="0x00000000", end=None, macid=None,
+                           frequency=None):
+        """
+            async generator version of Eagle.iter_history()
+
+                async for rec in eg.iter_history(start=time.time() - 3600) :
+                    ...
+        """
+        if not self._preloaded :
+            await self.connect()
+        commstr = self._build_soc_command("get_history_data", MacId=macid,
+                                          StartTime=_soc_time(start),
+                                          EndTime=_soc_time(end),
+                                          Frequency=_soc_hex(frequency))
+        timing = None
+        if self.stats is not None :
+            timing = self.stats.start(self.addr, "get_history_data", "socket")
+        stack = []
+        try :
+            async for event, elem in self.soc.iterparse(self.addr, self.port,
+                                                        commstr.encode(),
+                                                        events=("start", "end"),
+                                                        timing=timing) :
+                if event == "start" :
+                    stack.append(elem)
+                    continue
+                stack.pop()
+                if elem.tag == "CurrentSummation" :
+                    yield decode_summation(elem)
+                    elem.clear()
+                    if stack :
+                        stack[-1].remove(elem)
+        except Exception as e :
+            if timing is not None :
+                timing['error'] = e
+            raise
+        finally :
+            if timing is not None :
+                self.stats.observe(timing)
+
+    async def get_history_raw(self, start="0x00000000", end=None, macid=None,
+                              frequency=None):
+        """
+            async version of Eagle.get_history_raw()
+        """
+        if not self._preloaded :
+            await self.connect()
+        commstr = self._build_soc_command("get_history_data", MacId=macid,
+                                          StartTime=_soc_time(start),
+                                          EndTime=_soc_time(end),
+                                          Frequency=_soc_hex(frequency))
+        timing = None
+        if self.stats is not None :
+            timing = self.stats.start(self.addr, "get_history_data", "socket")
+        try :
+            return await self.soc.read(self.addr, self.port, commstr.encode(),
+                                       timing=timing)
+        except Exception as e :
+            if timing is not None :
+                timing['error'] = e
+            raise
+        finally :
+            if timing is not None :
+                self.stats.observe(timing)
+
+    async def _soc_command(self, cmd, MacId=None, **kwargs):
+        with deadline(self.call_deadline) :
+            if not self._preloaded and cmd != "list_devices" :
+                await self.connect()
+            if self._hedge is not None and _idempotent(cmd) :
+                return await self._hedge.do(cmd, self._soc_fetch, cmd, MacId,
+                                            kwargs)
+            return await self._soc_fetch(cmd, MacId, kwargs)
+
+    async def _soc_fetch(self, cmd, MacId, kwargs):
+        if self.stats is None :
+            ret = _et2d(await self._send_soc_comm(cmd, MacId=MacId, **kwargs))
+            check()
+            return ret
+        timing = self.stats.start(self.addr, cmd, "socket")
+        try :
+            root = await self._send_soc_comm(cmd, MacId=MacId,
+                                             _timing=timing, **kwargs)
+            t = perf_counter()
+            ret = _et2d(root)
+            timing['decode'] = perf_counter() - t
+            check()
+        except BaseException as e :
+            timing['error'] = e
+            raise
+        finally :
+            self.stats.observe(timing)
+        return ret
+
+    async def _send_soc_comm(self, cmd, MacId=None, _timing=None, **kwargs):
+
+        commstr = self._build_soc_command(cmd, MacId, **kwargs)
+
+        if self.debug > 1 :
+            print(commstr)
+
+        return await self.soc.command(self.addr, self.port, commstr.encode(),
+                                      timing=_timing)
+
+    async def _send_http_comm(self, cmd, MacId=None, _timing=None, **kwargs):
+
+        commstr = self._build_command(cmd, MacId, **kwargs)
+
+        if self.debug > 1 :
+            print(commstr)
+
+        status, the_page = await self.transport.request(self.addr,
+                                                        commstr.encode(),
+                                                        self._auth_headers(),
+                                                        timing=_timing,
+                                                        idempotent=_idempotent(cmd))
+        if status != 200 :
+            raise RainEagleResponseError(
+                "{0} : HTTP status {1}".format(cmd, status))
+
+        return the_page.decode()
@@ -0,0 +1,226 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+__all__ = ['IdentityCache', 'ResponseCache']
+
+
+def _default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "RainEagle")
+
+
+def _write_json(path, data):
+    """
+        write data to path as json, via a temp file and rename
+        so readers never see a partial file
+    """
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.isdir(dirname) :
+        os.makedirs(dirname, exist_ok=True)
+    from tempfile import mkstemp
+    fd, tmp = mkstemp(dir=dirname or ".", suffix=".tmp")
+    try :
+        with os.fdopen(fd, "w") as fp :
+            json.dump(data, fp, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+    except Exception :
+        os.unlink(tmp)
+        raise
+
+
+class IdentityCache:
+    """
+        On disk cache of gateway identity ( macid and firmware version )
+        keyed by address
+
+        args:
+            path        json file to store the cache in
+                        (default ~/.cache/RainEagle/identity.json
+                        or $EAGLE_IDENTITY_CACHE)
+            ttl         seconds before an entry has to be looked up
+                        on the device again (default 1 day)
+
+        Used by Eagle to skip the get_device_list and get_setting_data
+        round trips at startup for known gateways.
+    """
+    def __init__(self, path=None, ttl=86400):
+        if path is None :
+            path = os.environ.get('EAGLE_IDENTITY_CACHE') or \
+                os.path.join(_default_cache_dir(), "identity.json")
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = None
+        self._mtime = None
+
+    def _load(self):
+        try :
+            mtime = os.stat(self.path).st_mtime
+        except OSError :
+            if self._data is None :
+                self._data = dict()
+            return self._data
+        if self._data is None or mtime != self._mtime :
+            try :
+                with open(self.path) as fp :
+                    self._data = json.load(fp)
+            except (OSError, ValueError) :
+                self._data = dict()
+            self._mtime = mtime
+        return self._data
+
+    def get(self, addr):
+        """
+            returns a dict with 'macid' and 'fw_version' keys
+            or None if addr is unknown or the entry has expired
+        """
+        with self._lock :
+            ent = self._load().get(addr)
+        if ent is None :
+            return None
+        if self.ttl is not None and time.time() - ent.get('time', 0) > self.ttl :
+            return None
+        return ent
+
+    def set(self, addr, macid, fw_version=None):
+        """
+            store identity of gateway at addr
+        """
+        with self._lock :
+            data = self._load()
+            data[addr] = {'macid': macid, 'fw_version': fw_version,
+                          'time': int(time.time())}
+            self._save(data)
+
+    def remove(self, addr):
+        """
+            forget gateway at addr
+        """
+        with self._lock :
+            data = self._load()
+            if data.pop(addr, None) is not None :
+                self._save(data)
+
+    def _save(self, data):
+        _write_json(self.path, data)
+        self._mtime = os.stat(self.path).st_mtime
+
+
+# seconds to cache responces for by default,
+# commands not listed are never cached
+default_ttl = {
+    'get_device_list':      3600,
+    'get_setting_data':     300,
+    'get_timezone':         300,
+    'get_gateway_info':     300,
+    'get_uploaders':        3600,
+    'get_uploader':         300,
+    'get_device_config':    300,
+    'get_time_source':      300,
+}
+
+# cached commands made stale by a mutating command
+# ( None means everything is stale )
+invalidated_by = {
+    'set_price':                ('get_price', 'get_usage_data', 'get_setting_data'),
+    'set_time_source':          ('get_time_source', 'get_timezone', 'get_setting_data'),
+    'set_remote_management':    ('get_device_config',),
+    'set_cloud':                ('get_uploader', 'get_setting_data'),
+    'cloud_reset':              ('get_uploader', 'get_setting_data'),
+    'set_message_read':         ('get_message', 'get_usage_data'),
+    'confirm_message':          ('get_message', 'get_usage_data'),
+    'factory_reset':            None,
+}
+
+
+class ResponseCache:
+    """
+        LRU cache of decoded command responces with a TTL per command
+
+        args:
+            ttl         dict of command name to seconds, merged with
+                        default_ttl ( a ttl of 0 or None disables caching
+                        for that command )
+            maxsize     max number of responces kept
+
+        Cache entries are dropped when a command in invalidated_by
+        is sent through the same Eagle.  generation counts those
+        invalidations: a responce fetched while one happened may be
+        stale, so put() drops it if given the generation read before
+        the fetch.
+    """
+    def __init__(self, ttl=None, maxsize=256):
+        self.ttl = dict(default_ttl)
+        if ttl :
+            self.ttl.update(ttl)
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+
+    def cacheable(self, cmd):
+        return bool(self.ttl.get(cmd))
+
+    def get(self, key):
+        """
+            returns cached value for key or None
+        """
+        now = time.time()
+        with self._lock :
+            ent = self._data.get(key)
+            if ent is None or ent[0] < now :
+                if ent is not None :
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return ent[1]
+
+    def put(self, key, value, generation=None):
+        """
+            key is a tuple starting with the command name, generation
+            is that of the cache when value was requested
+        """
+        ttl = self.ttl.get(key[0])
+        if not ttl :
+            return
+        with self._lock :
+            if generation is not None and generation != self.generation :
+                return
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize :
+                self._data.popitem(last=False)
+
+    def invalidate(self, cmd):
+        """
+            drop entries made stale by command cmd
+        """
+        if cmd not in invalidated_by :
+            return
+        stale = invalidated_by[cmd]
+        with self._lock :
+            self.generation += 1
+            if stale is None :
+                self._data.clear()
+                return
+            for key in [k for k in self._data if k[0] in stale] :
+                del self._data[key]
+
+    def clear(self):
+        with self._lock :
+            self.generation += 1
+            self._data.clear()
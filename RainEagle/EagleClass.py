@@ -5,24 +5,25 @@ __copyright__ = "Copyright (C) 2014 Peter Shipley"
 __license__ = "BSD"
 __version__ = "0.1.8"
 
-import socket
-import sys
 import os
+import re
 import time
-import xml.etree.ElementTree as ET
-from urllib.request import Request
-from urllib.request import urlopen
-import base64
+import threading
 from math import floor
-from urllib.parse import urlparse
+from time import perf_counter
 import json
 from warnings import warn
-from distutils.version import LooseVersion
-
-min_fw_ver = "2.0.21"
 
+from .EagleHTTP import HTTPTransport
+from .EagleCache import IdentityCache, ResponseCache
+from .EagleFlight import SingleFlight
+from .EagleDecode import decode_historical, decode_summation
+from .EagleSocket import SocketTransport, _soc_macid
+from .EagleStats import EagleStats, debug_hook
+from .EagleDeadline import Hedger, deadline, check
+from .EagleTypes import result_types
 
-from pprint import pprint
+min_fw_ver = "2.0.21"
 
 
 # api_arg_format = { }
@@ -57,6 +58,14 @@ def to_epoch_1970(t) :
     if isinstance(t, str) and t.startswith('0x'):
         return 946684800 + int(t, base=16)
 
+
+def _version_tuple(v):
+    """
+        firmware version string as a tuple of ints for comparing,
+        eg: "2.0.21" -> (2, 0, 21), "1.4.47 (6798)" -> (1, 4, 47, 6798)
+    """
+    return tuple(int(n) for n in re.findall(r'\d+', str(v)))
+
 def _et2d(et):
 
     """ Etree to Dict
@@ -70,34 +79,39 @@ def _et2d(et):
 
         if an invalid arg is passed a empty dict is retrurned
 
+        the tree is walked iteratively ( no recursion limit )
 
         arg: ETree Element  obj
 
         returns: a dict obj
     """
     d = dict()
-    if not isinstance(et, ET.Element) :
+    if not hasattr(et, 'tag') :
         return d
-    children = list(et)
-    if et.attrib :
-        for k, v in list(et.items()) :
-            d[et.tag + "-" + k] = v
-    if children :
-        for child in children :
-            if child.tag in d :
-                if type(d[child.tag]) != list :
-                    t = d[child.tag]
-                    d[child.tag] = [t]
-            if list(child) or child.attrib :
-                if child.tag in d :
-                    d[child.tag].append(_et2d(child))
-                else :
-                    d[child.tag] = _et2d(child)
+    stack = [(et, d)]
+    pop = stack.pop
+    push = stack.append
+    while stack :
+        node, nd = pop()
+        if node.attrib :
+            tag = node.tag
+            for k, v in node.attrib.items() :
+                nd[tag + "-" + k] = v
+        for child in node :
+            if len(child) or child.attrib :
+                val = dict()
+                push((child, val))
             else :
-                if child.tag in d :
-                    d[child.tag].append(child.text)
+                val = child.text
+            tag = child.tag
+            if tag in nd :
+                cur = nd[tag]
+                if type(cur) is list :
+                    cur.append(val)
                 else :
-                    d[child.tag] = child.text
+                    nd[tag] = [cur, val]
+            else :
+                nd[tag] = val
     return d
 
 
@@ -133,6 +147,40 @@ def _tohex(n, width=8):
 
     return "{:#0{width}x}".format(int(i), width=width)
 
+def _soc_time(t):
+    """
+        convert time arg for socket API commands
+        to hex seconds since "Jan 1 00:00:00 2000"
+    """
+    if t is None :
+        return None
+    if isinstance(t, (int, float, time.struct_time)) :
+        t = max(0, to_epoch_2000(t))
+    return _tohex(t)
+
+
+def _soc_hex(n, width=8):
+    if n is None :
+        return None
+    return _tohex(n, width)
+
+
+def _idempotent(cmd):
+    """
+        true if cmd only reads from the device
+    """
+    return cmd.startswith(("get_", "list_"))
+
+
+def _copy_result(ret):
+    """
+        shallow copy of a decoded responce so callers can't
+        modify a shared ( cached ) result
+    """
+    if isinstance(ret, dict) :
+        return dict(ret)
+    return ret
+
 EAGLE_PORT = os.environ.get('EAGLE_PORT', 5002)
 EAGLE_ADDR = os.environ.get('EAGLE_ADDR')
 EAGLE_PASS = os.environ.get('EAGLE_LOCAL_PASSWORD')
@@ -146,17 +194,50 @@ class Eagle:
         args:
             debug       print debug messages if true
             addr        address of device
-            port        port on device (default 5002)
+            port        socket API port on device (default 5002)
             macid       Meter MAC address; will determine from device if not provided
             password    Password for HTTP Authentication
             username    Username for HTTP Authentication
             timeout     TCP socket timeout
+            keepalive   keep the HTTP connection to the device open
+                        between commands (default true)
+            transport   HTTPTransport to send HTTP commands through,
+                        allows several instances to share one pool
+            lazy        don't contact the device until the first command
+            identity_cache  IdentityCache ( or path to one, or True for
+                        the default ) used to remember the macid and
+                        firmware version of the device between runs
+            cache       ResponseCache ( or True for the defaults, or a dict
+                        of command name to ttl ) for responces that
+                        rarely change, such as get_setting_data
+            coalesce    let concurrent identical get_* commands share
+                        one request to the device
+            stats       EagleStats ( or True ) recording latency, bytes
+                        and errors per command; with debug set one
+                        line is printed per command
+            deadline    seconds allowed for each command as a whole
+                        ( connect, send, read and decode ), where timeout
+                        applies to each socket operation
+            hedge       Hedger ( or True, or a latency percentile ) to
+                        send a second attempt of slow get_* commands
+            typed       return slotted objects ( UsageData, PriceData,
+                        HistoricalSeries, ... see EagleTypes ) with
+                        numeric fields converted on access, instead
+                        of dicts of strings
 
         Currently there is very little error handling ( if any at all )
     """
+    _transport_class = HTTPTransport
+    _flight_class = SingleFlight
+    _soc_transport_class = SocketTransport
+    _hedge_class = Hedger
+
     def __init__(self, addr=EAGLE_ADDR, username=EAGLE_USER,
                  password=EAGLE_PASS, port=EAGLE_PORT, debug=False,
-                 checkfirmware=True, macid=None, timeout=10):
+                 checkfirmware=True, macid=None, timeout=10,
+                 keepalive=True, transport=None, lazy=False,
+                 identity_cache=None, cache=None, coalesce=False,
+                 stats=None, deadline=None, hedge=None, typed=False):
 
         self.username = username
         self.password = password
@@ -170,9 +251,45 @@ class Eagle:
         self.port = port
         self.timeout = timeout
 
-        self.soc = None
+        self.soc = self._soc_transport_class(timeout=self.timeout)
         self.macid = macid
 
+        if transport is None :
+            transport = self._transport_class(maxsize=1 if keepalive else 0,
+                                      timeout=self.timeout)
+        self.transport = transport
+
+        if identity_cache is True :
+            identity_cache = IdentityCache()
+        elif isinstance(identity_cache, str) :
+            identity_cache = IdentityCache(identity_cache)
+        elif identity_cache is False :
+            identity_cache = None
+        self.identity_cache = identity_cache
+
+        if cache is True :
+            cache = ResponseCache()
+        elif isinstance(cache, dict) :
+            cache = ResponseCache(ttl=cache)
+        self.cache = cache
+
+        self._flight = self._flight_class() if coalesce else None
+
+        if stats is True or (stats is None and self.debug) :
+            stats = EagleStats()
+            if self.debug :
+                stats.add_hook(debug_hook)
+        self.stats = stats
+        self._auth = None
+
+        self.call_deadline = deadline
+        self.typed = typed
+        if hedge is True :
+            hedge = self._hedge_class()
+        elif isinstance(hedge, float) :
+            hedge = self._hedge_class(percentile=hedge)
+        self._hedge = hedge
+
         if self.debug :
             print("Addr :  = ", self.addr)
             print("timeout :  = ", self.timeout)
@@ -181,12 +298,27 @@ class Eagle:
         if self.addr is None :
             raise ValueError("no hostname or IP given")
 
-        # preload
+        self._preloaded = False
+        self._preload_lock = threading.Lock()
+        if not lazy :
+            self._preload()
+
+    def _preload(self):
+        """
+            determine the macid ( if not given ) and check the firmware
+            version of the device
+
+            called from __init__ or, in lazy mode, by the first command
+        """
+        dev_fw_ver = self._load_identity()
+
         if not self.macid:
-            self.device_info = self.get_device_list()
+            self.device_info = json.loads(
+                self._send_http_comm("get_device_list"))
             if self.device_info is None :
                 raise IOError("Error connecting")
             if self.debug :
+                from pprint import pprint
                 print("__init__ ",)
                 pprint(self.device_info)
             self.macid = self.device_info['device_mac_id[0]']
@@ -194,13 +326,268 @@ class Eagle:
                 print("Init DeviceMacId = ", self.macid)
 
         if self.checkfw:
-            mysetting = self.get_setting_data()
-            dev_fw_ver = mysetting['device_fw_version']
-            if LooseVersion(dev_fw_ver) < LooseVersion(min_fw_ver):
-                warn_message = "Warning : device firmware " \
-                        + "{0} < {1} please consider " \
-                        + "updating ".format(dev_fw_ver, min_fw_ver)
-                warn(warn_message, RuntimeWarning, stacklevel=3)
+            if dev_fw_ver is None :
+                mysetting = json.loads(
+                    self._send_http_comm("get_setting_data"))
+                dev_fw_ver = mysetting['device_fw_version']
+            self._check_firmware(dev_fw_ver)
+
+        self._save_identity(dev_fw_ver)
+        self._preloaded = True
+
+    def _ensure_preloaded(self):
+        if not self._preloaded :
+            with self._preload_lock :
+                if not self._preloaded :
+                    self._preload()
+
+    def _load_identity(self):
+        """
+            fill in macid from the identity cache,
+            returns the cached firmware version ( or None )
+        """
+        if self.identity_cache is None :
+            return None
+        ident = self.identity_cache.get(self.addr)
+        if ident is None :
+            return None
+        if not self.macid :
+            self.macid = ident.get('macid')
+        return ident.get('fw_version')
+
+    def _save_identity(self, dev_fw_ver):
+        if self.identity_cache is None :
+            return
+        ident = self.identity_cache.get(self.addr)
+        if ident is None or ident.get('macid') != self.macid \
+                or ident.get('fw_version') != dev_fw_ver :
+            self.identity_cache.set(self.addr, self.macid, dev_fw_ver)
+
+    def _check_firmware(self, dev_fw_ver):
+        if _version_tuple(dev_fw_ver) < _version_tuple(min_fw_ver):
+            warn_message = ("Warning : device firmware "
+                            + "{0} < {1} please consider "
+                            + "updating ").format(dev_fw_ver, min_fw_ver)
+            warn(warn_message, RuntimeWarning, stacklevel=4)
+
+# socket commands as class functions
+
+    def list_devices(self):
+        """
+            Send the LIST_DEVICES command
+            ( socket command api )
+
+            On Success returns dict with the values (example):
+                'DeviceInfo': {
+                    'DeviceMacId':      '0xd8d5b90000001296',
+                    'InstallCode':      '0x...',
+                    'LinkKey':          '0x...',
+                    'FWVersion':        '1.4.27 (4091)',
+                    'HWVersion':        '1.2.3',
+                    'ImageType':        '0x1301',
+                    'Manufacturer':     'Rainforest Automation, Inc.',
+                    'ModelId':          'RFA-Z109 EAGLE',
+                    'DateCode':         '2013040120178406'
+                }
+        """
+        return self._soc_command("list_devices")
+
+    def get_device_data(self, macid=None):
+        """
+            Send the GET_DEVICE_DATA command
+            get all device data
+            ( socket command api )
+
+            On Success returns dict with the keys :
+                'NetworkInfo', 'InstantaneousDemand', 'CurrentSummation',
+                'PriceCluster', 'MessageCluster', 'Information'
+        """
+        return self._soc_command("get_device_data", MacId=macid)
+
+    def get_history_data(self, macid=None, starttime="0x00000000",
+                         endtime=None, frequency=None):
+        """
+            Send the GET_HISTORY_DATA command
+            get a series of summation values over an interval of time
+            ( socket command api )
+
+            args:
+                starttime       start of interval
+                endtime         end of interval
+                frequency       int   seconds between samples
+
+            times are either unix time ( int, float or struct_time ) or
+            hex strings of seconds since "Jan 1 00:00:00 2000"
+
+            On Success returns dict with the values (example):
+                'HistoryData': { 'CurrentSummation': [ {...}, {...} ] }
+
+            See also iter_history()
+        """
+        return self._soc_command("get_history_data", MacId=macid,
+                                 StartTime=_soc_time(starttime),
+                                 EndTime=_soc_time(endtime),
+                                 Frequency=_soc_hex(frequency))
+
+    def iter_history(self, start="0x00000000", end=None, macid=None,
+                     frequency=None):
+        """
+            generator version of get_history_data()
+            ( socket command api )
+
+            yields a SummationRecord for each CurrentSummation as
+            soon as it has been received, elements are discarded
+            once decoded so memory use does not grow with the
+            length of the interval
+
+            args:
+                start           start of interval
+                end             end of interval
+                frequency       int   seconds between samples
+
+            See get_history_data() for time formats
+        """
+        self._ensure_preloaded()
+        commstr = self._build_soc_command("get_history_data", MacId=macid,
+                                          StartTime=_soc_time(start),
+                                          EndTime=_soc_time(end),
+                                          Frequency=_soc_hex(frequency))
+        timing = None
+        if self.stats is not None :
+            timing = self.stats.start(self.addr, "get_history_data", "socket")
+        # open elements, so finished ones can be removed from their parent
+        stack = []
+        try :
+            for event, elem in self.soc.iterparse(self.addr, self.port,
+                                                  commstr.encode(),
+                                                  events=("start", "end"),
+                                                  timing=timing) :
+                if event == "start" :
+                    stack.append(elem)
+                    continue
+                stack.pop()
+                if elem.tag == "CurrentSummation" :
+                    yield decode_summation(elem)
+                    elem.clear()
+                    if stack :
+                        stack[-1].remove(elem)
+        except Exception as e :
+            if timing is not None :
+                timing['error'] = e
+            raise
+        finally :
+            if timing is not None :
+                self.stats.observe(timing)
+
+    def get_history_raw(self, start="0x00000000", end=None, macid=None,
+                        frequency=None):
+        """
+            get_history_data() without the decoding
+            ( socket command api )
+
+            returns the responce as received ( bytes ), for
+            decoding elsewhere, eg: decode_history_dumps()
+
+            See get_history_data() for args and time formats
+        """
+        self._ensure_preloaded()
+        commstr = self._build_soc_command("get_history_data", MacId=macid,
+                                          StartTime=_soc_time(start),
+                                          EndTime=_soc_time(end),
+                                          Frequency=_soc_hex(frequency))
+        timing = None
+        if self.stats is not None :
+            timing = self.stats.start(self.addr, "get_history_data", "socket")
+        try :
+            return self.soc.read(self.addr, self.port, commstr.encode(),
+                                 timing=timing)
+        except Exception as e :
+            if timing is not None :
+                timing['error'] = e
+            raise
+        finally :
+            if timing is not None :
+                self.stats.observe(timing)
+
+    def get_demand_values(self, macid=None, interval="hour", frequency=None):
+        """
+            Send the GET_DEMAND_VALUES command
+            get a series of instantaneous demand values
+            ( socket command api )
+
+            args:
+                interval        hour | day | week
+                frequency       int   seconds between samples
+        """
+        if interval not in ['hour', 'day', 'week'] :
+            raise ValueError("get_demand_values interval must be 'hour', 'day' or 'week' ")
+        return self._soc_command("get_demand_values", MacId=macid,
+                                 Interval=interval,
+                                 Frequency=_soc_hex(frequency))
+
+    def get_instantaneous_demand(self, macid=None):
+        """
+            Send the GET_INSTANTANEOUS_DEMAND command
+            get the real time demand from the meter
+            ( socket command api )
+
+            On Success returns dict with the values (example):
+                'InstantaneousDemand': {
+                    'DeviceMacId':      '0xd8d5b90000001296',
+                    'MeterMacId':       '0x00135003007c27b4',
+                    'TimeStamp':        '0x1ab3d3a9',
+                    'Demand':           '0x0001f4',
+                    'Multiplier':       '0x00000001',
+                    'Divisor':          '0x000003e8',
+                    ...
+                }
+        """
+        return self._result("get_instantaneous_demand",
+                            self._soc_command("get_instantaneous_demand",
+                                              MacId=macid))
+
+    def get_summation_values(self, macid=None, interval="day"):
+        """
+            Send the GET_SUMMATION_VALUES command
+            get a series of net summation values
+            ( socket command api )
+
+            args:
+                interval        day | week | month | year
+        """
+        if interval not in ['day', 'week', 'month', 'year'] :
+            raise ValueError("get_summation_values interval must be 'day', 'week', 'month' or 'year'")
+        return self._soc_command("get_summation_values", MacId=macid,
+                                 Interval=interval)
+
+    def get_fast_poll_status(self, macid=None):
+        """
+            Send the GET_FAST_POLL_STATUS command
+            get the current status of fast poll mode
+            ( socket command api )
+
+            On Success returns dict with the values (example):
+                'FastPollStatus': {
+                    'Frequency':        '0x00',
+                    'EndTime':          '0xFFFFFFFF',
+                    ...
+                }
+        """
+        return self._soc_command("get_fast_poll_status", MacId=macid)
+
+    def set_fast_poll(self, macid=None, frequency="0x04", duration="0xFF"):
+        """
+            Send the SET_FAST_POLL command
+            set the fast poll mode on the meter
+            ( socket command api )
+
+            args:
+                frequency       0x01 - 0xFF   seconds between polls
+                duration        0x01 - 0x0F   minutes of fast polling
+        """
+        return self._soc_command("set_fast_poll", MacId=macid,
+                                 Frequency=_soc_hex(frequency, 2),
+                                 Duration=_soc_hex(duration, 2))
 
 # http commands as class functions
 
@@ -210,8 +597,8 @@ class Eagle:
             returns information about the EAGLE device
 
         """
-        comm_responce = self._send_http_comm("get_device_list", MacId=macid)
-        return json.loads(comm_responce)
+        return self._result("get_device_list",
+                            self._http_command("get_device_list", MacId=macid))
 
     def get_uploaders(self, macid=None) :
         """
@@ -224,8 +611,7 @@ class Eagle:
                 'uploader_name[1]':     'Bidgely Inc.'
 
         """
-        comm_responce = self._send_http_comm("get_uploaders", MacId=macid)
-        return json.loads(comm_responce)
+        return self._http_command("get_uploaders", MacId=macid)
 
     def get_uploader(self, macid=None) :
         """
@@ -246,8 +632,7 @@ class Eagle:
 
             See also set_cloud() to set current uploader cloud config
         """
-        comm_responce = self._send_http_comm("get_uploader", MacId=macid)
-        return json.loads(comm_responce)
+        return self._http_command("get_uploader", MacId=macid)
 
     def set_message_read(self, macid=None) :
         """
@@ -255,16 +640,14 @@ class Eagle:
                 'remote_management_status' :    'success'
 
         """
-        comm_responce = self._send_http_comm("set_message_read", MacId=macid)
-        return json.loads(comm_responce)
+        return self._http_command("set_message_read", MacId=macid)
 
     def confirm_message(self, macid=None, id=None) :
         """
         """
         id = _tohex(id)
-        comm_responce = self._send_http_comm("confirm_message",
-                                             MacId=macid, Id=id)
-        return json.loads(comm_responce)
+        return self._http_command("confirm_message",
+                                  MacId=macid, Id=id)
 
     def get_message(self, macid=None) :
         """
@@ -280,8 +663,8 @@ class Eagle:
                 "message_read" :        "Y"
 
         """
-        comm_responce = self._send_http_comm("get_message", MacId=macid)
-        return json.loads(comm_responce)
+        return self._result("get_message",
+                            self._http_command("get_message", MacId=macid))
 
     def get_usage_data(self, macid=None):
         """
@@ -309,16 +692,18 @@ class Eagle:
                 'usage_timestamp' :      '1394505386'
 
         """
-        comm_responce = self._send_http_comm("get_usage_data", MacId=macid)
-        return json.loads(comm_responce)
+        return self._result("get_usage_data",
+                            self._http_command("get_usage_data", MacId=macid))
 
-    def get_historical_data(self, macid=None, period="day"):
+    def get_historical_data(self, macid=None, period="day", columnar=False):
         """
             get a series of summation values over an interval of time
             ( http command api )
 
             args:
                 period          day|week|month|year
+                columnar        return a HistoricalColumns of arrays
+                                instead of a dict ( see decode_historical )
 
             On Success returns dict with the values (example):
                 'data_period'            'day'
@@ -354,8 +739,10 @@ class Eagle:
         """
         if period not in ['day', 'week', 'month', 'year'] :
             raise ValueError("get_historical_data : period must be one of day|week|month|year")
-        comm_responce = self._send_http_comm("get_historical_data", macid=macid, Period=period)
-        return json.loads(comm_responce)
+        ret = self._http_command("get_historical_data", MacId=macid, Period=period)
+        if columnar :
+            return self._convert(ret, decode_historical)
+        return self._result("get_historical_data", ret)
 
     def get_setting_data(self, macid=None):
         """
@@ -365,8 +752,7 @@ class Eagle:
             relating to price, uploader, network & device
 
         """
-        comm_responce = self._send_http_comm("get_setting_data", MacId=macid)
-        return json.loads(comm_responce)
+        return self._http_command("get_setting_data", MacId=macid)
 
     def get_device_config(self, macid=None):
         """
@@ -377,8 +763,7 @@ class Eagle:
                'config_vpn_enabled':    'Y'
 
         """
-        comm_responce = self._send_http_comm("get_device_config", MacId=macid)
-        return json.loads(comm_responce)
+        return self._http_command("get_device_config", MacId=macid)
 
     def get_gateway_info(self, macid=None) :
         """
@@ -391,8 +776,7 @@ class Eagle:
                 'gateway_mac_id':               'D8:D5:B9:00:90:24'
 
         """
-        comm_responce = self._send_http_comm("get_gateway_info", MacId=macid)
-        return json.loads(comm_responce)
+        return self._http_command("get_gateway_info", MacId=macid)
 
     def get_timezone(self, macid=None) :
         """
@@ -407,8 +791,7 @@ class Eagle:
                'timezone_status':       'success'
 
         """
-        comm_responce = self._send_http_comm("get_timezone", MacId=macid)
-        return json.loads(comm_responce)
+        return self._http_command("get_timezone", MacId=macid)
 
     def get_time_source(self, macid=None) :
         """
@@ -417,11 +800,10 @@ class Eagle:
             On Success returns dict with value 'internet' or 'meter' :
                'time_source':           'internet'
         """
-        comm_responce = self._send_http_comm("get_time_source", MacId=macid)
-        return json.loads(comm_responce)
+        return self._http_command("get_time_source", MacId=macid)
 
     def get_remote_management(self, macid=None) :
-        return self.get_device_config(self, MacId=macid)
+        return self.get_device_config(macid=macid)
 
     def set_remote_management(self, macid=None, status="on") :
         """ set_remote_management
@@ -436,9 +818,8 @@ class Eagle:
         """
         if status not in ['on', 'off'] :
             raise ValueError("set_remote_management status must be 'on' or 'off'")
-        comm_responce = self._send_http_comm("set_remote_management",
+        return self._http_command("set_remote_management",
                     MacId=macid, Status=status)
-        return json.loads(comm_responce)
 
     def set_time_source(self, macid=None, source=None):
         """ set_time_source
@@ -455,9 +836,8 @@ class Eagle:
         """
         if source not in ['meter', 'internet'] :
             raise ValueError("set_time_source Source must be 'meter' or 'internet'")
-        comm_responce = self._send_http_comm("set_time_source",
+        return self._http_command("set_time_source",
                     MacId=macid, Source=source)
-        return json.loads(comm_responce)
 
     def get_price(self, macid=None):
         """
@@ -471,8 +851,8 @@ class Eagle:
 
             returns empty dict on Error
         """
-        comm_responce = self._send_http_comm("get_price", MacId=macid)
-        return json.loads(comm_responce)
+        return self._result("get_price",
+                            self._http_command("get_price", MacId=macid))
 
     def set_price(self, macid=None, price=None):
         """
@@ -502,9 +882,8 @@ class Eagle:
         price_adj = "{:#x}".format(int(price * multiplier))
         tdigits = "{:#x}".format(trailing_digits)
 
-        comm_responce = self._send_http_comm("set_price", MacId=macid,
+        return self._http_command("set_price", MacId=macid,
                         Price=price_adj, TrailingDigits=tdigits)
-        return json.loads(comm_responce)
 
 
     def set_price_auto(self, macid=None) :
@@ -514,11 +893,10 @@ class Eagle:
             On Success returns dict with value :
                 'set_price_status':     'success'
         """
-        comm_responce = self._send_http_comm("set_price",
+        return self._http_command("set_price",
                     MacId=macid,
                     Price="0xFFFFFFFF",
                     TrailingDigits="0x00")
-        return json.loads(comm_responce)
 
 #    def set_multiplier_divisor(self, multiplier=1, divisor=1) :
 #       """
@@ -533,8 +911,7 @@ class Eagle:
         """
             Factory Reset
         """
-        comm_responce = self._send_http_comm("factory_reset", MacId=macid)
-        return json.loads(comm_responce)
+        return self._http_command("factory_reset", MacId=macid)
 
 
 #    def disconnect_meter(self, macid=None) :
@@ -549,8 +926,7 @@ class Eagle:
             cloud_reset : Clear Cloud Configuration
 
         """
-        comm_responce = self._send_http_comm("cloud_reset", MacId=macid)
-        return json.loads(comm_responce)
+        return self._http_command("cloud_reset", MacId=macid)
 
     def set_cloud(self, macid=None, url=None, authcode="", email=""):
         """
@@ -569,6 +945,7 @@ class Eagle:
         if url.__len__() > 200 :
             raise ValueError("Max URL length is 200 characters long.\n")
 
+        from urllib.parse import urlparse
         urlp = urlparse(url)
 
         if urlp.port :
@@ -595,47 +972,216 @@ class Eagle:
         else :
             password = ""
 
-        comm_responce = self._send_http_comm("set_cloud", MacId=macid,
+        return self._http_command("set_cloud", MacId=macid,
                     Provider="manual",
                     Protocol=protocol, HostName=hostname,
                     Url=url, Port=port,
                     AuthCode=authcode, Email=email,
                     UserId=userid, Password=password)
 
-        return json.loads(comm_responce)
+    def deadline(self, seconds):
+        """
+            returns a context manager limiting the total time of the
+            commands run inside it
+
+                with eg.deadline(2.5) :
+                    eg.get_usage_data()
+        """
+        return deadline(seconds)
+
+    def close(self):
+        """
+            close any open connections to the device
+        """
+        self.transport.close()
+        if self._hedge is not None :
+            self._hedge.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 # Support functions
 
-    def _send_http_comm(self, cmd, MacId=None, **kwargs):
+    def _http_command(self, cmd, MacId=None, **kwargs):
+        """
+            send a HTTP command and decode the json responce
+        """
+        with deadline(self.call_deadline) :
+            self._ensure_preloaded()
+            key = self._command_key(cmd, MacId, kwargs)
+            generation = None
+            if self.cache is not None and self.cache.cacheable(cmd) :
+                generation = self.cache.generation
+                ret = self.cache.get(key)
+                if ret is not None :
+                    return _copy_result(ret)
+            fetch = self._fetch
+            if self._hedge is not None and _idempotent(cmd) :
+                fetch = self._hedged_fetch
+            if self._flight is not None and _idempotent(cmd) :
+                ret, shared = self._flight.do(key, fetch, cmd, MacId, kwargs)
+                if shared :
+                    return _copy_result(ret)
+            else :
+                ret = fetch(cmd, MacId, kwargs)
+            self._cache_update(key, cmd, ret, generation)
+            return ret
+
+    def _hedged_fetch(self, cmd, MacId, kwargs):
+        return self._hedge.do(cmd, self._fetch, cmd, MacId, kwargs)
 
-        if self.debug :
-            print("\n\n_send_http_comm : ", cmd)
+    def _result(self, cmd, ret):
+        """
+            typed version of the result of cmd, if typed is set
+        """
+        if self.typed :
+            return self._convert(ret, result_types[cmd])
+        return ret
 
+    def _convert(self, ret, func):
+        """
+            apply func to the result of a command
+            ( AsyncEagle applies it once the result is available )
+        """
+        return func(ret)
+
+    def _fetch(self, cmd, MacId, kwargs):
+        if self.stats is None :
+            ret = json.loads(self._send_http_comm(cmd, MacId=MacId, **kwargs))
+            check()
+            return ret
+        timing = self.stats.start(self.addr, cmd, "http")
+        try :
+            comm_responce = self._send_http_comm(cmd, MacId=MacId,
+                                                 _timing=timing, **kwargs)
+            t = perf_counter()
+            ret = json.loads(comm_responce)
+            timing['decode'] = perf_counter() - t
+            check()
+        except Exception as e :
+            timing['error'] = e
+            raise
+        finally :
+            self.stats.observe(timing)
+        return ret
+
+    def _command_key(self, cmd, MacId, kwargs):
+        """
+            key identifying a command and its args, used for
+            the responce cache and to coalesce identical commands
+        """
+        return (cmd, MacId or self.macid, tuple(sorted(kwargs.items())))
+
+    def _cache_update(self, key, cmd, ret, generation=None):
+        if self.cache is None :
+            return
+        if self.cache.cacheable(cmd) :
+            # dropped if invalidated while being fetched
+            self.cache.put(key, _copy_result(ret), generation)
+        else :
+            self.cache.invalidate(cmd)
+
+    def _soc_command(self, cmd, MacId=None, **kwargs):
+        """
+            send a socket API command and convert the XML responce
+        """
+        with deadline(self.call_deadline) :
+            if cmd != "list_devices" :
+                self._ensure_preloaded()
+            if self._hedge is not None and _idempotent(cmd) :
+                return self._hedge.do(cmd, self._soc_fetch, cmd, MacId, kwargs)
+            return self._soc_fetch(cmd, MacId, kwargs)
+
+    def _soc_fetch(self, cmd, MacId, kwargs):
+        if self.stats is None :
+            ret = _et2d(self._send_soc_comm(cmd, MacId=MacId, **kwargs))
+            check()
+            return ret
+        timing = self.stats.start(self.addr, cmd, "socket")
+        try :
+            root = self._send_soc_comm(cmd, MacId=MacId, _timing=timing, **kwargs)
+            t = perf_counter()
+            ret = _et2d(root)
+            timing['decode'] = perf_counter() - t
+            check()
+        except Exception as e :
+            timing['error'] = e
+            raise
+        finally :
+            self.stats.observe(timing)
+        return ret
+
+    def _build_soc_command(self, cmd, MacId=None, **kwargs):
+        """
+            returns the LocalCommand XML string for socket API command cmd
+            ( args that are None are left out )
+        """
         commstr = "<LocalCommand>\n"
         commstr += "<Name>{0!s}</Name>\n".format(cmd)
-        commstr += "<MacId>{0!s}</MacId>\n".format(MacId or self.macid)
+        if cmd != "list_devices" :
+            commstr += "<MacId>{0!s}</MacId>\n".format(
+                _soc_macid(MacId or self.macid))
         for k, v in kwargs.items() :
-            commstr += "<{0}>{1!s}</{0}>\n".format(k, v)
+            if v is not None :
+                commstr += "<{0}>{1!s}</{0}>\n".format(k, v)
         commstr += "</LocalCommand>\n"
+        return commstr
 
-        if cmd == "set_cloud" :
-            print(commstr)
-            return dict()
+    def _send_soc_comm(self, cmd, MacId=None, _timing=None, **kwargs):
+
+        commstr = self._build_soc_command(cmd, MacId, **kwargs)
 
-        if self.debug:
+        if self.debug > 1 :
             print(commstr)
 
-        url = "http://{0}/cgi-bin/cgi_manager".format(self.addr)
+        return self.soc.command(self.addr, self.port, commstr.encode(),
+                                timing=_timing)
 
-        if self.username is not None :
-            auth = base64.b64encode((self.username+":"+self.password).encode())
-            if self.debug:
+    def _build_command(self, cmd, MacId=None, **kwargs):
+        """
+            returns the LocalCommand XML string for cmd
+        """
+        commstr = "<LocalCommand>\n"
+        commstr += "<Name>{0!s}</Name>\n".format(cmd)
+        commstr += "<MacId>{0!s}</MacId>\n".format(MacId or self.macid)
+        for k, v in kwargs.items() :
+            commstr += "<{0}>{1!s}</{0}>\n".format(k, v)
+        commstr += "</LocalCommand>\n"
+        return commstr
+
+    def _auth_headers(self):
+        """
+            returns the HTTP headers for authentication, the encoded
+            credentials are kept until username or password change
+        """
+        if self.username is None :
+            return None
+        creds = (self.username, self.password)
+        if self._auth is None or self._auth[0] != creds :
+            from base64 import b64encode
+            auth = b64encode((self.username+":"+self.password).encode())
+            if self.debug > 1 :
                 print("Authorization string: {}".format(auth))
-            req = Request(url, commstr.encode(), headers={"Authorization": 'Basic '.encode() + auth })
-        else :
-            req = Request(url, commstr)
-        response = urlopen(req)
-        the_page = response.read()
+            self._auth = (creds, {"Authorization": b'Basic ' + auth})
+        return self._auth[1]
+
+    def _send_http_comm(self, cmd, MacId=None, _timing=None, **kwargs):
+
+        commstr = self._build_command(cmd, MacId, **kwargs)
+
+        if self.debug > 1 :
+            print(commstr)
+
+        status, the_page = self.transport.request(self.addr, commstr.encode(),
+                                                  self._auth_headers(),
+                                                  timing=_timing,
+                                                  idempotent=_idempotent(cmd))
+        if status != 200 :
+            raise RainEagleResponseError(
+                "{0} : HTTP status {1}".format(cmd, status))
 
         return the_page.decode()
 
@@ -0,0 +1,293 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import threading
+import contextvars
+from collections import deque
+from time import monotonic
+
+__all__ = ['deadline', 'DeadlineExceeded', 'Hedger', 'AsyncHedger']
+
+# absolute monotonic() time the current call must finish by
+# ( a context variable, so it follows threads and asyncio tasks )
+_deadline = contextvars.ContextVar('raineagle_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+        raised when a command runs past its deadline
+    """
+    pass
+
+
+class deadline:
+    """
+        Context manager limiting the total time of the commands run
+        inside it, covering connect, send, read and decode
+
+            with deadline(2.5) :
+                eg.get_usage_data()
+                eg.get_instantaneous_demand()
+
+        Nested deadlines can only shorten the outer one.  A seconds
+        of None leaves the current deadline ( if any ) as it is.
+        Works the same inside asyncio code.
+
+        A command running out of time raises a TimeoutError, either
+        DeadlineExceeded or the timeout of the socket operation that
+        was cut short.
+    """
+    __slots__ = ('seconds', '_token')
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._token = None
+
+    def __enter__(self):
+        if self.seconds is None :
+            return None
+        when = monotonic() + self.seconds
+        cur = _deadline.get()
+        if cur is not None and cur < when :
+            when = cur
+        self._token = _deadline.set(when)
+        return when
+
+    def __exit__(self, *exc):
+        if self._token is not None :
+            _deadline.reset(self._token)
+            self._token = None
+
+
+def current():
+    """
+        returns the current deadline ( monotonic() time ) or None
+    """
+    return _deadline.get()
+
+
+def budget(when, timeout=None):
+    """
+        returns the seconds left until deadline when, capped at timeout
+
+        raises DeadlineExceeded if it has passed,
+        returns timeout if when is None
+    """
+    if when is None :
+        return timeout
+    left = when - monotonic()
+    if left <= 0 :
+        raise DeadlineExceeded("deadline exceeded")
+    if timeout is not None and timeout < left :
+        return timeout
+    return left
+
+
+def check():
+    """
+        raise DeadlineExceeded if the current deadline has passed
+    """
+    when = _deadline.get()
+    if when is not None and when <= monotonic() :
+        raise DeadlineExceeded("deadline exceeded")
+
+
+class _Hedge:
+    """
+        latency tracking shared by Hedger and AsyncHedger
+    """
+    def __init__(self, percentile=0.95, min_samples=20, window=256,
+                 min_delay=0.0):
+        if not 0 < percentile < 1 :
+            raise ValueError("percentile must be between 0 and 1")
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.min_delay = min_delay
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._samples = dict()
+        # cached ( threshold, samples added since )
+        self._threshold = dict()
+        self._lock = threading.Lock()
+
+    def delay(self, key):
+        """
+            seconds to wait before hedging key,
+            None until enough latencies have been seen
+        """
+        th = self._threshold.get(key)
+        if th is not None and th[1] < 16 :
+            return th[0]
+        with self._lock :
+            samples = self._samples.get(key)
+            if samples is None or len(samples) < self.min_samples :
+                return None
+            s = sorted(samples)
+        d = max(self.min_delay, s[min(len(s) - 1, int(self.percentile * len(s)))])
+        self._threshold[key] = (d, 0)
+        return d
+
+    def record(self, key, seconds):
+        with self._lock :
+            samples = self._samples.get(key)
+            if samples is None :
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+            th = self._threshold.get(key)
+            if th is not None :
+                self._threshold[key] = (th[0], th[1] + 1)
+
+
+class Hedger(_Hedge):
+    """
+        Hedged requests ( threads )
+
+        args:
+            percentile      latency percentile after which a second
+                            attempt is started
+            min_samples     latencies needed before hedging starts
+            window          latencies kept per command
+            min_delay       never hedge sooner than this ( seconds )
+            workers         threads running attempts, a slow attempt
+                            keeps its thread until it finishes ( or
+                            times out ) so allow for several of them
+
+        Once a command has enough latency history each call runs in
+        the pool; if it has not answered within the percentile of
+        past latencies a second, identical attempt is started and
+        whichever succeeds first is returned.  Only for idempotent
+        commands.  The slower attempt is left to finish in the
+        background.
+
+        hedged and hedge_wins count second attempts and how many of
+        them won.
+    """
+    def __init__(self, percentile=0.95, min_samples=20, window=256,
+                 min_delay=0.0, workers=32):
+        _Hedge.__init__(self, percentile, min_samples, window, min_delay)
+        self.workers = workers
+        self._pool = None
+
+    def _submit(self, fn, args):
+        if self._pool is None :
+            with self._lock :
+                if self._pool is None :
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._pool = ThreadPoolExecutor(self.workers)
+        # attempts run with the caller's deadline
+        return self._pool.submit(contextvars.copy_context().run, fn, *args)
+
+    def do(self, key, fn, *args):
+        """
+            returns fn(*args), hedged once latencies for key are known
+        """
+        delay = self.delay(key)
+        t0 = monotonic()
+        if delay is None :
+            ret = fn(*args)
+            self.record(key, monotonic() - t0)
+            return ret
+
+        from concurrent.futures import wait, FIRST_COMPLETED
+        first = self._submit(fn, args)
+
+        def _done(f):
+            if not f.cancelled() and f.exception() is None :
+                self.record(key, monotonic() - t0)
+        first.add_done_callback(_done)
+
+        when = current()
+        if wait((first,), timeout=budget(when, delay))[0] :
+            return first.result()
+
+        self.hedged += 1
+        second = self._submit(fn, args)
+        pending = {first, second}
+        error = None
+        while pending :
+            done, pending = wait(pending, timeout=budget(when),
+                                 return_when=FIRST_COMPLETED)
+            if not done :
+                raise DeadlineExceeded("deadline exceeded")
+            for f in done :
+                if f.exception() is None :
+                    if f is second :
+                        self.hedge_wins += 1
+                    return f.result()
+                error = f.exception()
+        raise error
+
+    def close(self):
+        if self._pool is not None :
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+class AsyncHedger(_Hedge):
+    """
+        Hedged requests ( asyncio )
+
+        see Hedger, fn must be a coroutine function.
+        The slower attempt is cancelled, close() cancels the
+        attempts still running.
+    """
+    def __init__(self, percentile=0.95, min_samples=20, window=256,
+                 min_delay=0.0):
+        _Hedge.__init__(self, percentile, min_samples, window, min_delay)
+        self._tasks = set()
+
+    def _start(self, fn, args):
+        import asyncio
+        t = asyncio.ensure_future(fn(*args))
+        self._tasks.add(t)
+        t.add_done_callback(self._tasks.discard)
+        return t
+
+    async def do(self, key, fn, *args):
+        delay = self.delay(key)
+        t0 = monotonic()
+        if delay is None :
+            ret = await fn(*args)
+            self.record(key, monotonic() - t0)
+            return ret
+
+        import asyncio
+        first = self._start(fn, args)
+
+        def _done(t):
+            if not t.cancelled() and t.exception() is None :
+                self.record(key, monotonic() - t0)
+        first.add_done_callback(_done)
+
+        pending = {first}
+        try :
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if first in done :
+                return first.result()
+
+            self.hedged += 1
+            second = self._start(fn, args)
+            pending = {first, second}
+            error = None
+            while pending :
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done :
+                    if t.exception() is None :
+                        if t is second :
+                            self.hedge_wins += 1
+                        return t.result()
+                    error = t.exception()
+            raise error
+        finally :
+            for t in pending :
+                t.cancel()
+
+    def close(self):
+        tasks, self._tasks = self._tasks, set()
+        for t in tasks :
+            t.cancel()
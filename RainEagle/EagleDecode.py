@@ -0,0 +1,359 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import sys
+from array import array
+from collections import namedtuple
+
+# numpy is optional and slow to import, it is loaded by the
+# first decode that may use it ( see _want_numpy )
+numpy = None
+_numpy_checked = False
+
+__all__ = ['HistoricalColumns', 'decode_historical',
+           'SummationRecord', 'decode_summation',
+           'DemandRecord', 'decode_demand',
+           'SummationColumns', 'decode_summations',
+           'DemandColumns', 'decode_demands']
+
+_nan = float('nan')
+
+# seconds between the unix epoch and "Jan 1 00:00:00 2000"
+_epoch_2000 = 946684800
+
+HistoricalColumns = namedtuple('HistoricalColumns',
+                               ['period', 'timestamp', 'value', 'valid'])
+HistoricalColumns.__doc__ = """
+    get_historical_data() results as columns
+
+        period          day|week|month|year
+        timestamp       unix timestamps ( array('q') or numpy int64 )
+        value           values ( array('d') or numpy float64 ), nan for gaps
+        valid           1 where both timestamp and value were present,
+                        0 for gaps ( bytearray or numpy bool )
+"""
+
+
+def _want_numpy(use_numpy):
+    """
+        import numpy on first use, returns use_numpy
+        ( None: whether numpy is installed )
+    """
+    global numpy, _numpy_checked
+    if use_numpy is False :
+        return False
+    if not _numpy_checked :
+        try :
+            import numpy
+        except ImportError :
+            pass
+        _numpy_checked = True
+    if numpy is None :
+        if use_numpy :
+            raise ImportError("use_numpy requires numpy")
+        return False
+    return True
+
+
+def decode_historical(d, use_numpy=None):
+    """
+        convert the flat dict returned by get_historical_data()
+
+            'timestamp[0]': '1394422200', 'value[0]': '0.429', ...
+
+        into HistoricalColumns, missing entries ( gaps ) are
+        flagged in the valid column
+
+        args:
+            d           dict returned by get_historical_data()
+            use_numpy   return numpy arrays ( default: if numpy
+                        is installed )
+    """
+    use_numpy = _want_numpy(use_numpy)
+
+    ts_idx = []
+    ts_str = []
+    val_idx = []
+    val_str = []
+    n = int(d.get('data_size') or 0)
+
+    # one pass over the keys to sort out the columns,
+    # the strings are converted in bulk below
+    for k, v in d.items() :
+        name, sep, idx = k.partition('[')
+        if not sep :
+            continue
+        i = int(idx[:-1])
+        if i >= n :
+            n = i + 1
+        if name == 'timestamp' :
+            ts_idx.append(i)
+            ts_str.append(v)
+        elif name == 'value' :
+            val_idx.append(i)
+            val_str.append(v)
+
+    period = d.get('data_period')
+
+    if use_numpy :
+        timestamp = numpy.zeros(n, dtype=numpy.int64)
+        value = numpy.full(n, numpy.nan)
+        has_ts = numpy.zeros(n, dtype=bool)
+        has_val = numpy.zeros(n, dtype=bool)
+        if ts_idx :
+            timestamp[ts_idx] = numpy.array(ts_str).astype(numpy.int64)
+            has_ts[ts_idx] = True
+        if val_idx :
+            value[val_idx] = numpy.array(val_str).astype(numpy.float64)
+            has_val[val_idx] = True
+        return HistoricalColumns(period, timestamp, value, has_ts & has_val)
+
+    timestamp = array('q', bytes(8 * n))
+    value = array('d', [_nan]) * n
+    has_ts = bytearray(n)
+    for i, t in zip(ts_idx, map(int, ts_str)) :
+        timestamp[i] = t
+        has_ts[i] = 1
+    valid = bytearray(n)
+    for i, v in zip(val_idx, map(float, val_str)) :
+        value[i] = v
+        valid[i] = has_ts[i]
+    return HistoricalColumns(period, timestamp, value, valid)
+
+
+SummationRecord = namedtuple('SummationRecord',
+                             ['timestamp', 'delivered', 'received'])
+SummationRecord.__doc__ = """
+    decoded CurrentSummation
+
+        timestamp       unix timestamp
+        delivered       kWh delivered ( multiplier and divisor applied )
+        received        kWh received ( multiplier and divisor applied )
+"""
+
+
+def decode_summation(cs):
+    """
+        decode a CurrentSummation, either an ETree Element or
+        a dict from _et2d(), into a SummationRecord
+
+        a Multiplier or Divisor of zero is treated as one
+    """
+    get = _getter(cs)
+    multiplier = int(get('Multiplier') or '0', 16) or 1
+    divisor = float(int(get('Divisor') or '0', 16) or 1)
+    return SummationRecord(
+        _timestamp(get('TimeStamp')),
+        int(get('SummationDelivered'), 16) * multiplier / divisor,
+        int(get('SummationReceived'), 16) * multiplier / divisor)
+
+
+DemandRecord = namedtuple('DemandRecord', ['timestamp', 'demand'])
+DemandRecord.__doc__ = """
+    decoded InstantaneousDemand
+
+        timestamp       unix timestamp
+        demand          kW ( multiplier and divisor applied,
+                        negative when power is being sent to the grid )
+"""
+
+
+def decode_demand(idemand):
+    """
+        decode an InstantaneousDemand, either an ETree Element or
+        a dict from _et2d(), into a DemandRecord
+
+        Demand is a signed 32 bit ( two's complement ) value,
+        a Multiplier or Divisor of zero is treated as one
+    """
+    get = _getter(idemand)
+    multiplier = int(get('Multiplier') or '0', 16) or 1
+    divisor = float(int(get('Divisor') or '0', 16) or 1)
+    demand = int(get('Demand'), 16) & 0xFFFFFFFF
+    if demand > 0x7FFFFFFF :
+        demand -= 0x100000000
+    return DemandRecord(_timestamp(get('TimeStamp')),
+                        demand * multiplier / divisor)
+
+
+def _getter(rec):
+    if isinstance(rec, dict) :
+        return rec.get
+    return rec.findtext
+
+
+def _timestamp(ts):
+    if ts is None :
+        return None
+    return _epoch_2000 + int(ts, 16)
+
+
+#
+# batch decoding
+#
+# The hex strings of a column are zero padded to a fixed width, joined
+# and converted with a single bytes.fromhex() call; the result is then
+# read as an array of big endian integers.  This avoids a int(x, 16)
+# call per value.
+#
+
+SummationColumns = namedtuple('SummationColumns',
+                              ['timestamp', 'delivered', 'received'])
+SummationColumns.__doc__ = """
+    decoded CurrentSummation records as columns
+
+        timestamp       unix timestamps ( array('q') or numpy int64 )
+        delivered       kWh delivered ( array('d') or numpy float64 )
+        received        kWh received ( array('d') or numpy float64 )
+"""
+
+DemandColumns = namedtuple('DemandColumns', ['timestamp', 'demand'])
+DemandColumns.__doc__ = """
+    decoded InstantaneousDemand records as columns
+
+        timestamp       unix timestamps ( array('q') or numpy int64 )
+        demand          kW ( array('d') or numpy float64 )
+"""
+
+# array typecodes for 32 and 64 bit unsigned ints
+_u32 = 'I' if array('I').itemsize == 4 else 'L'
+_u64 = 'Q'
+_i32 = _u32.lower()
+
+
+def _hex_bytes(strs, digits):
+    """
+        join hex strings ( with or without 0x ) into one bytes
+        object of big endian integers, digits hex digits each
+    """
+    # fast path, the device zero pads its values to a fixed width
+    # ( fields missing from a record are None )
+    if None not in strs and set(map(len, strs)) == {digits + 2} :
+        joined = ''.join(strs)
+        if joined.count('x') == len(strs) :
+            return bytes.fromhex(joined.replace('0x', ''))
+
+    out = []
+    append = out.append
+    for x in strs :
+        if x is None :
+            x = '0'
+        elif x[:2] in ('0x', '0X') :
+            x = x[2:]
+        if len(x) > digits :
+            # keep the low order digits ( eg: 32 bit demand )
+            x = x[-digits:]
+        append(x.rjust(digits, '0'))
+    return bytes.fromhex(''.join(out))
+
+
+def _hex_array(strs, digits, typecode):
+    """
+        hex strings to array of unsigned ints
+    """
+    a = array(typecode)
+    a.frombytes(_hex_bytes(strs, digits))
+    if sys.byteorder == 'little' :
+        a.byteswap()
+    return a
+
+
+def _hex_numpy(strs, digits):
+    dt = '>u8' if digits == 16 else '>u4'
+    return numpy.frombuffer(_hex_bytes(strs, digits), dtype=dt)
+
+
+def _columns(records, fields):
+    """
+        collect the field values of records into lists, one per field
+    """
+    if records and isinstance(records[0], dict) :
+        return tuple([rec.get(f) for rec in records] for f in fields)
+    return tuple([rec.findtext(f) for rec in records] for f in fields)
+
+
+def decode_summations(records, use_numpy=None):
+    """
+        decode a list of CurrentSummation records ( ETree Elements or
+        dicts from _et2d(), eg: get_history_data()['HistoryData']['CurrentSummation'] )
+        into SummationColumns in one pass
+
+        a Multiplier or Divisor of zero is treated as one
+
+        args:
+            records     list of CurrentSummation
+            use_numpy   return numpy arrays ( default: if numpy
+                        is installed )
+    """
+    use_numpy = _want_numpy(use_numpy)
+    if isinstance(records, dict) :
+        records = [records]
+
+    ts, dl, rc, mu, dv = _columns(records, ('TimeStamp', 'SummationDelivered',
+                                            'SummationReceived',
+                                            'Multiplier', 'Divisor'))
+
+    if use_numpy :
+        mult = _hex_numpy(mu, 8).astype(numpy.float64)
+        div = _hex_numpy(dv, 8).astype(numpy.float64)
+        mult[mult == 0] = 1
+        div[div == 0] = 1
+        # v * m / d, as decode_summation(), so both give the same floats
+        return SummationColumns(
+            _hex_numpy(ts, 8).astype(numpy.int64) + _epoch_2000,
+            _hex_numpy(dl, 16) * mult / div,
+            _hex_numpy(rc, 16) * mult / div)
+
+    mult = [m or 1 for m in _hex_array(mu, 8, _u32)]
+    div = [float(d or 1) for d in _hex_array(dv, 8, _u32)]
+    return SummationColumns(
+        array('q', [t + _epoch_2000 for t in _hex_array(ts, 8, _u32)]),
+        array('d', [v * m / d for v, m, d in
+                    zip(_hex_array(dl, 16, _u64), mult, div)]),
+        array('d', [v * m / d for v, m, d in
+                    zip(_hex_array(rc, 16, _u64), mult, div)]))
+
+
+def decode_demands(records, use_numpy=None):
+    """
+        decode a list of InstantaneousDemand records ( ETree Elements
+        or dicts from _et2d() ) into DemandColumns in one pass
+
+        Demand is a signed 32 bit ( two's complement ) value,
+        a Multiplier or Divisor of zero is treated as one
+
+        args:
+            records     list of InstantaneousDemand
+            use_numpy   return numpy arrays ( default: if numpy
+                        is installed )
+    """
+    use_numpy = _want_numpy(use_numpy)
+    if isinstance(records, dict) :
+        records = [records]
+
+    ts, dm, mu, dv = _columns(records, ('TimeStamp', 'Demand',
+                                        'Multiplier', 'Divisor'))
+
+    if use_numpy :
+        mult = _hex_numpy(mu, 8).astype(numpy.float64)
+        div = _hex_numpy(dv, 8).astype(numpy.float64)
+        mult[mult == 0] = 1
+        div[div == 0] = 1
+        demand = numpy.frombuffer(_hex_bytes(dm, 8), dtype='>i4')
+        return DemandColumns(
+            _hex_numpy(ts, 8).astype(numpy.int64) + _epoch_2000,
+            demand * mult / div)
+
+    # reading the big endian bytes as signed ints gives the two's complement
+    demand = array(_i32)
+    demand.frombytes(_hex_bytes(dm, 8))
+    if sys.byteorder == 'little' :
+        demand.byteswap()
+    return DemandColumns(
+        array('q', [t + _epoch_2000 for t in _hex_array(ts, 8, _u32)]),
+        array('d', [v * (m or 1) / float(d or 1) for v, m, d in
+                    zip(demand, _hex_array(mu, 8, _u32),
+                        _hex_array(dv, 8, _u32))]))
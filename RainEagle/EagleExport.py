@@ -0,0 +1,413 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import csv
+import queue
+import threading
+from math import isinf, isnan
+from time import monotonic
+
+__all__ = ['BatchExporter', 'LineProtocolSink', 'CSVSink', 'ParquetSink']
+
+
+def _fields(rec):
+    """
+        a reading as a dict: namedtuples ( SummationRecord, DemandRecord,
+        MeterRecord, BucketTotal ... ), typed results ( UsageData ... )
+        or a dict
+    """
+    if isinstance(rec, dict) :
+        return rec
+    asdict = getattr(rec, '_asdict', None)
+    if asdict is not None :
+        return asdict()
+    asdict = getattr(rec, 'as_dict', None)
+    if asdict is not None :
+        return asdict()
+    raise TypeError("can't export {0!r}".format(type(rec).__name__))
+
+
+class _FileSink:
+    """
+        base of the sinks writing to a text file ( appended to )
+        or an open file object
+    """
+    def __init__(self, path):
+        if hasattr(path, 'write') :
+            self.fp = path
+            self._own = False
+        else :
+            self.fp = open(path, "a", newline="")
+            self._own = True
+
+    def close(self):
+        if self._own :
+            self.fp.close()
+        else :
+            self.fp.flush()
+
+
+def _lp_key(s):
+    return str(s).replace(",", r"\,").replace("=", r"\=").replace(" ", r"\ ")
+
+
+def _lp_value(v):
+    """
+        InfluxDB field value, None if it can't be stored
+    """
+    if v is None :
+        return None
+    if v is True or v is False :
+        return "true" if v else "false"
+    if isinstance(v, int) :
+        return "{0}i".format(v)
+    if isinstance(v, float) :
+        if isnan(v) or isinf(v) :
+            return None
+        return repr(v)
+    return '"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class LineProtocolSink(_FileSink):
+    """
+        Writes readings as InfluxDB line protocol
+
+        args:
+            path            file name ( appended to ) or file object
+            measurement     measurement name
+            time_field      field holding the unix time of the reading,
+                            readings without it get no timestamp
+            precision       "s", "ms", "us" or "ns", load the file with
+                            the same precision ( eg: influx write -p s )
+
+        tags given to BatchExporter.add() become tags, the other
+        fields of the reading become fields:
+
+            meter,macid=0xd8d5b9000000103f delivered=2224.0,received=154.0 1394422200
+    """
+    _scale = {'s': 1, 'ms': 1000, 'us': 1000000, 'ns': 1000000000}
+
+    def __init__(self, path, measurement="raineagle", time_field="timestamp",
+                 precision="s"):
+        if precision not in self._scale :
+            raise ValueError("precision must be one of s, ms, us, ns")
+        _FileSink.__init__(self, path)
+        self.measurement = _lp_key(measurement)
+        self.time_field = time_field
+        self.scale = self._scale[precision]
+        self._tags = dict()
+        self._keys = dict()
+
+    def _tag_str(self, tags):
+        if not tags :
+            return ""
+        key = tuple(sorted(tags.items()))
+        s = self._tags.get(key)
+        if s is None :
+            # the same few tag sets repeat for every reading
+            s = "".join(",{0}={1}".format(_lp_key(k), _lp_key(v))
+                        for k, v in key)
+            self._tags[key] = s
+        return s
+
+    def write(self, batch):
+        lines = []
+        time_field = self.time_field
+        keys = self._keys
+        for tags, rec in batch :
+            fields = []
+            ts = None
+            for k, v in _fields(rec).items() :
+                if k == time_field :
+                    ts = v
+                    continue
+                v = _lp_value(v)
+                if v is not None :
+                    ek = keys.get(k)
+                    if ek is None :
+                        ek = keys[k] = _lp_key(k) + "="
+                    fields.append(ek + v)
+            if not fields :
+                continue
+            line = self.measurement + self._tag_str(tags) + " " + ",".join(fields)
+            if ts is not None :
+                line += " {0}".format(int(ts * self.scale))
+            lines.append(line)
+        if lines :
+            self.fp.write("\n".join(lines) + "\n")
+            self.fp.flush()
+
+
+class CSVSink(_FileSink):
+    """
+        Writes readings as CSV rows
+
+        args:
+            path        file name ( appended to ) or file object
+            columns     column names, default: the tag names then the
+                        fields of the first reading
+
+        a header row is written to an empty file, values missing
+        from a reading are left empty and extra ones are dropped
+    """
+    def __init__(self, path, columns=None):
+        _FileSink.__init__(self, path)
+        self.columns = list(columns) if columns else None
+        self._writer = None
+
+    def write(self, batch):
+        if not batch :
+            return
+        if self._writer is None :
+            if self.columns is None :
+                tags, rec = batch[0]
+                self.columns = sorted(tags or ()) + \
+                    [k for k in _fields(rec) if not tags or k not in tags]
+            self._writer = csv.writer(self.fp)
+            try :
+                empty = self.fp.tell() == 0
+            except (AttributeError, OSError) :
+                empty = True
+            if empty :
+                self._writer.writerow(self.columns)
+
+        columns = self.columns
+        rows = []
+        for tags, rec in batch :
+            d = _fields(rec)
+            if tags :
+                d = dict(d, **tags)
+            rows.append([d.get(c, "") for c in columns])
+        self._writer.writerows(rows)
+        self.fp.flush()
+
+
+class ParquetSink:
+    """
+        Writes readings to a Parquet file ( requires pyarrow )
+
+        args:
+            path        file name, overwritten
+            columns     column names, default: the tag names then the
+                        fields of the first reading
+            compression parquet compression codec
+
+        each batch becomes a row group, the schema is taken from
+        the first batch
+    """
+    def __init__(self, path, columns=None, compression="snappy"):
+        try :
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError :
+            raise ImportError("ParquetSink requires pyarrow")
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path = path
+        self.columns = list(columns) if columns else None
+        self.compression = compression
+        self._writer = None
+
+    def write(self, batch):
+        if not batch :
+            return
+        if self.columns is None :
+            tags, rec = batch[0]
+            self.columns = sorted(tags or ()) + \
+                [k for k in _fields(rec) if not tags or k not in tags]
+
+        data = dict((c, []) for c in self.columns)
+        appends = [(c, data[c].append) for c in self.columns]
+        for tags, rec in batch :
+            d = _fields(rec)
+            if tags :
+                d = dict(d, **tags)
+            for c, append in appends :
+                append(d.get(c))
+
+        if self._writer is None :
+            table = self._pa.Table.from_pydict(data)
+            self._writer = self._pq.ParquetWriter(self.path, table.schema,
+                                                  compression=self.compression)
+        else :
+            table = self._pa.Table.from_pydict(data, schema=self._writer.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None :
+            self._writer.close()
+            self._writer = None
+
+
+class BatchExporter:
+    """
+        Buffers readings into batches and writes them to a sink
+        from a background thread
+
+        args:
+            sink            LineProtocolSink, CSVSink, ParquetSink or any
+                            object with write(batch) and close(), batch
+                            being a list of ( tags, reading ) tuples
+            batch_size      readings per batch
+            flush_interval  seconds a reading may wait in an unfilled
+                            batch before it is written anyway
+            max_pending     full batches waiting to be written before
+                            add() blocks ( back-pressure )
+
+        Readings are SummationRecords, DemandRecords, MeterRecords,
+        typed results or dicts.  add() only appends to the current
+        batch; the formatting and writing happen in the background.
+
+            with BatchExporter(LineProtocolSink("meter.lp", "meter")) as ex :
+                for rec in eg.iter_history() :
+                    ex.add(rec, {'macid': eg.macid})
+
+        An error raised by the sink is raised again by the next add(),
+        flush() or close(), the batch it was writing is lost.
+
+            written     readings handed to the sink
+            batches     batches handed to the sink
+    """
+    def __init__(self, sink, batch_size=5000, flush_interval=1.0,
+                 max_pending=4):
+        if batch_size < 1 :
+            raise ValueError("batch_size must be at least 1")
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.batches = 0
+        self.error = None
+        self._batch = []
+        self._started = None
+        self._lock = threading.Lock()
+        # held by the writer thread while the sink writes
+        self._write_lock = threading.Lock()
+        self._queue = queue.Queue(max(1, max_pending))
+        self._closed = False
+        self._thread = threading.Thread(target=self._run,
+                                        name="RainEagle-export", daemon=True)
+        self._thread.start()
+
+    def _raise(self):
+        error, self.error = self.error, None
+        if error is not None :
+            raise error
+
+    def add(self, rec, tags=None):
+        """
+            queue one reading, tags is a dict of name : value ( eg:
+            the macid ); blocks while max_pending batches are waiting
+        """
+        if self.error is not None :
+            self._raise()
+        with self._lock :
+            batch = self._batch
+            if not batch :
+                self._started = monotonic()
+            batch.append((tags, rec))
+            if len(batch) < self.batch_size :
+                return
+            self._batch = []
+            # queued under the lock, so a timed flush can't write a
+            # newer batch before this one
+            self._queue.put(batch)
+
+    def extend(self, records, tags=None):
+        """
+            queue a sequence of readings sharing the same tags
+        """
+        for rec in records :
+            self.add(rec, tags)
+
+    def _queue_batch(self):
+        """
+            queue the unfilled batch, if any
+        """
+        with self._lock :
+            batch, self._batch = self._batch, []
+            if batch :
+                self._queue.put(batch)
+
+    def _write(self, batch):
+        """
+            ( writer thread, holding _write_lock )
+        """
+        try :
+            self.sink.write(batch)
+        except Exception as e :
+            if self.error is None :
+                self.error = e
+            return
+        self.written += len(batch)
+        self.batches += 1
+
+    def _run(self):
+        get = self._queue.get
+        while True :
+            started = self._started
+            if started is None or not self._batch :
+                wait = self.flush_interval
+            else :
+                wait = max(0.0, started + self.flush_interval - monotonic())
+            try :
+                batch = get(timeout=wait)
+            except queue.Empty :
+                # a batch that is not filling up fast enough
+                with self._write_lock :
+                    # add() may be holding _lock while it waits for
+                    # room in the queue, which only this thread makes
+                    if not self._lock.acquire(timeout=0.05) :
+                        continue
+                    try :
+                        batch = self._batch
+                        if (batch and self._queue.empty() and
+                                monotonic() - self._started >= self.flush_interval) :
+                            self._batch = []
+                        else :
+                            batch = None
+                    finally :
+                        self._lock.release()
+                    if batch :
+                        self._write(batch)
+                continue
+            try :
+                if batch is None :
+                    return
+                with self._write_lock :
+                    self._write(batch)
+            finally :
+                self._queue.task_done()
+
+    def flush(self):
+        """
+            write everything added so far, returns once it is written
+        """
+        self._queue_batch()
+        self._queue.join()
+        # a batch taken by a timed flush is not in the queue
+        with self._write_lock :
+            pass
+        self._raise()
+
+    def close(self):
+        """
+            flush, stop the writer thread and close the sink
+        """
+        if self._closed :
+            return
+        self._closed = True
+        self._queue_batch()
+        self._queue.put(None)
+        self._thread.join()
+        self.sink.close()
+        self._raise()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,153 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import asyncio
+import time
+from collections import namedtuple
+
+from .EagleAsync import AsyncEagle, AsyncHTTPTransport
+from .EagleDeadline import AsyncHedger
+from .EagleHTTP import _split_addr
+
+__all__ = ['Fleet', 'FleetResult']
+
+FleetResult = namedtuple('FleetResult',
+                         ['addr', 'macid', 'command', 'result', 'error', 'elapsed'])
+FleetResult.__doc__ = """
+    result of running one command against one gateway
+
+    error is None on success, otherwise the exception raised
+    ( asyncio.TimeoutError if the deadline was exceeded )
+"""
+
+_gateway_fields = ('addr', 'username', 'password', 'macid')
+
+
+class Fleet:
+    """
+        Run commands against many EAGLE gateways concurrently
+
+        args:
+            gateways        iterable of gateways, each either an address,
+                            a (addr, username, password, macid) tuple
+                            or a dict with those keys
+            concurrency     max requests in flight over the whole fleet
+            per_host        max requests in flight to any one host
+            deadline        seconds allowed for each gateway to answer
+            **kwargs        passed on to AsyncEagle ( debug, checkfirmware, ... )
+                            hedge=True ( or a percentile ) shares one
+                            AsyncHedger, so hedging follows the latency
+                            of the whole fleet
+
+        example :
+
+            fleet = Fleet([("10.1.1.39", "user", "pass", "d8:d5:b9:00:00:00:12:96"),
+                           ("10.1.1.40", "user", "pass", None)])
+            for r in fleet.sweep("get_usage_data") :
+                print(r.addr, r.error or r.result['demand'])
+
+        results are returned as each gateway answers, so a sweep takes
+        about as long as the slowest gateway instead of the sum of all
+    """
+    def __init__(self, gateways, concurrency=100, per_host=1, deadline=10,
+                 **kwargs):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.deadline = deadline
+
+        kwargs.setdefault('timeout', deadline)
+        kwargs.setdefault('transport',
+                          AsyncHTTPTransport(maxsize=per_host,
+                                             timeout=kwargs['timeout']))
+        self.transport = kwargs['transport']
+
+        hedge = kwargs.get('hedge')
+        if hedge is True :
+            kwargs['hedge'] = AsyncHedger()
+        elif isinstance(hedge, float) :
+            kwargs['hedge'] = AsyncHedger(percentile=hedge)
+
+        self.eagles = []
+        for gw in gateways :
+            if isinstance(gw, str) :
+                gw = {'addr': gw}
+            elif not isinstance(gw, dict) :
+                gw = dict(zip(_gateway_fields, gw))
+            args = dict(kwargs)
+            args.update(gw)
+            self.eagles.append(AsyncEagle(**args))
+
+    async def _run_one(self, eagle, fleet_sem, host_sem, command, args, kwargs):
+        async with fleet_sem :
+            async with host_sem :
+                start = time.time()
+                try :
+                    result = await asyncio.wait_for(
+                        getattr(eagle, command)(*args, **kwargs),
+                        self.deadline)
+                    error = None
+                except Exception as e :
+                    result, error = None, e
+                return FleetResult(eagle.addr, eagle.macid, command,
+                                   result, error, time.time() - start)
+
+    async def iter_command(self, command, *args, **kwargs):
+        """
+            async generator running command on every gateway,
+            yields a FleetResult as each gateway completes
+
+                async for r in fleet.iter_command("get_price") :
+                    ...
+        """
+        fleet_sem = asyncio.Semaphore(self.concurrency)
+        host_sems = dict()
+        tasks = []
+        for eagle in self.eagles :
+            host = _split_addr(eagle.addr)[0]
+            if host not in host_sems :
+                host_sems[host] = asyncio.Semaphore(self.per_host)
+            tasks.append(asyncio.ensure_future(
+                self._run_one(eagle, fleet_sem, host_sems[host],
+                              command, args, kwargs)))
+        try :
+            for fut in asyncio.as_completed(tasks) :
+                yield await fut
+        finally :
+            for t in tasks :
+                t.cancel()
+
+    async def run(self, command, *args, **kwargs):
+        """
+            run command on every gateway, returns a list of FleetResult
+            in completion order
+        """
+        return [r async for r in self.iter_command(command, *args, **kwargs)]
+
+    def sweep(self, command, *args, **kwargs):
+        """
+            blocking generator version of iter_command()
+            for use outside of an event loop
+        """
+        loop = asyncio.new_event_loop()
+        agen = self.iter_command(command, *args, **kwargs)
+        try :
+            while True :
+                try :
+                    yield loop.run_until_complete(agen.__anext__())
+                except StopAsyncIteration :
+                    break
+        finally :
+            loop.run_until_complete(agen.aclose())
+            # connections belong to this loop
+            self.transport.close()
+            loop.run_until_complete(asyncio.sleep(0))
+            loop.close()
+
+    def close(self):
+        """
+            close any open connections
+        """
+        self.transport.close()
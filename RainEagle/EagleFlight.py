@@ -0,0 +1,119 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import threading
+from copy import copy
+
+from .EagleDeadline import current, budget, DeadlineExceeded
+
+__all__ = ['SingleFlight', 'AsyncSingleFlight']
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _shared_error(e):
+    """
+        a copy of the leader's exception for a waiting caller, so
+        callers raising it at the same time don't all set the
+        __traceback__ of one instance ( the leader's is the __cause__ )
+    """
+    try :
+        err = copy(e)
+    except Exception :
+        return e
+    err.__cause__ = e
+    err.__traceback__ = None
+    return err
+
+
+class SingleFlight:
+    """
+        Coalesce concurrent identical calls ( threads )
+
+        The first caller for a key runs the function, callers arriving
+        with the same key while it is in flight wait for and share
+        its result ( or exception ).
+
+        A waiting caller only waits as long as its own deadline()
+        allows, then raises DeadlineExceeded; the call goes on for
+        the others.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = dict()
+
+    def do(self, key, fn, *args):
+        """
+            returns (result, shared) tuple,
+            shared is true if the result came from another caller
+        """
+        with self._lock :
+            call = self._calls.get(key)
+            leader = call is None
+            if leader :
+                call = self._calls[key] = _Call()
+
+        if not leader :
+            if not call.event.wait(budget(current())) :
+                raise DeadlineExceeded("deadline exceeded")
+            if call.error is not None :
+                raise _shared_error(call.error)
+            return call.result, True
+
+        try :
+            call.result = fn(*args)
+        except BaseException as e :
+            call.error = e
+            raise
+        finally :
+            with self._lock :
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """
+        Coalesce concurrent identical calls ( asyncio )
+
+        see SingleFlight, fn must be a coroutine function.
+        The shared call runs in its own task so cancelling one
+        caller does not cancel it for the others.
+    """
+    def __init__(self):
+        self._calls = dict()
+
+    async def do(self, key, fn, *args):
+        """
+            returns (result, shared) tuple,
+            shared is true if the result came from another caller
+        """
+        import asyncio
+        task = self._calls.get(key)
+        shared = task is not None
+        if not shared :
+            task = asyncio.ensure_future(fn(*args))
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            return await asyncio.shield(task), False
+        try :
+            return await asyncio.shield(task), True
+        except Exception as e :
+            raise _shared_error(e)
+
+    def _done(self, key, task):
+        if self._calls.get(key) is task :
+            del self._calls[key]
+        # mark the exception as retrieved even if every caller went away
+        if not task.cancelled() :
+            task.exception()
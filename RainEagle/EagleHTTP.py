@@ -0,0 +1,167 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import threading
+from time import perf_counter
+
+from .EagleDeadline import current, budget
+
+__all__ = ['HTTPTransport']
+
+CGI_PATH = "/cgi-bin/cgi_manager"
+
+# http.client pulls in email and ssl, it is imported by the first
+# connection ( see _connection_class ) so scripts using only the
+# socket api don't pay for it
+_HTTPConnection = None
+
+# raised when the gateway has silently dropped a kept-alive connection
+# (RemoteDisconnected is a subclass of ConnectionResetError),
+# http.client.BadStatusLine is added along with _HTTPConnection
+_stale_errors = (ConnectionResetError, ConnectionAbortedError,
+                 BrokenPipeError)
+
+
+def _connection_class():
+    global _HTTPConnection, _stale_errors
+    if _HTTPConnection is None :
+        import http.client
+        _stale_errors = _stale_errors + (http.client.BadStatusLine,)
+        _HTTPConnection = http.client.HTTPConnection
+    return _HTTPConnection
+
+
+def _split_addr(addr, default_port=80):
+    """
+        split "host" or "host:port" into a (host, port) tuple
+    """
+    host, sep, port = addr.rpartition(':')
+    if sep and port.isdigit() and ']' not in port :
+        return host.strip('[]'), int(port)
+    return addr.strip('[]'), default_port
+
+
+class HTTPTransport:
+    """
+        Pool of keep-alive HTTP connections to EAGLE gateways
+
+        args:
+            maxsize     idle connections kept per gateway
+                        (0 closes the connection after every request)
+            timeout     TCP socket timeout
+
+        A single transport may be shared by several Eagle instances,
+        connections are pooled per gateway address ( "host" or "host:port" )
+    """
+    def __init__(self, maxsize=1, timeout=10):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._idle = dict()
+        self._lock = threading.Lock()
+
+    def _get_conn(self, addr):
+        """
+            returns a (connection, reused) tuple
+        """
+        with self._lock :
+            idle = self._idle.get(addr)
+            if idle :
+                return idle.pop(), True
+        return _connection_class()(addr, timeout=self.timeout), False
+
+    def _put_conn(self, addr, conn):
+        with self._lock :
+            idle = self._idle.setdefault(addr, [])
+            if len(idle) < self.maxsize :
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, addr, body, headers=None, path=CGI_PATH, timing=None,
+                idempotent=False):
+        """
+            POST body to gateway at addr
+
+            A connection that was reused from the pool and turns out to
+            have been closed by the device is replaced and the request
+            is sent once more on a fresh connection.  Once the request
+            has been sent it may have reached the device, so it is only
+            sent again if idempotent is set ( a get_* command ).
+
+            If timing is a dict the connect and first byte times and
+            the request and responce sizes are stored in it
+            ( see EagleStats )
+
+            Inside a deadline() the socket timeouts are cut to the time
+            left, and DeadlineExceeded is raised once it has passed
+
+            returns (http_status, response_body) tuple
+        """
+        hdrs = {"Content-Type": "application/x-www-form-urlencoded"}
+        if self.maxsize < 1 :
+            hdrs["Connection"] = "close"
+        if headers :
+            hdrs.update(headers)
+
+        if timing is not None :
+            t0 = perf_counter()
+        when = current()
+        while True :
+            conn, reused = self._get_conn(addr)
+            sent = False
+            try :
+                if when is not None :
+                    conn.timeout = budget(when, self.timeout)
+                if timing is not None or when is not None :
+                    if conn.sock is None :
+                        conn.connect()
+                    if timing is not None :
+                        timing['connect'] = 0.0 if reused else perf_counter() - t0
+                if when is not None :
+                    conn.sock.settimeout(budget(when, self.timeout))
+                conn.request("POST", path, body, hdrs)
+                sent = True
+                if when is not None :
+                    conn.sock.settimeout(budget(when, self.timeout))
+                response = conn.getresponse()
+                if timing is not None :
+                    timing['first_byte'] = perf_counter() - t0
+                if when is not None and conn.sock is not None :
+                    conn.sock.settimeout(budget(when, self.timeout))
+                the_page = response.read()
+                budget(when)
+            except _stale_errors :
+                conn.close()
+                if reused and (idempotent or not sent) :
+                    continue
+                raise
+            except Exception :
+                conn.close()
+                raise
+            break
+
+        if response.will_close :
+            conn.close()
+        else :
+            if when is not None :
+                conn.timeout = self.timeout
+                conn.sock.settimeout(self.timeout)
+            self._put_conn(addr, conn)
+
+        if timing is not None :
+            timing['request_bytes'] = len(body)
+            timing['response_bytes'] = len(the_page)
+        return response.status, the_page
+
+    def close(self):
+        """
+            close all idle connections
+        """
+        with self._lock :
+            idle, self._idle = self._idle, dict()
+        for conns in idle.values() :
+            for conn in conns :
+                conn.close()
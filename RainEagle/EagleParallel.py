@@ -0,0 +1,259 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import os
+from array import array
+
+from .EagleDecode import SummationColumns, decode_summations, _want_numpy
+from .EagleSocket import _wrap_start, _wrap_end
+
+__all__ = ['HistoryDecoder', 'decode_history_dumps', 'backfill']
+
+_open = b"<CurrentSummation>"
+_close = b"</CurrentSummation>"
+
+
+def _split(data, chunk_records):
+    """
+        cut a get_history_data responce into pieces of about
+        chunk_records CurrentSummation elements each
+
+        the records are all about the same size, so the cuts are
+        estimated from the first one and moved to the next closing
+        tag, the responce is not scanned.  Anything after the last
+        complete record ( eg: a responce cut short ) is dropped.
+    """
+    first = data.find(_open)
+    if first < 0 :
+        return []
+    last = data.rfind(_close)
+    if last < first :
+        return []
+    last += len(_close)
+    rec_end = data.find(_close, first) + len(_close)
+    step = (rec_end - first) * max(1, chunk_records)
+
+    chunks = []
+    pos = first
+    while pos < last :
+        cut = pos + step
+        if cut >= last :
+            cut = last
+        else :
+            cut = data.find(_close, cut - len(_close)) + len(_close)
+        chunks.append(data[pos:cut])
+        pos = cut
+    return chunks
+
+
+def _decode_chunk(data):
+    """
+        ( runs in the worker processes )
+
+        decode a run of CurrentSummation elements, returns the
+        timestamp, delivered and received columns in timestamp order
+        ( of records with the same timestamp the first is kept )
+        as the bytes of array('q'), array('d'), array('d'), which are
+        far cheaper to send back than records or dicts
+    """
+    from xml.etree.ElementTree import XMLParser
+    parser = XMLParser()
+    parser.feed(_wrap_start)
+    parser.feed(data)
+    parser.feed(_wrap_end)
+    root = parser.close()
+    ts, dl, rc = decode_summations(root.findall("CurrentSummation"),
+                                   use_numpy=False)
+    if any(a >= b for a, b in zip(ts, ts[1:])) :
+        ts, dl, rc = _ordered(ts, dl, rc)
+    return ts.tobytes(), dl.tobytes(), rc.tobytes()
+
+
+def _ordered(ts, dl, rc):
+    """
+        sort the columns by timestamp, of records with the same
+        timestamp the first is kept
+    """
+    # sorted() is stable and merges already sorted runs
+    order = sorted(range(len(ts)), key=ts.__getitem__)
+    keep = []
+    prev = None
+    for i in order :
+        if ts[i] != prev :
+            keep.append(i)
+            prev = ts[i]
+    return (array('q', [ts[i] for i in keep]),
+            array('d', [dl[i] for i in keep]),
+            array('d', [rc[i] for i in keep]))
+
+
+def _frombytes(typecode, data):
+    a = array(typecode)
+    a.frombytes(data)
+    return a
+
+
+def _columns(parts):
+    """
+        merge decoded chunks into one SummationColumns in timestamp
+        order, of records with the same timestamp the first is kept
+
+        each chunk is already ordered without repeats ( see
+        _decode_chunk ), so chunks that don't overlap are joined
+    """
+    parts = sorted((p for p in parts if p[0]), key=lambda p: p[0][0])
+    ts, dl, rc = array('q'), array('d'), array('d')
+    ordered = True
+    for pts, pdl, prc in parts :
+        if ts and pts[0] <= ts[-1] :
+            # overlapping dumps ( eg: two backfills of one gateway )
+            ordered = False
+        ts.extend(pts)
+        dl.extend(pdl)
+        rc.extend(prc)
+    if ordered :
+        return ts, dl, rc
+    return _ordered(ts, dl, rc)
+
+
+class HistoryDecoder:
+    """
+        Decodes raw get_history_data responces ( see
+        Eagle.get_history_raw() ) in a pool of processes
+
+        args:
+            workers         processes to decode with ( default: one per
+                            cpu ), 0 or 1 decodes in this process
+            chunk_records   CurrentSummation records sent to a worker
+                            at a time
+            use_numpy       return numpy arrays ( default: if numpy
+                            is installed )
+            executor        an Executor to use instead of starting a
+                            ProcessPoolExecutor, it is not shut down
+
+        Each responce is cut into chunks as it is added, so the
+        decoding of one gateway is spread over all the workers and
+        starts while other gateways are still being fetched.  The
+        workers return the decoded columns as flat arrays, the XML
+        and the records never leave them.
+
+            with HistoryDecoder() as dec :
+                for eg in eagles :
+                    dec.add(eg.macid, eg.get_history_raw())
+                columns = dec.result()
+
+        result() returns { macid : SummationColumns }, each in
+        timestamp order.  Responces for the same macid are merged,
+        of records with the same timestamp the first is kept.
+    """
+    def __init__(self, workers=None, chunk_records=20000, use_numpy=None,
+                 executor=None):
+        if workers is None :
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.chunk_records = chunk_records
+        self.use_numpy = _want_numpy(use_numpy)
+        self._executor = executor
+        self._own = False
+        if executor is None and workers > 1 :
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+            self._own = True
+        # macid -> list of futures, or of decoded chunks
+        self._pending = dict()
+
+    def add(self, macid, data):
+        """
+            queue the raw responce of one gateway for decoding
+        """
+        parts = self._pending.setdefault(macid, [])
+        for chunk in _split(data, self.chunk_records) :
+            if self._executor is None :
+                parts.append(_decode_chunk(chunk))
+            else :
+                parts.append(self._executor.submit(_decode_chunk, chunk))
+
+    def result(self):
+        """
+            wait for everything added, returns { macid : SummationColumns }
+
+            raises the error of a chunk that could not be decoded
+            ( eg: xml.etree.ElementTree.ParseError )
+        """
+        out = dict()
+        for macid, parts in self._pending.items() :
+            decoded = []
+            for part in parts :
+                if not isinstance(part, tuple) :
+                    part = part.result()
+                decoded.append(tuple(_frombytes(t, b) for t, b in
+                                     zip(('q', 'd', 'd'), part)))
+            ts, dl, rc = _columns(decoded)
+            if self.use_numpy :
+                from .EagleDecode import numpy
+                ts = numpy.frombuffer(ts, dtype=numpy.int64)
+                dl = numpy.frombuffer(dl, dtype=numpy.float64)
+                rc = numpy.frombuffer(rc, dtype=numpy.float64)
+            out[macid] = SummationColumns(ts, dl, rc)
+        return out
+
+    def close(self):
+        self._pending = dict()
+        if self._own :
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+            self._own = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def decode_history_dumps(dumps, workers=None, chunk_records=20000,
+                         use_numpy=None, executor=None):
+    """
+        decode raw get_history_data responces in a pool of processes
+
+        args:
+            dumps       dict of { macid : responce bytes } or iterable
+                        of ( macid, responce bytes )
+
+        see HistoryDecoder for the other args
+
+        returns { macid : SummationColumns }, each in timestamp order
+    """
+    if isinstance(dumps, dict) :
+        dumps = dumps.items()
+    with HistoryDecoder(workers, chunk_records, use_numpy, executor) as dec :
+        for macid, data in dumps :
+            dec.add(macid, data)
+        return dec.result()
+
+
+def backfill(fleet, start="0x00000000", end=None, frequency=None,
+             workers=None, chunk_records=20000, use_numpy=None, executor=None):
+    """
+        fetch the history of every gateway of a Fleet and decode it
+        in a pool of processes, each responce is decoded as soon as
+        it has been received
+
+        returns ( { macid : SummationColumns }, [ FleetResult ... ] ),
+        the FleetResults being those of the gateways that failed
+
+        ( the Fleet deadline applies to each responce, it may need
+        raising for long histories )
+    """
+    failed = []
+    with HistoryDecoder(workers, chunk_records, use_numpy, executor) as dec :
+        for r in fleet.sweep("get_history_raw", start=start, end=end,
+                             frequency=frequency) :
+            if r.error is not None :
+                failed.append(r)
+                continue
+            dec.add(r.macid, r.result)
+        return dec.result(), failed
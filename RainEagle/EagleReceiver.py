@@ -0,0 +1,402 @@
+"""
+    Receiver for the pushes of the EAGLE cloud uploader
+
+    Once pointed at it with set_cloud() the gateway POSTs its readings
+    as they change, so there is no polling of the device:
+
+        <rainforest macId="0xd8d5b90000001296" timestamp="1394422200s">
+        <InstantaneousDemand>
+            <DeviceMacId>0xd8d5b90000001296</DeviceMacId>
+            <TimeStamp>0x1ab3d3a9</TimeStamp>
+            <Demand>0x0001f4</Demand>
+            ...
+        </InstantaneousDemand>
+        </rainforest>
+
+    run standalone, printing one JSON line per reading:
+
+        python -m RainEagle.EagleReceiver --port 8080
+"""
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import sys
+import json
+import base64
+import asyncio
+import argparse
+from xml.etree.ElementTree import XMLPullParser, ParseError
+
+from .EagleClass import _et2d
+from .EagleDecode import decode_demand, decode_summation
+
+__all__ = ['UploadReceiver', 'point_fleet']
+
+# fragment tag -> decoder, other fragments are passed on as dicts
+_decoders = {
+    'InstantaneousDemand': decode_demand,
+    'CurrentSummation': decode_summation,
+    'CurrentSummationDelivered': decode_summation,
+}
+
+_reasons = {200: "OK", 400: "Bad Request", 401: "Unauthorized",
+            404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class _Reject(Exception):
+    """
+        answer the current request with status and close the connection
+    """
+    def __init__(self, status):
+        Exception.__init__(self, status)
+        self.status = status
+
+
+class UploadReceiver:
+    """
+        asyncio HTTP server for the POSTs of the EAGLE cloud uploader
+
+        args:
+            handler     called as handler(macid, record) for every
+                        fragment pushed ( may be a coroutine function )
+            exporter    BatchExporter the decoded readings are added
+                        to, tagged with the macid
+            host        address to listen on
+            port        port to listen on ( 0 picks a free one,
+                        see the port attribute once started )
+            path        only accept POSTs to this url path
+                        ( default: any )
+            username    require HTTP Basic authentication, as set up
+            password    by the user:password@ part of the set_cloud url
+            max_body    largest POST accepted ( bytes )
+            timeout     seconds an idle connection is kept open
+
+        InstantaneousDemand becomes a DemandRecord, CurrentSummation
+        ( and CurrentSummationDelivered ) a SummationRecord, the same
+        as decode_demand() / decode_summation() of polled results; any
+        other fragment is passed as a dict { tag : fields }.
+
+        Bodies are parsed as they arrive, each fragment is handed on
+        as soon as its closing tag is read.  Connections are kept
+        alive, so a gateway reuses one for its pushes.  Readings are
+        added to the exporter from a thread, so BatchExporter
+        back-pressure only delays the answers to the gateways whose
+        readings are waiting.  A handler runs on the event loop and
+        must not block ( use a coroutine function ).  A request whose
+        handler ( or exporter ) raises is answered 500.
+
+            exporter = BatchExporter(LineProtocolSink("meter.lp", "meter"))
+            rcv = UploadReceiver(exporter=exporter, port=8080)
+            point_fleet(fleet, rcv.url("10.1.1.2"))
+            rcv.run()
+
+        posts, records and errors count the POSTs accepted,
+        fragments handed on and requests rejected or failed.
+    """
+    def __init__(self, handler=None, exporter=None, host="0.0.0.0", port=8080,
+                 path=None, username=None, password=None,
+                 max_body=4 * 1024 * 1024, timeout=120):
+        self.handler = handler
+        self.exporter = exporter
+        self.host = host
+        self.port = port
+        self.path = path
+        self.username = username
+        self.password = password
+        self.max_body = max_body
+        self.timeout = timeout
+        if username is not None :
+            self._auth = "Basic " + base64.b64encode(
+                (username + ":" + (password or "")).encode()).decode()
+        else :
+            self._auth = None
+        self._async_handler = asyncio.iscoroutinefunction(handler)
+        self._server = None
+        # open connections, writer -> task
+        self._conns = dict()
+        self.posts = 0
+        self.records = 0
+        self.errors = 0
+
+    def url(self, host=None):
+        """
+            the url to give set_cloud(), host being the address the
+            gateways reach this machine at ( default: the listening
+            address )
+        """
+        host = host or self.host
+        userinfo = ""
+        if self.username is not None :
+            userinfo = "{0}:{1}@".format(self.username, self.password or "")
+        return "http://{0}{1}:{2}{3}".format(userinfo, host, self.port,
+                                             self.path or "/")
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._connection, self.host, self.port, backlog=1024,
+            reuse_address=True)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None :
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self):
+        """
+            stop listening and close the connections kept alive
+        """
+        if self._server is not None :
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        conns, self._conns = self._conns, dict()
+        for writer in conns :
+            writer.close()
+        if conns :
+            await asyncio.gather(*conns.values(), return_exceptions=True)
+
+    def run(self):
+        """
+            serve until interrupted ( blocking )
+        """
+        try :
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt :
+            pass
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _connection(self, reader, writer):
+        self._conns[writer] = asyncio.current_task()
+        try :
+            while True :
+                try :
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), self.timeout)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        asyncio.TimeoutError, ConnectionError) :
+                    break
+                try :
+                    keep_alive = await self._request(head, reader)
+                    status = 200
+                except _Reject as e :
+                    self.errors += 1
+                    keep_alive = False
+                    status = e.status
+                writer.write("HTTP/1.1 {0} {1}\r\nContent-Length: 0\r\n{2}\r\n".format(
+                    status, _reasons[status],
+                    "" if keep_alive else "Connection: close\r\n").encode())
+                await writer.drain()
+                if not keep_alive :
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError,
+                asyncio.TimeoutError) :
+            pass
+        finally :
+            self._conns.pop(writer, None)
+            writer.close()
+
+    async def _request(self, head, reader):
+        """
+            handle one request, returns whether to keep the connection
+        """
+        lines = head.decode("latin-1").split("\r\n")
+        try :
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError :
+            raise _Reject(400)
+        headers = dict()
+        for line in lines[1:] :
+            k, sep, v = line.partition(":")
+            if sep :
+                headers[k.strip().lower()] = v.strip()
+
+        if self.path is not None and target.split("?", 1)[0] != self.path :
+            raise _Reject(404)
+        if method != "POST" :
+            raise _Reject(405)
+        if self._auth is not None and headers.get("authorization") != self._auth :
+            raise _Reject(401)
+
+        parser = XMLPullParser(("start", "end"))
+        state = [0, None, None]     # depth, root, macid
+        try :
+            if headers.get("transfer-encoding", "").lower() == "chunked" :
+                size = 0
+                while True :
+                    line = await asyncio.wait_for(reader.readline(), self.timeout)
+                    n = int(line.split(b";", 1)[0], 16)
+                    if n == 0 :
+                        # trailers
+                        while (await asyncio.wait_for(reader.readline(),
+                                self.timeout)) not in (b"\r\n", b"") :
+                            pass
+                        break
+                    size += n
+                    if size > self.max_body :
+                        raise _Reject(413)
+                    chunk = await asyncio.wait_for(reader.readexactly(n + 2),
+                                                   self.timeout)
+                    parser.feed(chunk[:-2])
+                    await self._dispatch(parser, state)
+            else :
+                left = int(headers.get("content-length", 0))
+                if left > self.max_body :
+                    raise _Reject(413)
+                while left > 0 :
+                    chunk = await asyncio.wait_for(reader.read(min(left, 65536)),
+                                                   self.timeout)
+                    if not chunk :
+                        raise ConnectionError("connection closed")
+                    left -= len(chunk)
+                    parser.feed(chunk)
+                    await self._dispatch(parser, state)
+            parser.close()
+        except (ParseError, ValueError) :
+            raise _Reject(400)
+        self.posts += 1
+
+        conn = headers.get("connection", "").lower()
+        if version == "HTTP/1.0" :
+            return conn == "keep-alive"
+        return conn != "close"
+
+    async def _dispatch(self, parser, state):
+        """
+            hand on each fragment ( child of the root element )
+            completed in what was fed to parser
+        """
+        done = []
+        for event, elem in parser.read_events() :
+            if event == "start" :
+                if state[0] == 0 :
+                    state[1] = elem
+                    state[2] = elem.get("macId")
+                state[0] += 1
+                continue
+            state[0] -= 1
+            if state[0] != 1 :
+                continue
+
+            decode = _decoders.get(elem.tag)
+            rec = None
+            if decode is not None :
+                try :
+                    rec = decode(elem)
+                except (TypeError, ValueError) :
+                    pass
+            macid = state[2] or elem.findtext("DeviceMacId")
+            if rec is None :
+                rec = {elem.tag: _et2d(elem)}
+                export = False
+            else :
+                export = True
+            # the fragment is done with
+            state[1].remove(elem)
+            done.append((macid, rec, export))
+        if not done :
+            return
+        self.records += len(done)
+
+        try :
+            if self.exporter is not None :
+                recs = [(macid, rec) for macid, rec, export in done if export]
+                if recs :
+                    # add() blocks under back-pressure, which must only
+                    # hold up this gateway and not the event loop
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, self._export, recs)
+            if self.handler is not None :
+                for macid, rec, _ in done :
+                    if self._async_handler :
+                        await self.handler(macid, rec)
+                    else :
+                        self.handler(macid, rec)
+        except Exception :
+            raise _Reject(500)
+
+    def _export(self, recs):
+        """
+            ( executor thread ) add the readings of one _dispatch()
+        """
+        add = self.exporter.add
+        for macid, rec in recs :
+            add(rec, {'macid': macid})
+
+
+def point_fleet(fleet, url, authcode="", email=""):
+    """
+        set_cloud(url) on every gateway of a Fleet, eg: to the
+        url() of an UploadReceiver
+
+        returns the FleetResults ( check their error )
+
+        ( from async code : await fleet.run("set_cloud", url=url) )
+    """
+    return list(fleet.sweep("set_cloud", url=url, authcode=authcode,
+                            email=email))
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+                    description="receive pushes of the Eagle cloud uploader")
+
+    parser.add_argument("-H", "--host", dest="host", default="0.0.0.0",
+                    help="address to listen on")
+    parser.add_argument("-p", "--port", dest="port", type=int,
+                    default=8080, help="port to listen on")
+    parser.add_argument("--path", dest="path",
+                    help="only accept POSTs to this url path")
+    parser.add_argument("-u", "--username", dest="username",
+                    help="require HTTP Basic authentication")
+    parser.add_argument("-s", "--password", dest="password")
+    parser.add_argument("-o", "--output", dest="output",
+                    help="export readings to file ( default: JSON lines "
+                         "on stdout )")
+    parser.add_argument("-f", "--format", dest="format", default="lp",
+                    choices=("lp", "csv", "parquet"),
+                    help="format of --output")
+    return parser
+
+
+def _print_record(macid, rec):
+    d = rec._asdict() if hasattr(rec, '_asdict') else dict(rec)
+    d['macid'] = macid
+    sys.stdout.write(json.dumps(d, separators=(',', ':')) + "\n")
+    sys.stdout.flush()
+
+
+def main():
+    args = create_parser().parse_args()
+    exporter = None
+    handler = _print_record
+    if args.output :
+        from .EagleExport import BatchExporter, LineProtocolSink, CSVSink, \
+            ParquetSink
+        sink = {'lp': LineProtocolSink, 'csv': CSVSink,
+                'parquet': ParquetSink}[args.format](args.output)
+        exporter = BatchExporter(sink)
+        handler = None
+
+    rcv = UploadReceiver(handler, exporter, host=args.host, port=args.port,
+                         path=args.path, username=args.username,
+                         password=args.password)
+    try :
+        rcv.run()
+    finally :
+        if exporter is not None :
+            exporter.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import sys
+import time
+import traceback
+import heapq
+import random
+import itertools
+import threading
+
+__all__ = ['PollScheduler', 'GatewayState']
+
+
+class GatewayState:
+    """
+        scheduling state of one gateway in a PollScheduler
+
+            interval        current adaptive poll interval ( seconds )
+            volatility      running average of relative demand change
+            refresh         estimated seconds between meter updates
+            failures        consecutive failed polls
+            last            last reading returned by get_usage_data()
+    """
+    __slots__ = ('eagle', 'interval', 'volatility', 'refresh', 'offset',
+                 'failures', 'last', 'demand', 'demand_timestamp', 'due')
+
+    def __init__(self, eagle, interval):
+        self.eagle = eagle
+        self.interval = interval
+        self.volatility = 0.0
+        self.refresh = None
+        # smallest ( local time - demand_timestamp ) seen,
+        # device clock offset plus the shortest observed latency
+        self.offset = None
+        self.failures = 0
+        self.last = None
+        self.demand = None
+        self.demand_timestamp = None
+        self.due = 0.0
+
+
+class PollScheduler:
+    """
+        Poll get_usage_data() on many gateways with adaptive intervals
+
+        args:
+            eagles          Eagle instances to poll
+            callback        called as callback(eagle, reading) for each
+                            new reading ( not for repeats of the last one )
+            min_interval    shortest poll interval ( seconds )
+            max_interval    longest poll interval when demand is steady
+            jitter          fraction of random jitter added to each delay
+            backoff_max     longest delay after failed polls
+            workers         threads polling gateways
+            errback         called as errback(eagle, exception) on failures
+
+        errors counts polls that failed outside of get_usage_data()
+        ( eg: an exception raised by callback ), they are reported
+        on stderr and the gateway is polled again after backoff_max
+
+        Gateways are kept in a priority queue ordered by when they are
+        next due.  The interval of a gateway shrinks while its demand
+        is volatile and grows while it is steady.  Polls are not
+        scheduled before the meter is expected to have refreshed its
+        reading ( estimated from demand_timestamp ), and failing
+        gateways back off exponentially.
+    """
+    # relative demand change ( smoothed ) above which polling speeds up
+    # and below which it slows down
+    volatile = 0.20
+    steady = 0.05
+    # smoothing factor for the running averages
+    alpha = 0.3
+
+    def __init__(self, eagles=(), callback=None, min_interval=5,
+                 max_interval=300, jitter=0.1, backoff_max=900, workers=8,
+                 errback=None):
+        self.callback = callback
+        self.errback = errback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.backoff_max = backoff_max
+        self.workers = workers
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.errors = 0
+        self.states = []
+        for eg in eagles :
+            self.add(eg)
+
+    def add(self, eagle, interval=None):
+        """
+            add a gateway, its first poll is due right away
+            ( spread out by the jitter )
+        """
+        st = GatewayState(eagle, interval or self.min_interval)
+        self.states.append(st)
+        self._schedule(st, random.uniform(0, self.jitter * st.interval))
+        return st
+
+    def _schedule(self, st, delay):
+        st.due = time.time() + delay
+        with self._cond :
+            heapq.heappush(self._heap, (st.due, next(self._seq), st))
+            self._cond.notify()
+
+    def _jittered(self, delay):
+        if self.jitter :
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return delay
+
+    def poll(self, st):
+        """
+            poll one gateway and work out when to poll it next,
+            returns the delay in seconds
+        """
+        try :
+            reading = st.eagle.get_usage_data()
+        except Exception as e :
+            st.failures += 1
+            if self.errback is not None :
+                self.errback(st.eagle, e)
+            return self._jittered(min(self.backoff_max,
+                                      st.interval * 2 ** st.failures))
+        st.failures = 0
+        now = time.time()
+
+        try :
+            demand = float(reading['demand'])
+            demand_ts = int(reading['demand_timestamp'])
+        except (KeyError, TypeError, ValueError) :
+            demand = demand_ts = None
+
+        if demand_ts is not None and demand_ts == st.demand_timestamp :
+            # meter has not refreshed yet, not a new reading
+            return self._next_delay(st, now)
+
+        if demand_ts is not None :
+            offset = now - demand_ts
+            if st.offset is None or offset < st.offset :
+                st.offset = offset
+            if st.demand_timestamp is not None :
+                gap = demand_ts - st.demand_timestamp
+                if gap > 0 :
+                    st.refresh = gap if st.refresh is None else \
+                        st.refresh + self.alpha * (gap - st.refresh)
+
+        if demand is not None and st.demand is not None :
+            change = abs(demand - st.demand) / max(abs(st.demand), 0.1)
+            st.volatility += self.alpha * (change - st.volatility)
+            if st.volatility > self.volatile :
+                st.interval = max(self.min_interval, st.interval / 2.0)
+            elif st.volatility < self.steady :
+                st.interval = min(self.max_interval, st.interval * 1.25)
+
+        st.demand = demand
+        st.demand_timestamp = demand_ts
+        st.last = reading
+        if self.callback is not None :
+            self.callback(st.eagle, reading)
+        return self._next_delay(st, now)
+
+    def _next_delay(self, st, now):
+        delay = st.interval
+        if st.refresh is not None and st.offset is not None :
+            # local time the meter should next refresh its reading
+            expected = st.demand_timestamp + st.refresh + st.offset
+            delay = max(delay, expected - now)
+        return self._jittered(max(self.min_interval, delay))
+
+    def _run_one(self, st):
+        try :
+            delay = self.poll(st)
+        except Exception :
+            # not a gateway failure ( poll() handles those ), most
+            # likely a bug in callback, don't let it pass silently
+            with self._cond :
+                self.errors += 1
+            sys.stderr.write("PollScheduler : polling {0} failed\n".format(
+                getattr(st.eagle, 'addr', st.eagle)))
+            traceback.print_exc()
+            delay = self.backoff_max
+        if not self._stopped :
+            self._schedule(st, delay)
+
+    def run(self):
+        """
+            poll until stop() is called
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(self.workers) as pool :
+            while True :
+                with self._cond :
+                    while not self._stopped :
+                        if self._heap :
+                            wait = self._heap[0][0] - time.time()
+                            if wait <= 0 :
+                                break
+                        else :
+                            wait = None
+                        self._cond.wait(wait)
+                    if self._stopped :
+                        break
+                    st = heapq.heappop(self._heap)[2]
+                pool.submit(self._run_one, st)
+
+    def stop(self):
+        with self._cond :
+            self._stopped = True
+            self._cond.notify_all()
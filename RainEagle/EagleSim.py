@@ -0,0 +1,840 @@
+#!/usr/bin/env python
+"""
+    Simulator of Rainforest Automation EAGLE (RFA-Z109) gateways
+
+    serves the HTTP api ( /cgi-bin/cgi_manager ) and the socket api
+    ( port 5002 ) for any number of virtual gateways, for testing
+    and load testing without real devices
+
+        python -m RainEagle.EagleSim --gateways 100 --latency 0.05
+"""
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import sys
+import json
+import time
+import math
+import base64
+import random
+import argparse
+import threading
+import socketserver
+import xml.etree.ElementTree as ET
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from .EagleDecode import _epoch_2000
+
+__all__ = ['EagleSimulator', 'VirtualGateway']
+
+
+def _norm_macid(macid):
+    """
+        "d8:d5:b9:00:00:00:12:96" or "0xd8d5b90000001296" -> "d8d5b90000001296"
+    """
+    if not macid :
+        return None
+    macid = macid.strip().lower()
+    if macid.startswith("0x") :
+        macid = macid[2:]
+    return macid.replace(':', '')
+
+
+def _hex32(n):
+    return "0x{0:08x}".format(int(n) & 0xFFFFFFFF)
+
+
+class VirtualGateway:
+    """
+        State and readings of one simulated gateway
+
+        args:
+            index           number of the gateway, used for the macid
+                            and to vary the readings
+            history_size    number of records in the history buffer
+            history_interval  seconds between history records
+            refresh         seconds between meter updates of demand
+            start           unix time the meter readings start at
+                            ( default: history_size intervals ago )
+
+        Readings are a function of time, so every request for the
+        same moment gets the same answer.
+    """
+    # kW, average and swing of the simulated demand
+    base_demand = 1.5
+    swing = 2.0
+
+    def __init__(self, index=0, history_size=2880, history_interval=900,
+                 refresh=8, start=None):
+        self.index = index
+        self.macid = "d8d5b9{0:010x}".format(0x1296 + index)
+        self.meter_macid = "00135003{0:08x}".format(0x7c27b4 + index)
+        self.history_size = history_size
+        self.history_interval = history_interval
+        self.refresh = refresh
+        now = int(time.time())
+        if start is None :
+            start = now - history_size * history_interval
+        self.start = int(start)
+        self.phase = index * 997
+
+        self.price = "0.1400"
+        self.price_label = "Set by User"
+        self.time_source = "internet"
+        self.remote_management = "Y"
+        self.fast_poll = ("0x00", "0x00000000")
+        self.uploader = {
+            "uploader_timestamp": str(now),
+            "uploader_provider": "none",
+            "uploader_protocol": "http",
+            "uploader_hostname": "",
+            "uploader_url": "",
+            "uploader_port": "0",
+            "uploader_auth_code": "",
+            "uploader_email": "",
+            "uploader_user_id": "",
+            "uploader_password": "",
+            "uploader_enabled": "N",
+        }
+        self.message_read = "Y"
+        self.lock = threading.Lock()
+
+    @property
+    def http_macid(self):
+        return ":".join(self.macid[i:i + 2] for i in range(0, 16, 2))
+
+    @property
+    def soc_macid(self):
+        return "0x" + self.macid
+
+    # readings
+
+    def demand(self, t):
+        """
+            kW at time t, negative while "solar" output exceeds use
+        """
+        t = int(t) // self.refresh * self.refresh
+        d = self.base_demand + self.swing * math.sin(2 * math.pi * (t + self.phase) / 86400.0)
+        # deterministic noise
+        d += ((t * 2654435761 + self.index) % 1000 - 500) / 2000.0
+        return round(d, 3)
+
+    def summation(self, t):
+        """
+            (delivered, received) kWh at time t
+        """
+        hours = (int(t) - self.start) / 3600.0
+        delivered = 1000.0 + self.index + hours * (self.base_demand + 0.2)
+        received = 10.0 + hours * 0.2
+        return round(delivered, 3), round(received, 3)
+
+    def demand_timestamp(self, t):
+        return int(t) // self.refresh * self.refresh
+
+    def history_timestamps(self, start=None, end=None, frequency=None):
+        """
+            timestamps of history records in [start, end)
+        """
+        first = self.start
+        step = self.history_interval
+        if frequency :
+            step = max(step, int(frequency) // step * step)
+        last = first + (self.history_size - 1) * self.history_interval
+        if start is not None and start > first :
+            first += -(-(start - first) // step) * step
+        if end is None or end > last + 1 :
+            end = last + 1
+        return range(int(first), int(end), step)
+
+    # socket api responces
+
+    def xml_summation(self, t):
+        delivered, received = self.summation(t)
+        return ("<CurrentSummation>\n"
+                "<DeviceMacId>{0}</DeviceMacId>\n"
+                "<MeterMacId>0x{1}</MeterMacId>\n"
+                "<TimeStamp>{2}</TimeStamp>\n"
+                "<SummationDelivered>0x{3:016x}</SummationDelivered>\n"
+                "<SummationReceived>0x{4:016x}</SummationReceived>\n"
+                "<Multiplier>0x00000001</Multiplier>\n"
+                "<Divisor>0x000003e8</Divisor>\n"
+                "<DigitsRight>0x03</DigitsRight>\n"
+                "<DigitsLeft>0x06</DigitsLeft>\n"
+                "<SuppressLeadingZero>Y</SuppressLeadingZero>\n"
+                "</CurrentSummation>\n").format(
+                    self.soc_macid, self.meter_macid, _hex32(t - _epoch_2000),
+                    int(round(delivered * 1000)), int(round(received * 1000)))
+
+    def xml_demand(self, t):
+        return ("<InstantaneousDemand>\n"
+                "<DeviceMacId>{0}</DeviceMacId>\n"
+                "<MeterMacId>0x{1}</MeterMacId>\n"
+                "<TimeStamp>{2}</TimeStamp>\n"
+                "<Demand>{3}</Demand>\n"
+                "<Multiplier>0x00000001</Multiplier>\n"
+                "<Divisor>0x000003e8</Divisor>\n"
+                "<DigitsRight>0x03</DigitsRight>\n"
+                "<DigitsLeft>0x06</DigitsLeft>\n"
+                "<SuppressLeadingZero>Y</SuppressLeadingZero>\n"
+                "</InstantaneousDemand>\n").format(
+                    self.soc_macid, self.meter_macid,
+                    _hex32(self.demand_timestamp(t) - _epoch_2000),
+                    _hex32(round(self.demand(t) * 1000)))
+
+    def xml_device_info(self):
+        return ("<DeviceInfo>\n"
+                "<DeviceMacId>{0}</DeviceMacId>\n"
+                "<InstallCode>0x8ba7f1dee6c4f5cc</InstallCode>\n"
+                "<LinkKey>0x2b26f9124113b1e200b58f8e6b3e9b41</LinkKey>\n"
+                "<FWVersion>1.4.47 (6798)</FWVersion>\n"
+                "<HWVersion>1.2.3</HWVersion>\n"
+                "<ImageType>0x1301</ImageType>\n"
+                "<Manufacturer>Rainforest Automation, Inc.</Manufacturer>\n"
+                "<ModelId>RFA-Z109 EAGLE</ModelId>\n"
+                "<DateCode>2013040120178406</DateCode>\n"
+                "</DeviceInfo>\n").format(self.soc_macid)
+
+    def xml_network_info(self):
+        return ("<NetworkInfo>\n"
+                "<DeviceMacId>{0}</DeviceMacId>\n"
+                "<CoordMacId>0x{1}</CoordMacId>\n"
+                "<Status>Connected</Status>\n"
+                "<Description>Successfully Joined</Description>\n"
+                "<ExtPanId>0x{1}</ExtPanId>\n"
+                "<Channel>20</Channel>\n"
+                "<ShortAddr>0xe1aa</ShortAddr>\n"
+                "<LinkStrength>0x64</LinkStrength>\n"
+                "</NetworkInfo>\n").format(self.soc_macid, self.meter_macid)
+
+    def xml_price(self, t):
+        price = float(self.price)
+        return ("<PriceCluster>\n"
+                "<DeviceMacId>{0}</DeviceMacId>\n"
+                "<MeterMacId>0x{1}</MeterMacId>\n"
+                "<TimeStamp>{2}</TimeStamp>\n"
+                "<Price>{3}</Price>\n"
+                "<Currency>0x0348</Currency>\n"
+                "<TrailingDigits>0x04</TrailingDigits>\n"
+                "<Tier>0x01</Tier>\n"
+                "<RateLabel>{4}</RateLabel>\n"
+                "</PriceCluster>\n").format(
+                    self.soc_macid, self.meter_macid, _hex32(t - _epoch_2000),
+                    _hex32(round(price * 10000)), self.price_label)
+
+    # cloud uploader
+
+    def upload_target(self):
+        """
+            ( host, port, path, authorization ) the uploader posts
+            to, None unless enabled by set_cloud
+        """
+        with self.lock :
+            up = dict(self.uploader)
+        if up["uploader_enabled"] != "Y" or not up["uploader_hostname"] :
+            return None
+        auth = None
+        if up["uploader_user_id"] :
+            auth = "Basic " + base64.b64encode((up["uploader_user_id"] + ":"
+                + up["uploader_password"]).encode()).decode()
+        return (up["uploader_hostname"], int(up["uploader_port"]) or 80,
+                up["uploader_url"] or "/", auth)
+
+    def upload_bodies(self, t):
+        """
+            the POST bodies the uploader sends at time t
+        """
+        head = ('<?xml version="1.0"?>\n'
+                '<rainforest macId="{0}" version="undefined" timestamp="{1}s">\n'
+                ).format(self.soc_macid, int(t))
+        summation = self.xml_summation(t).replace("CurrentSummation>",
+                                                  "CurrentSummationDelivered>")
+        return [head + self.xml_demand(t) + "</rainforest>\n",
+                head + summation + "</rainforest>\n"]
+
+    def soc_responce(self, cmd, args, now):
+        """
+            returns the XML responce ( str or iterable of str )
+            to socket api command cmd
+        """
+        if cmd == "list_devices" :
+            return self.xml_device_info()
+        if cmd == "get_device_data" :
+            return (self.xml_network_info() + self.xml_device_info()
+                    + self.xml_demand(now) + self.xml_summation(now)
+                    + self.xml_price(now))
+        if cmd == "get_instantaneous_demand" :
+            return self.xml_demand(now)
+        if cmd == "get_history_data" :
+            start = _soc_arg_time(args.get('StartTime'))
+            end = _soc_arg_time(args.get('EndTime'))
+            freq = args.get('Frequency')
+            stamps = self.history_timestamps(start, end,
+                                             int(freq, 16) if freq else None)
+            return self._xml_history(stamps)
+        if cmd == "get_demand_values" :
+            span = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}.get(
+                args.get('Interval', 'hour'), 3600)
+            freq = args.get('Frequency')
+            step = int(freq, 16) if freq else max(self.refresh, span // 60)
+            out = ["<DemandHistory>\n"]
+            for t in range(now - span, now, step) :
+                out.append(self.xml_demand(t))
+            out.append("</DemandHistory>\n")
+            return "".join(out)
+        if cmd == "get_summation_values" :
+            span = {'day': 86400, 'week': 7 * 86400, 'month': 30 * 86400,
+                    'year': 365 * 86400}.get(args.get('Interval', 'day'), 86400)
+            step = span // 24
+            out = ["<SummationValues>\n"]
+            for t in range(now - span, now, step) :
+                out.append(self.xml_summation(t))
+            out.append("</SummationValues>\n")
+            return "".join(out)
+        if cmd == "get_fast_poll_status" :
+            return ("<FastPollStatus>\n<DeviceMacId>{0}</DeviceMacId>\n"
+                    "<MeterMacId>0x{1}</MeterMacId>\n"
+                    "<Frequency>{2}</Frequency>\n<EndTime>{3}</EndTime>\n"
+                    "</FastPollStatus>\n").format(self.soc_macid,
+                                                  self.meter_macid,
+                                                  *self.fast_poll)
+        if cmd == "set_fast_poll" :
+            duration = int(args.get('Duration', '0x00'), 16)
+            self.fast_poll = (args.get('Frequency', '0x04'),
+                              _hex32(now + duration * 60 - _epoch_2000))
+            return ""
+        return "<Error>Unknown command {0}</Error>\n".format(cmd)
+
+    def _xml_history(self, stamps):
+        yield "<HistoryData>\n"
+        for t in stamps :
+            yield self.xml_summation(t)
+        yield "</HistoryData>\n"
+
+    # http api responces
+
+    def http_responce(self, cmd, args, now):
+        """
+            returns the dict sent as the json responce
+            to HTTP api command cmd
+        """
+        if cmd == "get_device_list" :
+            return {"num_devices": "1",
+                    "device_mac_id[0]": self.http_macid,
+                    "device_install_code[0]": "8ba7f1dee6c4f5cc",
+                    "device_model_id[0]": "RFA-Z109",
+                    "device_model[0]": "Rainforest Automation Eagle",
+                    "device_fw_version[0]": "2.0.21",
+                    "device_hw_version[0]": "1.2.3",
+                    "device_date_code[0]": "2013040120178406"}
+        if cmd == "get_usage_data" :
+            delivered, received = self.summation(now)
+            ret = {"meter_status": "Connected",
+                   "demand": "{0:.4f}".format(self.demand(now)),
+                   "demand_units": "kW",
+                   "demand_timestamp": str(self.demand_timestamp(now)),
+                   "summation_received": "{0:.3f}".format(received),
+                   "summation_delivered": "{0:.3f}".format(delivered),
+                   "summation_units": "kWh",
+                   "usage_timestamp": str(self.demand_timestamp(now)),
+                   "price": self.price,
+                   "price_units": "$",
+                   "price_label": self.price_label}
+            ret.update(self._message())
+            return ret
+        if cmd == "get_historical_data" :
+            period = args.get("Period", "day")
+            count, step = {'day': (24, 3600), 'week': (7, 86400),
+                           'month': (30, 86400),
+                           'year': (12, 30 * 86400)}.get(period, (24, 3600))
+            ret = {"data_period": period, "data_size": str(count)}
+            t0 = now // step * step - count * step
+            for i in range(count) :
+                t = t0 + i * step
+                ret["timestamp[{0}]".format(i)] = str(t)
+                ret["value[{0}]".format(i)] = "{0:.3f}".format(
+                    self.summation(t + step)[0] - self.summation(t)[0]
+                    - self.summation(t + step)[1] + self.summation(t)[1])
+            return ret
+        if cmd == "get_setting_data" :
+            ret = {"device_fw_version": "2.0.21",
+                   "device_hw_version": "1.2.3",
+                   "device_model_id": "RFA-Z109",
+                   "device_mac_id": self.http_macid,
+                   "network_meter_mac_id": self.meter_macid,
+                   "network_status": "Connected",
+                   "price": self.price,
+                   "price_label": self.price_label,
+                   "time_source": self.time_source}
+            ret.update(self.uploader)
+            return ret
+        if cmd == "get_device_config" :
+            return {"config_ssh_enabled": self.remote_management,
+                    "config_vpn_enabled": self.remote_management}
+        if cmd == "get_gateway_info" :
+            return {"gateway_cloud_id": "00:09:69",
+                    "gateway_internet_status": "connected",
+                    "gateway_ip_addr": "10.11.12.{0}".format(self.index % 250 + 2),
+                    "gateway_mac_id": self.http_macid[:17]}
+        if cmd == "get_timezone" :
+            return {"timezone_localTime": str(now),
+                    "timezone_olsonName": "UTC/GMT",
+                    "timezone_status": "success",
+                    "timezone_utcOffset": "UTC",
+                    "timezone_utcTime": str(now)}
+        if cmd == "get_time_source" :
+            return {"time_source": self.time_source}
+        if cmd == "get_price" :
+            return {"price": self.price, "price_label": self.price_label,
+                    "price_timestamp": str(now), "price_units": "$"}
+        if cmd == "get_message" :
+            return self._message()
+        if cmd == "get_uploaders" :
+            return {"uploader[0]": "none", "uploader[1]": "bidgely",
+                    "uploader_name[0]": "None",
+                    "uploader_name[1]": "Bidgely Inc."}
+        if cmd == "get_uploader" :
+            return dict(self.uploader)
+        if cmd == "set_price" :
+            price = int(args.get("Price", "0x0"), 16)
+            digits = int(args.get("TrailingDigits", "0x0"), 16)
+            if price == 0xFFFFFFFF :
+                self.price, self.price_label = "0.1400", "--"
+            else :
+                self.price = "{0:.4f}".format(price / float(10 ** digits))
+                self.price_label = "Set by User"
+            return {"set_price_status": "success"}
+        if cmd == "set_time_source" :
+            if args.get("Source") not in ("meter", "internet") :
+                return {"set_time_source_status": "invalid source name"}
+            self.time_source = args["Source"]
+            return {"set_time_source_status": "success"}
+        if cmd == "set_remote_management" :
+            self.remote_management = "Y" if args.get("Status") == "on" else "N"
+            return {"remote_management_status": "success"}
+        if cmd in ("set_message_read", "confirm_message") :
+            self.message_read = "Y"
+            return {"remote_management_status": "success"}
+        if cmd == "set_cloud" :
+            port = int(args.get("Port", "0x00"), 16)
+            self.uploader.update({
+                "uploader_timestamp": str(now),
+                "uploader_provider": args.get("Provider", "manual"),
+                "uploader_protocol": args.get("Protocol", "http"),
+                "uploader_hostname": args.get("HostName", ""),
+                "uploader_url": args.get("Url", ""),
+                "uploader_port": str(port),
+                "uploader_auth_code": args.get("AuthCode", ""),
+                "uploader_email": args.get("Email", ""),
+                "uploader_user_id": args.get("UserId", ""),
+                "uploader_password": args.get("Password", ""),
+                "uploader_enabled": "Y"})
+            return {"set_cloud_status": "success"}
+        if cmd == "cloud_reset" :
+            self.uploader.update({"uploader_provider": "none",
+                                  "uploader_hostname": "",
+                                  "uploader_url": "",
+                                  "uploader_enabled": "N"})
+            return {"cloud_reset_status": "success"}
+        if cmd == "factory_reset" :
+            self.__init__(self.index, self.history_size,
+                          self.history_interval, self.refresh, self.start)
+            return {"factory_reset_status": "success"}
+        return None
+
+    def _message(self):
+        return {"message_timestamp": "946684800",
+                "message_text": "",
+                "message_confirmed": "N",
+                "message_confirm_required": "N",
+                "message_id": "0",
+                "message_queue": "active",
+                "message_priority": "",
+                "message_read": self.message_read}
+
+
+def _soc_arg_time(t):
+    if not t :
+        return None
+    return int(t, 16) + _epoch_2000
+
+
+def _parse_command(data):
+    """
+        LocalCommand XML -> (name, macid, args dict)
+    """
+    root = ET.fromstring(data)
+    args = dict((child.tag, (child.text or "").strip()) for child in root)
+    name = args.pop("Name", None)
+    macid = args.pop("MacId", None)
+    return name, macid, args
+
+
+class _SimServerMixin:
+    """
+        shared by the HTTP and socket servers of a simulator
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    # many clients connect at once when load testing
+    request_queue_size = 1024
+
+    def setup_sim(self, sim, gateways):
+        self.sim = sim
+        self.gateways = dict((gw.macid, gw) for gw in gateways)
+        self.default_gateway = gateways[0]
+
+    def gateway(self, macid):
+        return self.gateways.get(_norm_macid(macid), self.default_gateway)
+
+
+class _HTTPServer(_SimServerMixin, ThreadingHTTPServer):
+    pass
+
+
+class _SocServer(_SimServerMixin, socketserver.ThreadingTCPServer):
+    pass
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # send headers and body in one segment, else delayed ACKs
+    # add ~40ms to every keep-alive request
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        if self.server.sim.verbose :
+            BaseHTTPRequestHandler.log_message(self, fmt, *args)
+
+    def _reply(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        sim = self.server.sim
+        length = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(length)
+        sim.count("http")
+
+        if self.path != "/cgi-bin/cgi_manager" :
+            return self._reply(404)
+        if sim.auth is not None and self.headers.get("Authorization") != sim.auth :
+            return self._reply(401)
+
+        sim.delay()
+        if sim.fail() :
+            sim.count("failed")
+            return self._reply(500)
+
+        try :
+            cmd, macid, args = _parse_command(data)
+        except ET.ParseError :
+            return self._reply(400)
+        gw = self.server.gateway(macid)
+        with gw.lock :
+            ret = gw.http_responce(cmd, args, int(time.time()))
+        if ret is None :
+            return self._reply(400)
+        self._reply(200, json.dumps(ret, indent=1).encode())
+
+    def do_GET(self):
+        self._reply(404)
+
+
+class _SocHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        sim = self.server.sim
+        soc = self.request
+        soc.settimeout(sim.timeout)
+        data = b""
+        try :
+            while b"</LocalCommand>" not in data :
+                buf = soc.recv(4096)
+                if not buf :
+                    return
+                data += buf
+        except OSError :
+            return
+        sim.count("socket")
+
+        sim.delay()
+        if sim.fail() :
+            # close without an answer
+            sim.count("failed")
+            return
+
+        try :
+            cmd, macid, args = _parse_command(data)
+        except ET.ParseError :
+            return
+        gw = self.server.gateway(macid)
+        with gw.lock :
+            resp = gw.soc_responce(cmd, args, int(time.time()))
+        if isinstance(resp, str) :
+            resp = (resp,)
+        chunk = []
+        size = 0
+        for part in resp :
+            chunk.append(part)
+            size += len(part)
+            if size > 65536 :
+                soc.sendall("".join(chunk).encode())
+                chunk = []
+                size = 0
+        if chunk :
+            soc.sendall("".join(chunk).encode())
+
+
+class EagleSimulator:
+    """
+        Simulated EAGLE gateways
+
+        args:
+            gateways        number of virtual gateways
+            host            address to listen on
+            http_port       port for the HTTP api ( 0 = any free port )
+            soc_port        port for the socket api ( 0 = any free port )
+            per_port        give every gateway its own pair of ports,
+                            otherwise all gateways share one pair and
+                            commands are routed by MacId
+            latency         seconds added to every responce
+            jitter          random +/- seconds added to the latency
+            failure_rate    fraction of requests answered with HTTP 500
+                            ( or a closed socket on the socket api )
+            stall_rate      fraction of requests that hang for stall
+                            seconds before the answer ( tail latency,
+                            hung gateways )
+            stall
+            history_size    records in each gateway's history buffer
+            history_interval  seconds between history records
+            refresh         seconds between meter demand updates
+            username        require HTTP Basic authentication
+            password
+            seed            seed for latency, jitter and failures
+            push_interval   seconds between the POSTs of the cloud
+                            uploader of gateways set up with set_cloud
+                            ( default: no pushes, see push() )
+
+        example :
+
+            with EagleSimulator(gateways=10, latency=0.05) as sim :
+                eg = Eagle(**sim.eagle_args(3))
+                eg.get_usage_data()
+    """
+    def __init__(self, gateways=1, host="127.0.0.1", http_port=0,
+                 soc_port=0, per_port=False, latency=0.0, jitter=0.0,
+                 failure_rate=0.0, stall_rate=0.0, stall=30.0,
+                 history_size=2880, history_interval=900, refresh=8,
+                 username=None, password=None, seed=None, verbose=False,
+                 push_interval=None):
+        self.host = host
+        self.push_interval = push_interval
+        self._push_conns = dict()
+        self._push_stop = threading.Event()
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.verbose = verbose
+        self.timeout = 30
+        self.username = username
+        self.password = password
+        if username is not None :
+            self.auth = "Basic " + base64.b64encode(
+                (username + ":" + (password or "")).encode()).decode()
+        else :
+            self.auth = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = dict()
+
+        self.gateways = [VirtualGateway(i, history_size=history_size,
+                                        history_interval=history_interval,
+                                        refresh=refresh)
+                         for i in range(gateways)]
+
+        self.servers = []
+        self._threads = []
+        groups = [[gw] for gw in self.gateways] if per_port else [self.gateways]
+        for i, group in enumerate(groups) :
+            hs = _HTTPServer((host, http_port if i == 0 else 0), _HTTPHandler)
+            hs.setup_sim(self, group)
+            ss = _SocServer((host, soc_port if i == 0 else 0), _SocHandler)
+            ss.setup_sim(self, group)
+            for gw in group :
+                gw.http_addr = "{0}:{1}".format(host, hs.server_address[1])
+                gw.soc_port = ss.server_address[1]
+            self.servers.extend((hs, ss))
+
+    def count(self, what):
+        with self._lock :
+            self.counts[what] = self.counts.get(what, 0) + 1
+
+    def delay(self):
+        d = self.latency
+        if self.jitter or self.stall_rate :
+            with self._lock :
+                d += self._random.uniform(-self.jitter, self.jitter)
+                if self._random.random() < self.stall_rate :
+                    d += self.stall
+        if d > 0 :
+            time.sleep(d)
+
+    def fail(self):
+        if not self.failure_rate :
+            return False
+        with self._lock :
+            return self._random.random() < self.failure_rate
+
+    def eagle_args(self, i=0):
+        """
+            keyword args for Eagle / AsyncEagle to talk to gateway i
+        """
+        gw = self.gateways[i]
+        return {'addr': gw.http_addr, 'port': gw.soc_port,
+                'macid': gw.http_macid,
+                'username': self.username, 'password': self.password}
+
+    def push(self, t=None):
+        """
+            send the current readings of every gateway whose uploader
+            is enabled, returns the number of POSTs answered
+        """
+        import http.client
+        t = t or time.time()
+        n = 0
+        for gw in self.gateways :
+            target = gw.upload_target()
+            if target is None :
+                continue
+            host, port, path, auth = target
+            headers = {"Content-Type": "text/xml"}
+            if auth :
+                headers["Authorization"] = auth
+            conn = self._push_conns.pop((host, port), None)
+            for body in gw.upload_bodies(t) :
+                # a second try on a fresh connection
+                # if a kept-alive one was dropped
+                for _ in range(2) :
+                    if conn is None :
+                        conn = http.client.HTTPConnection(host, port,
+                                                          timeout=self.timeout)
+                    try :
+                        conn.request("POST", path, body.encode(), headers)
+                        resp = conn.getresponse()
+                        resp.read()
+                    except (OSError, http.client.HTTPException) as e :
+                        conn.close()
+                        conn = None
+                        if self.verbose :
+                            print("push {0} -> {1}:{2} {3!r}".format(
+                                gw.http_macid, host, port, e))
+                        continue
+                    if resp.will_close :
+                        conn.close()
+                        conn = None
+                    self.count("push")
+                    n += 1
+                    break
+            if conn is not None :
+                self._push_conns[(host, port)] = conn
+        return n
+
+    def _pusher(self):
+        while not self._push_stop.wait(self.push_interval) :
+            self.push()
+
+    def start(self):
+        for srv in self.servers :
+            t = threading.Thread(target=srv.serve_forever, daemon=True)
+            t.start()
+            self._threads.append(t)
+        if self.push_interval :
+            self._push_stop.clear()
+            t = threading.Thread(target=self._pusher, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        self._push_stop.set()
+        for srv in self.servers :
+            srv.shutdown()
+            srv.server_close()
+        for t in self._threads :
+            t.join()
+        self._threads = []
+        for conn in self._push_conns.values() :
+            conn.close()
+        self._push_conns = dict()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+                    description="simulate Rainforest Eagle gateways")
+
+    parser.add_argument("-g", "--gateways", dest="gateways", type=int,
+                    default=1, help="number of virtual gateways")
+    parser.add_argument("-H", "--host", dest="host", default="127.0.0.1",
+                    help="address to listen on")
+    parser.add_argument("--http-port", dest="http_port", type=int,
+                    default=8080, help="HTTP api port")
+    parser.add_argument("-p", "--port", dest="soc_port", type=int,
+                    default=5002, help="socket api port")
+    parser.add_argument("--per-port", dest="per_port", action="store_true",
+                    help="give each gateway its own ports")
+    parser.add_argument("--latency", dest="latency", type=float,
+                    default=0.0, help="seconds added to each responce")
+    parser.add_argument("--jitter", dest="jitter", type=float,
+                    default=0.0, help="random +/- seconds on the latency")
+    parser.add_argument("--failure-rate", dest="failure_rate", type=float,
+                    default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--stall-rate", dest="stall_rate", type=float,
+                    default=0.0, help="fraction of requests that hang")
+    parser.add_argument("--stall", dest="stall", type=float,
+                    default=30.0, help="seconds a hung request takes")
+    parser.add_argument("--history-size", dest="history_size", type=int,
+                    default=2880, help="records in the history buffer")
+    parser.add_argument("-u", "--username", dest="username",
+                    help="require HTTP Basic authentication")
+    parser.add_argument("-s", "--password", dest="password")
+    parser.add_argument("--push-interval", dest="push_interval", type=float,
+                    help="seconds between cloud uploader POSTs")
+    parser.add_argument("-v", "--verbose", dest="verbose",
+                    action="store_true", help="log requests")
+    return parser
+
+
+def main():
+    args = create_parser().parse_args()
+    sim = EagleSimulator(**vars(args)).start()
+    for gw in sim.gateways[:10] :
+        print("{0}  http={1}  socket={2}".format(gw.http_macid, gw.http_addr,
+                                                 gw.soc_port))
+    if len(sim.gateways) > 10 :
+        print("... {0} gateways".format(len(sim.gateways)))
+    sys.stdout.flush()
+    try :
+        while True :
+            time.sleep(3600)
+    except KeyboardInterrupt :
+        pass
+    sim.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import socket
+from time import perf_counter
+
+from .EagleHTTP import _split_addr
+from .EagleDeadline import current, budget
+
+__all__ = ['SocketTransport']
+
+EAGLE_SOC_PORT = 5002
+
+# the device answers with a series of top level elements
+# ( eg: <NetworkInfo>..</NetworkInfo><InstantaneousDemand>..</InstantaneousDemand> )
+# so the responce is parsed inside a wrapper element
+SOC_WRAPPER = "Response"
+_wrap_start = "<{0}>".format(SOC_WRAPPER).encode()
+_wrap_end = "</{0}>".format(SOC_WRAPPER).encode()
+
+
+def _soc_macid(macid):
+    """
+        socket api wants the macid as 0x prefixed hex
+        ( "d8:d5:b9:00:00:00:12:96" -> "0xd8d5b90000001296" )
+    """
+    if macid and ':' in macid :
+        return "0x" + macid.replace(':', '').lower()
+    return macid
+
+
+class SocketTransport:
+    """
+        Transport for the socket API of the EAGLE ( port 5002 )
+
+        args:
+            timeout     TCP socket timeout
+            bufsize     size of the receive buffer
+
+        The device closes the connection after each responce, the
+        responce is read into a preallocated buffer and fed to an
+        incremental XML parser as it arrives.
+    """
+    def __init__(self, timeout=10, bufsize=16384):
+        self.timeout = timeout
+        self.bufsize = bufsize
+
+    def _recv(self, addr, port, body, timing=None):
+        """
+            send body to the device and generate the responce as it
+            is received ( memoryviews of one buffer, each is only
+            valid until the next is generated )
+        """
+        host = _split_addr(addr)[0]
+        buf = bytearray(self.bufsize)
+        view = memoryview(buf)
+
+        if timing is not None :
+            t0 = perf_counter()
+            received = 0
+        when = current()
+        soc = socket.create_connection((host, int(port)),
+                                       budget(when, self.timeout))
+        try :
+            if timing is not None :
+                timing['connect'] = perf_counter() - t0
+                timing['request_bytes'] = len(body)
+            soc.sendall(body)
+            recv_into = soc.recv_into
+            while True :
+                if when is not None :
+                    soc.settimeout(budget(when, self.timeout))
+                n = recv_into(buf)
+                if not n :
+                    break
+                if timing is not None :
+                    if not received :
+                        timing['first_byte'] = perf_counter() - t0
+                    received += n
+                    timing['response_bytes'] = received
+                yield view[:n]
+        finally :
+            soc.close()
+
+    def iterparse(self, addr, port, body, events=("end",), timing=None):
+        """
+            send body to the device and generate (event, element)
+            tuples while the responce is received
+
+            all responce elements are children of a
+            "Response" wrapper element
+
+            If timing is a dict the connect and first byte times and
+            the request and responce sizes are stored in it
+            ( see EagleStats )
+
+            Inside a deadline() the socket timeout is cut to the
+            time left before each read
+        """
+        from xml.etree.ElementTree import XMLPullParser
+        parser = XMLPullParser(events)
+        parser.feed(_wrap_start)
+        chunks = self._recv(addr, port, body, timing)
+        try :
+            for data in chunks :
+                parser.feed(data)
+                for ev in parser.read_events() :
+                    yield ev
+        finally :
+            chunks.close()
+
+        parser.feed(_wrap_end)
+        for ev in parser.read_events() :
+            yield ev
+        parser.close()
+
+    def command(self, addr, port, body, timing=None):
+        """
+            send body to the device, returns the parsed
+            "Response" wrapper element
+        """
+        root = None
+        for _, root in self.iterparse(addr, port, body, timing=timing) :
+            pass
+        return root
+
+    def read(self, addr, port, body, timing=None):
+        """
+            send body to the device, returns the raw responce bytes
+            ( see iterparse for timing and deadlines )
+        """
+        out = bytearray()
+        for data in self._recv(addr, port, body, timing) :
+            out += data
+        return bytes(out)
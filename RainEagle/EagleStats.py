@@ -0,0 +1,279 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import sys
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+__all__ = ['EagleStats', 'CommandStats', 'Histogram', 'debug_hook']
+
+# seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+        counts of observed values per bucket
+
+            buckets     upper bounds, in increasing order
+            counts      count per bucket, plus one for values
+                        above the last bound
+    """
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v):
+        self.counts[bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def cumulative(self):
+        """
+            returns [(upper bound, count of values <= bound), ...]
+            ending with ( inf, count )
+        """
+        ret = []
+        n = 0
+        for le, c in zip(self.buckets + (float("inf"),), self.counts) :
+            n += c
+            ret.append((le, n))
+        return ret
+
+    def as_dict(self):
+        return {'buckets': list(self.buckets), 'counts': list(self.counts),
+                'sum': self.sum, 'count': self.count}
+
+
+class CommandStats:
+    """
+        stats of one command on one gateway
+
+            connect         Histogram of seconds to open a connection
+                            ( only new connections are counted )
+            first_byte      Histogram of seconds until the responce starts
+            total           Histogram of seconds for the whole command
+            decode          Histogram of seconds spent decoding responces
+            requests        number of commands sent
+            errors          number of commands that raised
+            timeouts        number of those that timed out
+            request_bytes   bytes sent
+            response_bytes  bytes received
+    """
+    __slots__ = ('connect', 'first_byte', 'total', 'decode', 'requests',
+                 'errors', 'timeouts', 'request_bytes', 'response_bytes')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.connect = Histogram(buckets)
+        self.first_byte = Histogram(buckets)
+        self.total = Histogram(buckets)
+        self.decode = Histogram(buckets)
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def as_dict(self):
+        return dict((k, v.as_dict() if isinstance(v, Histogram) else v)
+                    for k, v in ((k, getattr(self, k)) for k in self.__slots__))
+
+
+class EagleStats:
+    """
+        Per command and per gateway instrumentation
+
+        args:
+            buckets     upper bounds ( seconds ) of the latency histograms
+            hooks       callables called with every sample
+
+        Pass to Eagle ( or AsyncEagle, Fleet ) as stats= ; a single
+        EagleStats may be shared by many instances.
+
+        Each command produces one sample, a dict with the keys :
+
+            addr            gateway address
+            command         command name
+            api             "http" or "socket"
+            start           perf_counter() when the command started
+            total           seconds for the whole command
+            connect         seconds to connect ( 0.0 on a reused connection )
+            first_byte      seconds until the responce started
+            decode          seconds spent decoding the responce
+            request_bytes   bytes sent
+            response_bytes  bytes received
+            error           the exception raised, if any
+
+        keys are missing when that stage was not reached.
+
+            stats = EagleStats()
+            stats.add_hook(lambda s : s['total'] > 1 and print(s))
+            eg = Eagle(addr="10.1.1.39", stats=stats)
+            ...
+            print(stats.prometheus())
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS, hooks=()):
+        self.buckets = tuple(buckets)
+        self.hooks = list(hooks)
+        self._stats = dict()
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """
+            call hook(sample) for every command
+        """
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def start(self, addr, command, api="http"):
+        """
+            returns a new sample for a command starting now
+        """
+        return {'addr': addr, 'command': command, 'api': api,
+                'start': perf_counter()}
+
+    def observe(self, sample):
+        """
+            record a finished sample and pass it to the hooks
+        """
+        if 'total' not in sample :
+            sample['total'] = perf_counter() - sample['start']
+        error = sample.get('error')
+        key = (sample['addr'], sample['command'])
+        with self._lock :
+            st = self._stats.get(key)
+            if st is None :
+                st = self._stats[key] = CommandStats(self.buckets)
+            st.requests += 1
+            st.total.observe(sample['total'])
+            if 'connect' in sample and sample['connect'] :
+                st.connect.observe(sample['connect'])
+            if 'first_byte' in sample :
+                st.first_byte.observe(sample['first_byte'])
+            if 'decode' in sample :
+                st.decode.observe(sample['decode'])
+            st.request_bytes += sample.get('request_bytes', 0)
+            st.response_bytes += sample.get('response_bytes', 0)
+            if error is not None :
+                # socket is loaded by now, a command has been sent
+                from socket import timeout
+                st.errors += 1
+                if isinstance(error, (timeout, TimeoutError)) :
+                    st.timeouts += 1
+        for hook in self.hooks :
+            hook(sample)
+
+    def get(self, addr, command):
+        """
+            returns the CommandStats of command on gateway addr, or None
+        """
+        return self._stats.get((addr, command))
+
+    def snapshot(self):
+        """
+            returns { addr : { command : CommandStats.as_dict() } }
+        """
+        ret = dict()
+        with self._lock :
+            for (addr, command), st in self._stats.items() :
+                ret.setdefault(addr, dict())[command] = st.as_dict()
+        return ret
+
+    def reset(self):
+        with self._lock :
+            self._stats = dict()
+
+    def prometheus(self, prefix="raineagle"):
+        """
+            returns a snapshot in the Prometheus text exposition format
+        """
+        with self._lock :
+            items = sorted(self._stats.items())
+            items = [(k, _copy_stats(st)) for k, st in items]
+
+        out = []
+        for name, kind, help_text in _metrics :
+            metric = prefix + "_" + name
+            out.append("# HELP {0} {1}".format(metric, help_text))
+            out.append("# TYPE {0} {1}".format(metric, kind))
+            for (addr, command), st in items :
+                labels = 'addr="{0}",command="{1}"'.format(_label(addr),
+                                                          _label(command))
+                if kind == "histogram" :
+                    h = getattr(st, name.rsplit("_seconds", 1)[0])
+                    for le, n in h.cumulative() :
+                        out.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(
+                            metric, labels, _le(le), n))
+                    out.append("{0}_sum{{{1}}} {2!r}".format(metric, labels, h.sum))
+                    out.append("{0}_count{{{1}}} {2}".format(metric, labels, h.count))
+                else :
+                    out.append("{0}{{{1}}} {2}".format(
+                        metric, labels, getattr(st, name.rsplit("_total", 1)[0])))
+        return "\n".join(out) + "\n"
+
+
+# name, type, help
+_metrics = (
+    ("requests_total", "counter", "Commands sent to the gateway"),
+    ("errors_total", "counter", "Commands that failed"),
+    ("timeouts_total", "counter", "Commands that timed out"),
+    ("request_bytes_total", "counter", "Bytes sent to the gateway"),
+    ("response_bytes_total", "counter", "Bytes received from the gateway"),
+    ("connect_seconds", "histogram", "Time to open a connection"),
+    ("first_byte_seconds", "histogram", "Time until the responce started"),
+    ("total_seconds", "histogram", "Time for the whole command"),
+    ("decode_seconds", "histogram", "Time spent decoding the responce"),
+)
+
+
+def _copy_stats(st):
+    cp = CommandStats(st.total.buckets)
+    for k in CommandStats.__slots__ :
+        v = getattr(st, k)
+        if isinstance(v, Histogram) :
+            h = getattr(cp, k)
+            h.counts = list(v.counts)
+            h.sum = v.sum
+            h.count = v.count
+        else :
+            setattr(cp, k, v)
+    return cp
+
+
+def _label(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _le(v):
+    if v == float("inf") :
+        return "+Inf"
+    return repr(float(v))
+
+
+def debug_hook(sample, out=None):
+    """
+        hook printing one line per command, used by Eagle(debug=True)
+        ( to stderr by default, stdout may be carrying results )
+    """
+    out = out or sys.stderr
+    parts = ["{0} {1} {2}".format(sample['addr'], sample['api'], sample['command'])]
+    for k in ("connect", "first_byte", "decode", "total") :
+        if k in sample :
+            parts.append("{0}={1:.4f}".format(k, sample[k]))
+    for k in ("request_bytes", "response_bytes") :
+        if k in sample :
+            parts.append("{0}={1}".format(k, sample[k]))
+    if sample.get('error') is not None :
+        parts.append("error={0!r}".format(sample['error']))
+    print(" ".join(parts), file=out)
@@ -0,0 +1,326 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import os
+import mmap
+import struct
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+
+from .EagleSync import _macid_name
+from .EagleDecode import _want_numpy
+
+# numpy is optional and slow to import, it is loaded by the
+# first range() ( see _numpy_dtype )
+numpy = None
+
+__all__ = ['MeterStore', 'MeterSeries', 'MeterRecord', 'RecordView']
+
+#
+# file layout
+#
+#   header      8 byte magic, uint32 version, uint32 record size
+#   records     fixed width, little endian, sorted by timestamp
+#
+#       int64   timestamp   ( unix time )
+#       double  delivered   ( kWh )
+#       double  received    ( kWh )
+#       double  demand      ( kW, nan if unknown )
+#
+MAGIC = b"RAINEAGL"
+VERSION = 1
+_header = struct.Struct("<8sII")
+_record = struct.Struct("<qddd")
+_ts = struct.Struct("<q")
+HEADER_SIZE = _header.size
+RECORD_SIZE = _record.size
+
+_nan = float('nan')
+
+record_dtype = None
+
+
+def _numpy_dtype():
+    """
+        numpy structured dtype of the records, None if numpy
+        is not installed ( imports numpy on first use )
+    """
+    global numpy, record_dtype
+    if record_dtype is None and _want_numpy(None) :
+        from .EagleDecode import numpy
+        record_dtype = numpy.dtype([('timestamp', '<i8'), ('delivered', '<f8'),
+                                    ('received', '<f8'), ('demand', '<f8')])
+    return record_dtype
+
+MeterRecord = namedtuple('MeterRecord',
+                         ['timestamp', 'delivered', 'received', 'demand'])
+MeterRecord.__doc__ = """
+    meter reading as kept by MeterStore
+
+        timestamp       unix timestamp
+        delivered       kWh delivered
+        received        kWh received
+        demand          kW ( nan if unknown )
+"""
+
+
+class RecordView:
+    """
+        read only sequence of MeterRecords backed by a memoryview
+        of the store ( no copy is made )
+
+        used when numpy is not available, otherwise a numpy
+        structured array view is returned
+    """
+    __slots__ = ('buf',)
+
+    def __init__(self, buf):
+        self.buf = buf
+
+    def __len__(self):
+        return len(self.buf) // RECORD_SIZE
+
+    def __getitem__(self, i):
+        n = len(self)
+        if isinstance(i, slice) :
+            start, stop, step = i.indices(n)
+            if step != 1 :
+                return [self[j] for j in range(start, stop, step)]
+            return RecordView(self.buf[start * RECORD_SIZE:max(start, stop) * RECORD_SIZE])
+        if i < 0 :
+            i += n
+        if not 0 <= i < n :
+            raise IndexError("record index out of range")
+        return MeterRecord._make(_record.unpack_from(self.buf, i * RECORD_SIZE))
+
+    def __iter__(self):
+        return map(MeterRecord._make, _record.iter_unpack(self.buf))
+
+    def column(self, name):
+        """
+            list of the values of one field
+        """
+        i = MeterRecord._fields.index(name)
+        return [rec[i] for rec in _record.iter_unpack(self.buf)]
+
+
+class MeterSeries:
+    """
+        Readings for one meter in an append only, fixed width
+        binary file, read through mmap
+
+        args:
+            filename    file to store the readings in
+            index_step  records between sparse index entries
+
+        A sparse index of every index_step'th timestamp is kept in
+        memory, range() bisects it and then the records of one block.
+    """
+    def __init__(self, filename, index_step=1024):
+        self.filename = filename
+        self.index_step = index_step
+        self._lock = threading.Lock()
+        self._mm = None
+        self._mapped = 0
+        self._count = 0
+        self._index = []
+        self._last = None
+        self._refresh()
+
+    def _refresh(self):
+        """
+            (re)map the file if it has grown and extend the index
+        """
+        try :
+            size = os.path.getsize(self.filename)
+        except OSError :
+            size = 0
+        if size <= self._mapped or size < HEADER_SIZE :
+            return
+        with open(self.filename, "rb") as fp :
+            magic, version, recsize = _header.unpack(fp.read(HEADER_SIZE))
+            if magic != MAGIC or recsize != RECORD_SIZE :
+                raise ValueError("{0} : not a RainEagle meter store".format(self.filename))
+            # views handed out keep the old map alive until they are released
+            self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mapped = size
+        count = (size - HEADER_SIZE) // RECORD_SIZE
+        step = self.index_step
+        for i in range(len(self._index) * step, count, step) :
+            self._index.append(self._timestamp(i))
+        self._count = count
+        if count :
+            self._last = self._timestamp(count - 1)
+
+    def _timestamp(self, i):
+        return _ts.unpack_from(self._mm, HEADER_SIZE + i * RECORD_SIZE)[0]
+
+    def __len__(self):
+        with self._lock :
+            self._refresh()
+            return self._count
+
+    def last_timestamp(self):
+        """
+            timestamp of the last record, or None
+        """
+        return self._last
+
+    def append(self, records):
+        """
+            append records, ( timestamp, delivered, received [, demand] )
+            tuples such as SummationRecord; records not newer than
+            the last one stored are skipped
+
+            A partly written record at the end of the file ( a write
+            cut short by a crash ) is truncated away first.  The file
+            is not mapped again here, range() maps what was added.
+
+            returns number of records written
+        """
+        with self._lock :
+            dirname = os.path.dirname(self.filename)
+            if dirname and not os.path.isdir(dirname) :
+                os.makedirs(dirname, exist_ok=True)
+            with open(self.filename, "a+b") as fp :
+                size = fp.seek(0, os.SEEK_END)
+                if size < HEADER_SIZE :
+                    count = 0
+                    whole = 0
+                else :
+                    count = (size - HEADER_SIZE) // RECORD_SIZE
+                    whole = HEADER_SIZE + count * RECORD_SIZE
+                if size != whole :
+                    fp.truncate(whole)
+                # the file may have been added to by another writer
+                last = self._last
+                if count :
+                    fp.seek(whole - RECORD_SIZE)
+                    last = _ts.unpack(fp.read(_ts.size))[0]
+
+                buf = bytearray()
+                if not whole :
+                    buf += _header.pack(MAGIC, VERSION, RECORD_SIZE)
+                pack = _record.pack
+                n = 0
+                for rec in records :
+                    ts = int(rec[0])
+                    if last is not None and ts <= last :
+                        continue
+                    demand = rec[3] if len(rec) > 3 else _nan
+                    buf += pack(ts, rec[1], rec[2], _nan if demand is None else demand)
+                    last = ts
+                    n += 1
+                if n :
+                    # "a" mode, written at the ( truncated ) end
+                    fp.write(buf)
+            self._last = last
+            return n
+
+    def _bisect(self, ts):
+        """
+            index of the first record with timestamp >= ts
+        """
+        step = self.index_step
+        b = bisect_left(self._index, ts)
+        if b == 0 :
+            return 0
+        lo = (b - 1) * step + 1
+        hi = min(b * step, self._count)
+        while lo < hi :
+            mid = (lo + hi) // 2
+            if self._timestamp(mid) < ts :
+                lo = mid + 1
+            else :
+                hi = mid
+        return lo
+
+    def range(self, start=None, end=None):
+        """
+            records with start <= timestamp < end, as a numpy
+            structured array or RecordView over the mapped file
+        """
+        dtype = _numpy_dtype()
+        with self._lock :
+            self._refresh()
+            if not self._count :
+                if dtype is not None :
+                    return numpy.empty(0, dtype=dtype)
+                return RecordView(memoryview(b""))
+            first = 0 if start is None else self._bisect(start)
+            last = self._count if end is None else self._bisect(end)
+            last = max(first, last)
+            if dtype is not None :
+                return numpy.frombuffer(self._mm, dtype=dtype,
+                                        count=last - first,
+                                        offset=HEADER_SIZE + first * RECORD_SIZE)
+            mv = memoryview(self._mm)
+            return RecordView(mv[HEADER_SIZE + first * RECORD_SIZE:
+                                 HEADER_SIZE + last * RECORD_SIZE])
+
+    def close(self):
+        """
+            drop the map ( views already returned stay valid )
+        """
+        with self._lock :
+            self._mm = None
+            self._mapped = 0
+
+
+class MeterStore:
+    """
+        Local time-series store of meter readings,
+        one MeterSeries file per macid in a directory
+
+        args:
+            path        directory for the files
+            index_step  records between sparse index entries
+
+        Can be used as the store of HistorySync :
+
+            store = MeterStore("/var/lib/raineagle")
+            HistorySync(eg, store=store).sync()
+            week = store.range(eg.macid, time.time() - 7 * 86400)
+    """
+    def __init__(self, path, index_step=1024):
+        self.path = path
+        self.index_step = index_step
+        self._series = dict()
+        self._lock = threading.Lock()
+
+    def filename(self, macid):
+        return os.path.join(self.path, _macid_name(macid) + ".reh")
+
+    def series(self, macid):
+        """
+            MeterSeries for macid
+        """
+        with self._lock :
+            ser = self._series.get(macid)
+            if ser is None :
+                ser = self._series[macid] = MeterSeries(self.filename(macid),
+                                                        self.index_step)
+            return ser
+
+    def append(self, macid, records):
+        return self.series(macid).append(records)
+
+    def last_timestamp(self, macid):
+        return self.series(macid).last_timestamp()
+
+    def range(self, macid, start=None, end=None):
+        """
+            records for macid with start <= timestamp < end
+            see MeterSeries.range()
+        """
+        return self.series(macid).range(start, end)
+
+    def close(self):
+        with self._lock :
+            for ser in self._series.values() :
+                ser.close()
+            self._series.clear()
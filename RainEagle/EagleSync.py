@@ -0,0 +1,166 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+import os
+import json
+import threading
+
+from .EagleCache import _default_cache_dir, _write_json
+from .EagleDecode import SummationRecord
+
+__all__ = ['HistorySync', 'HistoryLog']
+
+
+def _macid_name(macid):
+    """
+        macid in a form usable as a file name
+    """
+    return str(macid).replace(':', '').lower()
+
+
+class HistoryLog:
+    """
+        Append only text store of SummationRecords,
+        one tab separated file per macid
+
+            timestamp   delivered   received
+
+        args:
+            path        directory for the files
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def filename(self, macid):
+        return os.path.join(self.path, _macid_name(macid) + ".tsv")
+
+    def append(self, macid, records):
+        if not records :
+            return
+        if not os.path.isdir(self.path) :
+            os.makedirs(self.path, exist_ok=True)
+        with open(self.filename(macid), "a") as fp :
+            fp.writelines("{0}\t{1!r}\t{2!r}\n".format(*rec) for rec in records)
+
+    def last_timestamp(self, macid):
+        """
+            timestamp of the last record stored for macid, or None
+        """
+        try :
+            with open(self.filename(macid), "rb") as fp :
+                fp.seek(0, os.SEEK_END)
+                size = fp.tell()
+                fp.seek(max(0, size - 512))
+                lines = fp.read().splitlines()
+        except OSError :
+            return None
+        for line in reversed(lines) :
+            if line.strip() :
+                return int(line.split(b"\t", 1)[0])
+        return None
+
+    def read(self, macid):
+        """
+            generate the SummationRecords stored for macid
+        """
+        try :
+            fp = open(self.filename(macid))
+        except OSError :
+            return
+        with fp :
+            for line in fp :
+                ts, delivered, received = line.split("\t")
+                yield SummationRecord(int(ts), float(delivered), float(received))
+
+
+class HistorySync:
+    """
+        Incremental download of meter history
+
+        The timestamp of the last record fetched ( the high-water mark )
+        is kept per macid, each sync() only asks the device for newer
+        records and appends them to the store.
+
+        args:
+            eagle       Eagle to fetch history with
+            path        directory for the high-water marks
+                        ( default ~/.cache/RainEagle/history )
+            store       where records go, any object with
+                        append(macid, records) and optionally
+                        last_timestamp(macid) methods
+                        ( default HistoryLog in path )
+
+        example :
+
+            hs = HistorySync(Eagle(addr="10.1.1.39"))
+            new_records = hs.sync()
+    """
+    def __init__(self, eagle, path=None, store=None):
+        if path is None :
+            path = os.path.join(_default_cache_dir(), "history")
+        self.eagle = eagle
+        self.path = path
+        self.state_file = os.path.join(path, "high_water.json")
+        if store is None :
+            store = HistoryLog(path)
+        self.store = store
+        self._lock = threading.Lock()
+
+    def _load_state(self):
+        try :
+            with open(self.state_file) as fp :
+                return json.load(fp)
+        except (OSError, ValueError) :
+            return dict()
+
+    def high_water(self, macid):
+        """
+            timestamp of the newest record synced for macid, or None
+        """
+        hwm = self._load_state().get(_macid_name(macid))
+        # the store may be ahead if we stopped before saving the mark
+        last_timestamp = getattr(self.store, "last_timestamp", None)
+        if last_timestamp is not None :
+            last = last_timestamp(macid)
+            if last is not None and (hwm is None or last > hwm) :
+                hwm = last
+        return hwm
+
+    def sync(self, macid=None, frequency=None):
+        """
+            fetch records newer than the high-water mark, append
+            them to the store and move the mark forward
+
+            returns the list of new SummationRecords
+        """
+        eagle = self.eagle
+        eagle._ensure_preloaded()
+        macid = macid or eagle.macid
+
+        with self._lock :
+            hwm = self.high_water(macid)
+            if hwm is None :
+                start = "0x00000000"
+                last = -1
+            else :
+                # ask from the last record, it is dropped again below
+                start = last = hwm
+
+            new = []
+            for rec in eagle.iter_history(start=start, macid=macid,
+                                          frequency=frequency) :
+                # skip the overlap at the boundary and any repeats
+                if rec.timestamp <= last :
+                    continue
+                new.append(rec)
+                last = rec.timestamp
+
+            if new :
+                self.store.append(macid, new)
+                state = self._load_state()
+                state[_macid_name(macid)] = last
+                _write_json(self.state_file, state)
+        return new
@@ -0,0 +1,273 @@
+from __future__ import print_function, absolute_import
+
+__author__ = 'Peter Shipley <peter.shipley@gmail.com>'
+__copyright__ = "Copyright (C) 2014 Peter Shipley"
+__license__ = "BSD"
+
+from sys import intern
+
+from .EagleDecode import decode_historical, decode_demand
+
+__all__ = ['UsageData', 'PriceData', 'MessageData', 'DeviceList',
+           'HistoricalSeries', 'make_result_type', 'result_types']
+
+
+def _flag(v):
+    return v == "Y"
+
+
+class _TypedResult:
+    """
+        base of the typed results made by make_result_type()
+    """
+    __slots__ = ()
+    _fields = ()
+    _keys = {}
+    _setters = ()
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+            build from the dict returned by the HTTP api,
+            numeric fields are converted on first access
+        """
+        obj = cls.__new__(cls)
+        get = d.get
+        for setter, key, is_str in cls._setters :
+            v = get(key)
+            if is_str and v is not None :
+                # the same few labels repeat across every gateway
+                v = intern(v)
+            setter(obj, v)
+        return obj
+
+    def as_dict(self):
+        """
+            returns the ( converted ) fields as a dict
+        """
+        return dict((f, getattr(self, f)) for f in self._fields)
+
+    def __getitem__(self, key):
+        """
+            ( converted ) field by its json key, for code written
+            against the dict results
+        """
+        try :
+            attr = self._keys[key]
+        except KeyError :
+            raise KeyError(key)
+        return getattr(self, attr)
+
+    def get(self, key, default=None):
+        attr = self._keys.get(key)
+        if attr is None :
+            return default
+        return getattr(self, attr)
+
+    def __repr__(self):
+        return "{0}({1})".format(self.__class__.__name__, ", ".join(
+            "{0}={1!r}".format(f, getattr(self, f)) for f in self._fields))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.as_dict() == other.as_dict()
+
+    __hash__ = None
+
+
+def _lazy(member, conv):
+    """
+        property converting the raw string held in slot member
+        on first access, the result replaces the string
+    """
+    mget = member.__get__
+    mset = member.__set__
+
+    def get(self):
+        v = mget(self)
+        if v.__class__ is str :
+            try :
+                v = conv(v)
+            except ValueError :
+                v = None
+            mset(self, v)
+        return v
+    return property(get)
+
+
+def make_result_type(name, fields, doc=None):
+    """
+        make a slotted result class
+
+        args:
+            name        class name
+            fields      sequence of ( attribute, json key, converter )
+                        tuples; converter is None for text fields,
+                        otherwise it is applied to the string on first
+                        access ( values that fail to convert become None )
+            doc         docstring
+
+        the class has a from_dict() constructor taking the dict
+        returned by the HTTP api, as_dict(), and [] / get() by json key
+    """
+    slots = []
+    for attr, key, conv in fields :
+        slots.append(attr if conv is None else "_" + attr)
+    ns = {'__slots__': tuple(slots), '__doc__': doc,
+          '_fields': tuple(f[0] for f in fields),
+          '_keys': dict((f[1], f[0]) for f in fields)}
+    cls = type(name, (_TypedResult,), ns)
+
+    setters = []
+    for slot, (attr, key, conv) in zip(slots, fields) :
+        member = cls.__dict__[slot]
+        setters.append((member.__set__, key, conv is None))
+        if conv is not None :
+            setattr(cls, attr, _lazy(member, conv))
+    cls._setters = tuple(setters)
+    return cls
+
+
+_message_fields = (
+    ('message_id', 'message_id', int),
+    ('message_timestamp', 'message_timestamp', int),
+    ('message_text', 'message_text', None),
+    ('message_priority', 'message_priority', None),
+    ('message_queue', 'message_queue', None),
+    ('message_read', 'message_read', _flag),
+    ('message_confirmed', 'message_confirmed', _flag),
+    ('message_confirm_required', 'message_confirm_required', _flag),
+)
+
+UsageData = make_result_type('UsageData', (
+    ('meter_status', 'meter_status', None),
+    ('demand', 'demand', float),
+    ('demand_units', 'demand_units', None),
+    ('demand_timestamp', 'demand_timestamp', int),
+    ('summation_delivered', 'summation_delivered', float),
+    ('summation_received', 'summation_received', float),
+    ('summation_units', 'summation_units', None),
+    ('usage_timestamp', 'usage_timestamp', int),
+    ('price', 'price', float),
+    ('price_units', 'price_units', None),
+    ('price_label', 'price_label', None),
+) + _message_fields, """
+    typed get_usage_data() result
+
+        demand                  float   kW
+        demand_timestamp        int     unix time
+        summation_delivered     float   kWh
+        summation_received      float   kWh
+        usage_timestamp         int     unix time
+        price                   float
+        message_*               see MessageData
+        ...
+""")
+
+PriceData = make_result_type('PriceData', (
+    ('price', 'price', float),
+    ('price_label', 'price_label', None),
+    ('price_timestamp', 'price_timestamp', int),
+    ('price_units', 'price_units', None),
+), """
+    typed get_price() result
+""")
+
+MessageData = make_result_type('MessageData', (
+    ('meter_status', 'meter_status', None),
+) + _message_fields, """
+    typed get_message() result, the Y/N flags are bools
+""")
+
+DeviceList = make_result_type('DeviceList', (
+    ('num_devices', 'num_devices', int),
+    ('mac_id', 'device_mac_id[0]', None),
+    ('install_code', 'device_install_code[0]', None),
+    ('model_id', 'device_model_id[0]', None),
+    ('model', 'device_model[0]', None),
+    ('fw_version', 'device_fw_version[0]', None),
+    ('hw_version', 'device_hw_version[0]', None),
+    ('date_code', 'device_date_code[0]', None),
+), """
+    typed get_device_list() result ( first device )
+""")
+
+
+class HistoricalSeries:
+    """
+        typed get_historical_data() result
+
+            period          day|week|month|year
+            timestamp       unix timestamps
+            value           values, nan for gaps
+            valid           1 where both were present
+
+        the columns are decoded ( see decode_historical ) on first
+        access, iterating gives ( timestamp, value ) of valid entries
+    """
+    __slots__ = ('period', '_raw', '_columns')
+
+    def __init__(self, period, raw):
+        self.period = period
+        self._raw = raw
+        self._columns = None
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d.get('data_period'), d)
+
+    def _decoded(self):
+        cols = self._columns
+        if cols is None :
+            cols = self._columns = decode_historical(self._raw)
+            self._raw = None
+        return cols
+
+    @property
+    def timestamp(self):
+        return self._decoded().timestamp
+
+    @property
+    def value(self):
+        return self._decoded().value
+
+    @property
+    def valid(self):
+        return self._decoded().valid
+
+    def __len__(self):
+        return len(self._decoded().timestamp)
+
+    def __iter__(self):
+        cols = self._decoded()
+        for t, v, ok in zip(cols.timestamp, cols.value, cols.valid) :
+            if ok :
+                yield int(t), float(v)
+
+    def as_dict(self):
+        return {'period': self.period, 'timestamp': list(self.timestamp),
+                'value': list(self.value)}
+
+    def __repr__(self):
+        return "HistoricalSeries(period={0!r}, {1} values)".format(
+            self.period, len(self))
+
+
+def _socket_record(tag, decode):
+    def conv(d):
+        rec = d.get(tag)
+        if isinstance(rec, list) :
+            rec = rec[-1]
+        return decode(rec) if rec else None
+    return conv
+
+
+# command name -> converter of the dict result, used by Eagle(typed=True)
+result_types = {
+    'get_usage_data': UsageData.from_dict,
+    'get_price': PriceData.from_dict,
+    'get_message': MessageData.from_dict,
+    'get_device_list': DeviceList.from_dict,
+    'get_historical_data': HistoricalSeries.from_dict,
+    'get_instantaneous_demand': _socket_record('InstantaneousDemand',
+                                               decode_demand),
+}
@@ -14,10 +14,73 @@ __copyright__ = "Copyright (C) 2014 Peter Shipley"
 __license__ = "BSD"
 
 
-from .EagleClass import Eagle, RainEagleResponseError, to_epoch_1970, to_epoch_2000
+# imported here since the class shares its name with the submodule,
+# which would otherwise shadow it once imported by another module
+from .EagleStats import EagleStats
+
+# the submodules are imported on first access of one of their names
+# ( PEP 562 ), so "import RainEagle" stays cheap for short lived scripts
+_lazy = {
+    'Eagle': 'EagleClass', 'RainEagleResponseError': 'EagleClass',
+    'to_epoch_1970': 'EagleClass', 'to_epoch_2000': 'EagleClass',
+    'HTTPTransport': 'EagleHTTP',
+    'AsyncEagle': 'EagleAsync',
+    'Fleet': 'EagleFleet', 'FleetResult': 'EagleFleet',
+    'IdentityCache': 'EagleCache', 'ResponseCache': 'EagleCache',
+    'HistoricalColumns': 'EagleDecode', 'decode_historical': 'EagleDecode',
+    'SummationRecord': 'EagleDecode', 'decode_summation': 'EagleDecode',
+    'DemandRecord': 'EagleDecode', 'decode_demand': 'EagleDecode',
+    'SummationColumns': 'EagleDecode', 'decode_summations': 'EagleDecode',
+    'DemandColumns': 'EagleDecode', 'decode_demands': 'EagleDecode',
+    'HistorySync': 'EagleSync', 'HistoryLog': 'EagleSync',
+    'MeterStore': 'EagleStore', 'MeterRecord': 'EagleStore',
+    'SummationAggregator': 'EagleAggregate', 'BucketTotal': 'EagleAggregate',
+    'PollScheduler': 'EagleSchedule',
+    'BatchExporter': 'EagleExport', 'LineProtocolSink': 'EagleExport',
+    'CSVSink': 'EagleExport', 'ParquetSink': 'EagleExport',
+    'UploadReceiver': 'EagleReceiver', 'point_fleet': 'EagleReceiver',
+    'HistoryDecoder': 'EagleParallel', 'decode_history_dumps': 'EagleParallel',
+    'backfill': 'EagleParallel',
+    'deadline': 'EagleDeadline', 'DeadlineExceeded': 'EagleDeadline',
+    'Hedger': 'EagleDeadline', 'AsyncHedger': 'EagleDeadline',
+    'UsageData': 'EagleTypes', 'PriceData': 'EagleTypes',
+    'MessageData': 'EagleTypes', 'DeviceList': 'EagleTypes',
+    'HistoricalSeries': 'EagleTypes',
+}
+
+
+def __getattr__(name):
+    modname = _lazy.get(name)
+    if modname is None :
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(
+            __name__, name))
+    from importlib import import_module
+    value = getattr(import_module("." + modname, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
+
 #from RainEagle.EagleClass import Eagle
 
-__all__ = ['Eagle', 'RainEagleResponseError', 'to_epoch_1970', 'to_epoch_2000']
+__all__ = ['Eagle', 'AsyncEagle', 'Fleet', 'FleetResult', 'HTTPTransport',
+           'IdentityCache', 'ResponseCache',
+           'HistoricalColumns', 'decode_historical',
+           'SummationRecord', 'decode_summation',
+           'DemandRecord', 'decode_demand',
+           'SummationColumns', 'decode_summations',
+           'DemandColumns', 'decode_demands',
+           'HistorySync', 'HistoryLog', 'MeterStore', 'MeterRecord',
+           'SummationAggregator', 'BucketTotal', 'PollScheduler',
+           'BatchExporter', 'LineProtocolSink', 'CSVSink', 'ParquetSink',
+           'UploadReceiver', 'point_fleet',
+           'HistoryDecoder', 'decode_history_dumps', 'backfill',
+           'EagleStats', 'deadline', 'DeadlineExceeded', 'Hedger', 'AsyncHedger',
+           'UsageData', 'PriceData', 'MessageData', 'DeviceList',
+           'HistoricalSeries',
+           'RainEagleResponseError', 'to_epoch_1970', 'to_epoch_2000']
 
 
 
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+"""
+    micro-benchmark for _et2d()
+
+    compares the current _et2d against the original recursive
+    version on synthetic get_device_data and get_history_data trees
+
+    usage: python Tests/bench_et2d.py [history_records]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from RainEagle.EagleClass import _et2d
+
+
+def _et2d_recursive(et):
+    """ the original recursive _et2d, for comparison """
+    d = dict()
+    if not isinstance(et, ET.Element) :
+        return d
+    children = list(et)
+    if et.attrib :
+        for k, v in list(et.items()) :
+            d[et.tag + "-" + k] = v
+    if children :
+        for child in children :
+            if child.tag in d :
+                if type(d[child.tag]) != list :
+                    t = d[child.tag]
+                    d[child.tag] = [t]
+            if list(child) or child.attrib :
+                if child.tag in d :
+                    d[child.tag].append(_et2d_recursive(child))
+                else :
+                    d[child.tag] = _et2d_recursive(child)
+            else :
+                if child.tag in d :
+                    d[child.tag].append(child.text)
+                else :
+                    d[child.tag] = child.text
+    return d
+
+
+def device_data_xml():
+    return """<Response>
+<NetworkInfo>
+ <DeviceMacId>0xd8d5b90000001296</DeviceMacId>
+ <CoordMacId>0x00135003007c27b4</CoordMacId>
+ <Status>Connected</Status>
+ <Description>Successfully Joined</Description>
+ <ExtPanId>0x00135003007c27b4</ExtPanId>
+ <Channel>20</Channel>
+ <ShortAddr>0xe1aa</ShortAddr>
+ <LinkStrength>0x64</LinkStrength>
+</NetworkInfo>
+<NetworkInfo>
+ <DeviceMacId>0xd8d5b90000001296</DeviceMacId>
+ <InstallCode>0x8ba7f1dee6c4f5cc</InstallCode>
+ <LinkKey>0x2b26f9124113b1e200b58f8e6b3e9b41</LinkKey>
+ <FWVersion>1.4.27 (4091)</FWVersion>
+ <HWVersion>1.2.3</HWVersion>
+ <ImageType>0x1301</ImageType>
+ <Manufacturer>Rainforest Automation, Inc.</Manufacturer>
+ <ModelId>RFA-Z109 EAGLE</ModelId>
+ <DateCode>2013040120178406</DateCode>
+</NetworkInfo>
+<InstantaneousDemand>
+ <DeviceMacId>0xd8d5b90000001296</DeviceMacId>
+ <MeterMacId>0x00135003007c27b4</MeterMacId>
+ <TimeStamp>0x1ab3d3a9</TimeStamp>
+ <Demand>0x0001f4</Demand>
+ <Multiplier>0x00000001</Multiplier>
+ <Divisor>0x000003e8</Divisor>
+ <DigitsRight>0x03</DigitsRight>
+ <DigitsLeft>0x06</DigitsLeft>
+ <SuppressLeadingZero>Y</SuppressLeadingZero>
+</InstantaneousDemand>
+<CurrentSummation>
+ <DeviceMacId>0xd8d5b90000001296</DeviceMacId>
+ <MeterMacId>0x00135003007c27b4</MeterMacId>
+ <TimeStamp>0x1ab3d3a9</TimeStamp>
+ <SummationDelivered>0x000000000028b55b</SummationDelivered>
+ <SummationReceived>0x00000000000091a3</SummationReceived>
+ <Multiplier>0x00000001</Multiplier>
+ <Divisor>0x000003e8</Divisor>
+ <DigitsRight>0x03</DigitsRight>
+ <DigitsLeft>0x06</DigitsLeft>
+ <SuppressLeadingZero>Y</SuppressLeadingZero>
+</CurrentSummation>
+<PriceCluster>
+ <DeviceMacId>0xd8d5b90000001296</DeviceMacId>
+ <MeterMacId>0x00135003007c27b4</MeterMacId>
+ <TimeStamp>0x1ab3d3a9</TimeStamp>
+ <Price>0x0000008c</Price>
+ <Currency>0x0348</Currency>
+ <TrailingDigits>0x03</TrailingDigits>
+ <Tier>0x01</Tier>
+ <RateLabel>Set by User</RateLabel>
+</PriceCluster>
+<MessageCluster>
+ <DeviceMacId>0xd8d5b90000001296</DeviceMacId>
+ <MeterMacId>0x00135003007c27b4</MeterMacId>
+ <TimeStamp>0x00000000</TimeStamp>
+ <Id>0x00000000</Id>
+ <Text></Text>
+ <Priority></Priority>
+ <ConfirmationRequired>N</ConfirmationRequired>
+ <Confirmed>N</Confirmed>
+ <Read>Y</Read>
+ <Queue>active</Queue>
+</MessageCluster>
+</Response>
+"""
+
+
+def history_data_xml(n):
+    rec = ("<CurrentSummation>"
+           "<DeviceMacId>0xd8d5b90000001296</DeviceMacId>"
+           "<MeterMacId>0x00135003007c27b4</MeterMacId>"
+           "<TimeStamp>0x{0:08x}</TimeStamp>"
+           "<SummationDelivered>0x{1:016x}</SummationDelivered>"
+           "<SummationReceived>0x{2:016x}</SummationReceived>"
+           "<Multiplier>0x00000001</Multiplier>"
+           "<Divisor>0x000003e8</Divisor>"
+           "<DigitsRight>0x03</DigitsRight>"
+           "<DigitsLeft>0x06</DigitsLeft>"
+           "<SuppressLeadingZero>Y</SuppressLeadingZero>"
+           "</CurrentSummation>\n")
+    parts = ["<Response><HistoryData>\n"]
+    for i in range(n) :
+        parts.append(rec.format(0x1ab3d3a9 + i * 900, 2667867 + i * 10, 37283 + i))
+    parts.append("</HistoryData></Response>\n")
+    return "".join(parts)
+
+
+def bench(name, tree, number):
+    assert _et2d(tree) == _et2d_recursive(tree)
+    results = []
+    for label, func in (("recursive", _et2d_recursive),
+                        ("_et2d", _et2d)) :
+        best = min(timeit.repeat(lambda: func(tree), number=number, repeat=5))
+        results.append((label, best / number))
+    base = results[0][1]
+    print(name)
+    for label, t in results :
+        print("    {0:<16s} {1:12.3f} us   x{2:5.2f}".format(label, t * 1e6, base / t))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    bench("get_device_data", ET.fromstring(device_data_xml()), 2000)
+    bench("get_history_data ({0} records)".format(n),
+          ET.fromstring(history_data_xml(n)), 5)
+
+
+if __name__ == "__main__":
+    main()
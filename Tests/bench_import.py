@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+"""
+    import time and CLI startup benchmark
+
+    each measurement runs a fresh interpreter, so it reflects what a
+    short lived monitoring script pays before its first command;
+    bytecode is cached ( in a temporary PYTHONPYCACHEPREFIX ) and
+    warmed up first, as it would be for an installed package
+
+        import                  "import RainEagle" and "from RainEagle
+                                import Eagle", less the bare interpreter
+        importtime              slowest modules reported by -X importtime
+        meter_status            bin/meter_status.py against a local
+                                EagleSimulator, with and without the
+                                identity cache and the firmware check
+
+    usage: python Tests/bench_import.py [-o results.json] [-n runs]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+
+top = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, top)
+
+import RainEagle
+from RainEagle.EagleSim import EagleSimulator
+
+METER_STATUS = os.path.join(top, "bin", "meter_status.py")
+
+
+def _env(**extra):
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env['PYTHONPATH'] = top + os.pathsep + env.get('PYTHONPATH', "")
+    env.update(extra)
+    return env
+
+
+def run_times(cmd, runs, env=None):
+    """
+        wall clock seconds of each of runs runs of cmd
+    """
+    env = env or _env()
+    ret = []
+    for _ in range(runs) :
+        t0 = time.perf_counter()
+        subprocess.run(cmd, env=env, check=True, stdout=subprocess.DEVNULL)
+        ret.append(time.perf_counter() - t0)
+    return ret
+
+
+def summary(samples, base=0.0):
+    samples = sorted(s - base for s in samples)
+    return {'min': samples[0], 'median': samples[len(samples) // 2],
+            'max': samples[-1]}
+
+
+def bench_import(runs):
+    base = min(run_times([sys.executable, "-c", "pass"], runs))
+    ret = {'interpreter': base}
+    for name, stmt in (("import RainEagle", "import RainEagle"),
+                       ("from RainEagle import Eagle",
+                        "from RainEagle import Eagle"),
+                       ("from RainEagle import AsyncEagle",
+                        "from RainEagle import AsyncEagle")) :
+        ret[name] = summary(run_times([sys.executable, "-c", stmt], runs), base)
+    return ret
+
+
+def bench_importtime(stmt="from RainEagle import Eagle", count=15):
+    """
+        cumulative microseconds of the RainEagle modules and the
+        count slowest modules by their own import time
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", stmt],
+                          env=_env(), check=True, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    rows = []
+    for line in proc.stderr.splitlines() :
+        if not line.startswith("import time:") or "self [us]" in line :
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(own), int(cumulative)))
+
+    return {'statement': stmt,
+            'RainEagle': dict((name, cumulative) for name, own, cumulative in rows
+                              if name.startswith("RainEagle")),
+            'slowest': [[name, own] for name, own, cumulative in
+                        sorted(rows, key=lambda r : -r[1])[:count]]}
+
+
+def bench_meter_status(runs):
+    ret = {}
+    with EagleSimulator(gateways=1) as sim :
+        args = sim.eagle_args(0)
+        cmd = [sys.executable, METER_STATUS, "-a", args['addr'],
+               "-p", str(args['port'])]
+        if args['username'] :
+            cmd += ["-u", args['username'], "-s", args['password']]
+
+        with tempfile.TemporaryDirectory() as tmp :
+            cache = os.path.join(tmp, "identity.json")
+            env = _env(EAGLE_IDENTITY_CACHE=cache)
+            # first run fills the cache
+            ret['cold'] = run_times(cmd, 1, env)[0]
+            ret['cached'] = summary(run_times(cmd, runs, env))
+            ret['no_identity_cache'] = summary(
+                run_times(cmd + ["--no-identity-cache"], runs, env))
+            ret['no_check_firmware'] = summary(
+                run_times(cmd + ["--no-identity-cache", "--no-check-firmware"],
+                          runs, env))
+    return ret
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="RainEagle import benchmark")
+    parser.add_argument("-o", "--output", dest="output",
+                        help="write JSON results to file ( default stdout )")
+    parser.add_argument("-n", "--runs", dest="runs", type=int, default=10,
+                        help="interpreter starts per measurement")
+    return parser
+
+
+def main():
+    args = create_parser().parse_args()
+
+    with tempfile.TemporaryDirectory() as pycache :
+        os.environ['PYTHONPYCACHEPREFIX'] = pycache
+        run_times([sys.executable, "-c", "import RainEagle.EagleFleet"], 1)
+        results = {
+            'import': bench_import(args.runs),
+            'importtime': bench_importtime(),
+            'meter_status': bench_meter_status(args.runs),
+        }
+
+    out = {'version': RainEagle.__version__,
+           'python': platform.python_version(),
+           'platform': platform.platform(),
+           'time': int(time.time()),
+           'results': results}
+
+    text = json.dumps(out, indent=2, sort_keys=True)
+    if args.output :
+        with open(args.output, "w") as fp :
+            fp.write(text + "\n")
+    else :
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+
+"""
+    benchmark suite for the client hot paths
+
+    runs offline against a local EagleSimulator and writes the
+    results as JSON, so runs of different versions can be compared
+
+        request encoding        _build_command() + auth headers
+        round trip              latency and throughput per command
+        json decode             get_usage_data / get_historical_data payloads
+        _et2d                   get_device_data and large history trees
+        history decode          per 10k records, from tree and streamed
+        export                  BatchExporter sinks, per 10k records
+        parallel decode         decode_history_dumps() of 4 gateways,
+                                per 10k records, by worker count
+
+    usage: python Tests/bench_suite.py [-o results.json] [-c baseline.json]
+                                       [-r records] [-n calls] [--quick]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import timeit
+import platform
+import argparse
+import threading
+import io
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import RainEagle
+from RainEagle import Eagle, HTTPTransport
+from RainEagle.EagleClass import _et2d
+from RainEagle.EagleDecode import decode_summations, SummationRecord
+from RainEagle.EagleExport import BatchExporter, LineProtocolSink, CSVSink
+from RainEagle.EagleParallel import decode_history_dumps
+from RainEagle.EagleSim import EagleSimulator
+
+HTTP_COMMANDS = ("get_usage_data", "get_device_list", "get_historical_data",
+                 "get_price", "get_setting_data")
+SOC_COMMANDS = ("get_instantaneous_demand", "get_device_data", "list_devices")
+
+
+def per_call(func, number, repeat=5):
+    """
+        best time per call of func() in seconds
+    """
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    n = len(samples)
+
+    def pct(p):
+        return samples[min(n - 1, int(p * n))]
+
+    return {'min': samples[0], 'p50': pct(0.50), 'p90': pct(0.90),
+            'p99': pct(0.99), 'max': samples[-1],
+            'mean': sum(samples) / n}
+
+
+def bench_encode(eg, number):
+    def encode():
+        eg._build_command("get_usage_data", MacId=None).encode()
+        eg._auth_headers()
+
+    def encode_args():
+        eg._build_command("set_cloud", MacId=None, Provider="manual",
+                          Protocol="http", HostName="example.com",
+                          Url="/upload", Port="0x50", AuthCode="",
+                          Email="", UserId="", Password="").encode()
+        eg._auth_headers()
+
+    return {'get_usage_data': per_call(encode, number),
+            'set_cloud': per_call(encode_args, number)}
+
+
+def bench_round_trip(eg, commands, calls):
+    """
+        sequential calls over one kept alive connection
+    """
+    ret = dict()
+    for cmd in commands :
+        func = getattr(eg, cmd)
+        func()
+        samples = []
+        t0 = time.perf_counter()
+        for _ in range(calls) :
+            t = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - t0
+        res = percentiles(samples)
+        res['calls_per_sec'] = calls / elapsed
+        ret[cmd] = res
+    return ret
+
+
+def bench_threaded(sim, calls, threads):
+    """
+        get_usage_data throughput from several threads sharing a transport
+    """
+    transport = HTTPTransport(maxsize=threads)
+    eagles = [Eagle(checkfirmware=False, transport=transport,
+                    **sim.eagle_args(i % len(sim.gateways)))
+              for i in range(threads)]
+
+    def worker(eg):
+        for _ in range(calls) :
+            eg.get_usage_data()
+
+    workers = [threading.Thread(target=worker, args=(eg,)) for eg in eagles]
+    t0 = time.perf_counter()
+    for w in workers :
+        w.start()
+    for w in workers :
+        w.join()
+    elapsed = time.perf_counter() - t0
+    transport.close()
+    return {'threads': threads, 'calls': calls * threads,
+            'calls_per_sec': calls * threads / elapsed}
+
+
+def bench_json(eg, number):
+    ret = dict()
+    for cmd in ("get_usage_data", "get_historical_data") :
+        payload = eg._send_http_comm(cmd)
+        ret[cmd] = {'bytes': len(payload),
+                    'sec': per_call(lambda: json.loads(payload), number)}
+    return ret
+
+
+def history_xml(gw, records):
+    return "<Response>" + "".join(
+        gw._xml_history(gw.history_timestamps()[-records:])) + "</Response>"
+
+
+def bench_et2d(gw, records, number):
+    device = ET.fromstring("<Response>" + gw.soc_responce(
+        "get_device_data", dict(), int(time.time())) + "</Response>")
+    history = ET.fromstring(history_xml(gw, records))
+    return {'get_device_data': per_call(lambda: _et2d(device), number),
+            'history': {'records': records,
+                        'sec': per_call(lambda: _et2d(history), 1)}}
+
+
+def bench_history(eg, gw, records):
+    """
+        seconds per 10k history records
+    """
+    scale = 10000.0 / records
+    tree = _et2d(ET.fromstring(history_xml(gw, records)))
+    cs = tree['HistoryData']['CurrentSummation']
+    start = gw.history_timestamps()[-records]
+
+    def stream():
+        for _ in eg.iter_history(start=start) :
+            pass
+
+    return {'records': records,
+            'decode_summations': per_call(lambda: decode_summations(cs), 1) * scale,
+            'iter_history': per_call(stream, 1, repeat=3) * scale}
+
+
+def bench_export(records):
+    """
+        seconds per 10k records through BatchExporter, add() to close()
+    """
+    scale = 10000.0 / records
+    recs = [SummationRecord(1394422200 + 900 * i, 1000.0 + i * 0.425, 10.0)
+            for i in range(records)]
+    tags = {'macid': "0xd8d5b90000001296"}
+
+    def export(sink):
+        def run():
+            with BatchExporter(sink(io.StringIO())) as ex :
+                for rec in recs :
+                    ex.add(rec, tags)
+        return per_call(run, 1, repeat=3) * scale
+
+    def add_only():
+        ex = BatchExporter(LineProtocolSink(io.StringIO()),
+                           batch_size=records + 1, flush_interval=60)
+        t0 = time.perf_counter()
+        for rec in recs :
+            ex.add(rec, tags)
+        t = time.perf_counter() - t0
+        ex.close()
+        return t * scale
+
+    return {'records': records,
+            'line_protocol': export(LineProtocolSink),
+            'csv': export(CSVSink),
+            'add': min(add_only() for _ in range(3))}
+
+
+def bench_parallel(sim, records):
+    """
+        seconds per 10k records decoding the raw history of
+        every gateway with 1, 2 .. cpu count worker processes
+    """
+    dumps = dict()
+    for gw in sim.gateways :
+        dumps[gw.soc_macid] = history_xml(gw, records).encode()
+    scale = 10000.0 / (records * len(dumps))
+    counts = sorted(set([1, 2, os.cpu_count() or 1]))
+    out = {'records': records * len(dumps)}
+    for n in counts :
+        out['workers_{0}'.format(n)] = per_call(
+            lambda: decode_history_dumps(dumps, workers=n, use_numpy=False),
+            1, repeat=3) * scale
+    return out
+
+
+def flatten(d, prefix=""):
+    for k, v in d.items() :
+        key = prefix + k
+        if isinstance(v, dict) :
+            for item in flatten(v, key + ".") :
+                yield item
+        elif isinstance(v, float) :
+            yield key, v
+
+
+def compare(results, baseline):
+    """
+        print the ratio of each timing to the baseline run
+        ( > 1 is slower, for calls_per_sec > 1 is faster )
+    """
+    base = dict(flatten(baseline['results']))
+    print("{0:<55s} {1:>12s} {2:>12s} {3:>7s}".format(
+        "", "baseline", "current", "ratio"), file=sys.stderr)
+    for key, v in flatten(results['results']) :
+        if key in base and base[key] :
+            print("{0:<55s} {1:12.6g} {2:12.6g} {3:7.2f}".format(
+                key, base[key], v, v / base[key]), file=sys.stderr)
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="RainEagle benchmark suite")
+    parser.add_argument("-o", "--output", dest="output",
+                        help="write JSON results to file ( default stdout )")
+    parser.add_argument("-c", "--compare", dest="compare",
+                        help="JSON results of a previous run to compare with")
+    parser.add_argument("-r", "--records", dest="records", type=int,
+                        default=10000, help="history records")
+    parser.add_argument("-n", "--calls", dest="calls", type=int,
+                        default=500, help="calls per command for round trips")
+    parser.add_argument("--quick", dest="quick", action="store_true",
+                        help="fewer iterations")
+    return parser
+
+
+def main():
+    args = create_parser().parse_args()
+    number = 2000
+    if args.quick :
+        args.calls = min(args.calls, 50)
+        args.records = min(args.records, 2000)
+        number = 200
+
+    with EagleSimulator(gateways=4, history_size=max(args.records, 2880)) as sim :
+        gw = sim.gateways[0]
+        eg = Eagle(checkfirmware=False, **sim.eagle_args(0))
+        results = {
+            'encode': bench_encode(eg, number),
+            'round_trip': bench_round_trip(eg, HTTP_COMMANDS + SOC_COMMANDS,
+                                           args.calls),
+            'threaded': bench_threaded(sim, args.calls, 4),
+            'json_decode': bench_json(eg, number // 10),
+            'et2d': bench_et2d(gw, args.records, number // 10),
+            'history_per_10k': bench_history(eg, gw, args.records),
+            'export_per_10k': bench_export(args.records),
+            'parallel_per_10k': bench_parallel(sim, args.records),
+        }
+        eg.close()
+
+    out = {'version': RainEagle.__version__,
+           'python': platform.python_version(),
+           'platform': platform.platform(),
+           'time': int(time.time()),
+           'results': results}
+
+    text = json.dumps(out, indent=2, sort_keys=True)
+    if args.output :
+        with open(args.output, "w") as fp :
+            fp.write(text + "\n")
+    else :
+        print(text)
+
+    if args.compare :
+        with open(args.compare) as fp :
+            compare(out, json.load(fp))
+
+
+if __name__ == "__main__":
+    main()
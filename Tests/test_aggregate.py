@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""
+    tests for SummationAggregator, bucket edges across DST
+
+    usage: python -m unittest Tests/test_aggregate.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import calendar
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from RainEagle.EagleAggregate import SummationAggregator
+
+# 2024 in America/New_York : EST -> EDT on March 10 at 2:00,
+# EDT -> EST on November 3 at 2:00
+_spring = (2024, 3, 9)
+_fall = (2024, 11, 2)
+
+
+def readings(day, hours=48, step=900):
+    """
+        a reading every step seconds from noon UTC of day, 0.25 kWh
+        delivered and 0.01 kWh received per reading
+    """
+    t0 = calendar.timegm(day + (12, 0, 0))
+    return [(t0 + i * step, 100 + i * 0.25, 10 + i * 0.01)
+            for i in range(hours * 3600 // step)]
+
+
+def local(ts):
+    return time.strftime("%d %H:%M %Z", time.localtime(ts))
+
+
+@unittest.skipUnless(hasattr(time, "tzset"), "needs time.tzset()")
+class TestBucketsDST(unittest.TestCase):
+
+    def setUp(self):
+        self.tz = os.environ.get("TZ")
+        os.environ["TZ"] = "America/New_York"
+        time.tzset()
+
+    def tearDown(self):
+        if self.tz is None :
+            del os.environ["TZ"]
+        else :
+            os.environ["TZ"] = self.tz
+        time.tzset()
+
+    def aggregate(self, bucket, day, localtime=True):
+        recs = readings(day)
+        out = list(SummationAggregator(bucket, localtime).aggregate(recs))
+        # contiguous, every reading counted once
+        for a, b in zip(out, out[1:]) :
+            self.assertEqual(a.end, b.start)
+        self.assertEqual(sum(b.count for b in out), len(recs))
+        for b in out :
+            self.assertLess(b.start, b.end)
+        for ts, _, _ in recs :
+            self.assertEqual(sum(b.start <= ts < b.end for b in out), 1)
+        return out
+
+    def test_day(self):
+        out = self.aggregate("day", _spring)
+        self.assertEqual([local(b.start) for b in out],
+                         ["09 00:00 EST", "10 00:00 EST", "11 00:00 EDT"])
+        self.assertEqual(out[1].end - out[1].start, 23 * 3600)
+        self.assertEqual(out[1].count, 23 * 4)
+        self.assertAlmostEqual(out[1].delivered, 23 * 4 * 0.25)
+
+        out = self.aggregate("day", _fall)
+        self.assertEqual([local(b.start) for b in out],
+                         ["02 00:00 EDT", "03 00:00 EDT", "04 00:00 EST"])
+        self.assertEqual(out[1].end - out[1].start, 25 * 3600)
+        self.assertEqual(out[1].count, 25 * 4)
+        self.assertAlmostEqual(out[1].received, 25 * 4 * 0.01)
+
+    def test_hour(self):
+        out = self.aggregate("hour", _spring)
+        starts = [local(b.start) for b in out]
+        i = starts.index("10 01:00 EST")
+        self.assertEqual(starts[i + 1], "10 03:00 EDT")
+        self.assertTrue(all(b.end - b.start == 3600 for b in out))
+
+        out = self.aggregate("hour", _fall)
+        starts = [local(b.start) for b in out]
+        # 1:00 happens twice
+        i = starts.index("03 01:00 EDT")
+        self.assertEqual(starts[i + 1], "03 01:00 EST")
+        self.assertTrue(all(b.count == 4 for b in out))
+
+    def test_seconds(self):
+        out = self.aggregate(7200, _spring)
+        starts = [local(b.start) for b in out]
+        i = starts.index("10 00:00 EST")
+        # 0:00 - 2:00 EST, then 3:00 - 4:00 EDT
+        self.assertEqual(starts[i + 1:i + 3], ["10 03:00 EDT", "10 04:00 EDT"])
+        self.assertEqual(out[i + 1].end - out[i + 1].start, 3600)
+
+        out = self.aggregate(7200, _fall)
+        starts = [local(b.start) for b in out]
+        i = starts.index("03 00:00 EDT")
+        # 0:00 EDT - 1:00 EST, 1:00 - 2:00 EST, then 2:00 EST
+        self.assertEqual(starts[i + 1:i + 3], ["03 01:00 EST", "03 02:00 EST"])
+        self.assertEqual(out[i + 1].end - out[i + 1].start, 3600)
+
+    def test_utc(self):
+        out = self.aggregate("day", _fall, localtime=False)
+        self.assertTrue(all(b.end - b.start == 86400 for b in out))
+        self.assertTrue(all(b.start % 86400 == 0 for b in out))
+
+    def test_edges(self):
+        # a reading exactly at local midnight starts the new day
+        midnight = int(time.mktime((2024, 3, 10, 0, 0, 0, 0, 0, -1)))
+        agg = SummationAggregator("day")
+        self.assertIsNone(agg.feed((midnight - 1, 1.0, 0.0)))
+        done = agg.feed((midnight, 2.0, 0.0))
+        self.assertEqual((done.end, done.count), (midnight, 1))
+        self.assertEqual(agg.bucket_start, midnight)
+        self.assertEqual(agg.close().delivered, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
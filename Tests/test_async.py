@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+"""
+    tests for AsyncEagle
+
+    usage: python -m unittest Tests/test_async.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from RainEagle import AsyncEagle, AsyncHedger
+
+
+class StallingServer:
+    """
+        socket api server that answers with the start of a history
+        and then stalls without closing the connection
+    """
+    def __init__(self):
+        self.soc = socket.socket()
+        self.soc.bind(("127.0.0.1", 0))
+        self.soc.listen(4)
+        self.port = self.soc.getsockname()[1]
+        self.conns = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True :
+            try :
+                conn, _ = self.soc.accept()
+            except OSError :
+                return
+            self.conns.append(conn)
+            conn.recv(4096)
+            conn.sendall(b"<HistoryData>\n<CurrentSummation>\n")
+
+    def close(self):
+        self.soc.close()
+        for conn in self.conns :
+            conn.close()
+
+
+class TestAsyncEagle(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StallingServer()
+
+    def tearDown(self):
+        self.server.close()
+
+    def eagle(self, **kwargs):
+        eg = AsyncEagle(addr="127.0.0.1", port=self.server.port,
+                        macid="0xd8d5b90000001296", checkfirmware=False,
+                        identity_cache=None, timeout=0.3, **kwargs)
+        eg._preloaded = True
+        return eg
+
+    def test_stalled_iter_history(self):
+        async def run() :
+            eg = self.eagle()
+            t0 = time.monotonic()
+            with self.assertRaises(asyncio.TimeoutError) :
+                async for _ in eg.iter_history() :
+                    pass
+            await eg.close()
+            return time.monotonic() - t0
+        self.assertLess(asyncio.run(run()), 2)
+
+    def test_stalled_history_raw(self):
+        async def run() :
+            eg = self.eagle()
+            with self.assertRaises(asyncio.TimeoutError) :
+                await eg.get_history_raw()
+            await eg.close()
+        asyncio.run(run())
+
+    def test_close_cancels_hedged_attempts(self):
+        async def run() :
+            hedger = AsyncHedger()
+            eg = self.eagle(hedge=hedger)
+
+            async def slow() :
+                await asyncio.sleep(60)
+            t = hedger._start(slow, ())
+            await eg.close()
+            await asyncio.sleep(0)
+            return t
+        self.assertTrue(asyncio.run(run()).cancelled())
+
+
+if __name__ == "__main__":
+    unittest.main()
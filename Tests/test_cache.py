@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+"""
+    tests for ResponseCache, offline against EagleSimulator
+
+    usage: python -m unittest Tests/test_cache.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from RainEagle import Eagle
+from RainEagle.EagleSim import EagleSimulator
+from RainEagle.EagleCache import ResponseCache
+
+_key = ('get_setting_data', '0x1', ())
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_ttl(self):
+        cache = ResponseCache(ttl={'get_setting_data': 0.2})
+        cache.put(_key, {'a': 1})
+        self.assertEqual(cache.get(_key), {'a': 1})
+        time.sleep(0.3)
+        self.assertIsNone(cache.get(_key))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_not_cacheable(self):
+        cache = ResponseCache()
+        self.assertFalse(cache.cacheable('get_instantaneous_demand'))
+        cache.put(('get_instantaneous_demand', '0x1', ()), {'a': 1})
+        self.assertIsNone(cache.get(('get_instantaneous_demand', '0x1', ())))
+
+    def test_lru(self):
+        cache = ResponseCache(maxsize=2)
+        keys = [('get_setting_data', str(i), ()) for i in range(3)]
+        cache.put(keys[0], 0)
+        cache.put(keys[1], 1)
+        cache.get(keys[0])
+        cache.put(keys[2], 2)
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.get(keys[0]), 0)
+
+    def test_invalidate(self):
+        cache = ResponseCache()
+        other = ('get_device_config', '0x1', ())
+        cache.put(_key, 1)
+        cache.put(other, 2)
+        cache.invalidate('get_price')
+        self.assertEqual(cache.get(_key), 1)
+        cache.invalidate('set_price')
+        self.assertIsNone(cache.get(_key))
+        self.assertEqual(cache.get(other), 2)
+        cache.invalidate('factory_reset')
+        self.assertIsNone(cache.get(other))
+
+    def test_stale_fill(self):
+        cache = ResponseCache()
+        generation = cache.generation
+        # set_price is answered while the get is in flight
+        cache.invalidate('set_price')
+        cache.put(_key, 'old', generation)
+        self.assertIsNone(cache.get(_key))
+        cache.put(_key, 'new', cache.generation)
+        self.assertEqual(cache.get(_key), 'new')
+
+
+class TestEagleCache(unittest.TestCase):
+
+    def setUp(self):
+        self.sim = EagleSimulator().start()
+        self.eg = Eagle(checkfirmware=False, identity_cache=None, cache=True,
+                        **self.sim.eagle_args())
+        self.eg.get_setting_data()
+
+    def tearDown(self):
+        self.eg.close()
+        self.sim.stop()
+
+    def requests(self):
+        return self.sim.counts.get('http', 0)
+
+    def test_cached(self):
+        n = self.requests()
+        a = self.eg.get_setting_data()
+        a['mangled'] = True
+        self.assertNotIn('mangled', self.eg.get_setting_data())
+        self.assertEqual(self.requests(), n)
+
+    def test_invalidated_by_set(self):
+        n = self.requests()
+        self.eg.set_price(price=0.15)
+        self.eg.get_setting_data()
+        self.assertEqual(self.requests(), n + 2)
+
+    def test_set_during_fetch(self):
+        eg = self.eg
+        eg.cache.clear()
+        fetch = eg._fetch
+
+        def racing_fetch(cmd, MacId, kwargs) :
+            ret = fetch(cmd, MacId, kwargs)
+            # a set_price sent from another thread, answered
+            # after this responce was read
+            eg.cache.invalidate('set_price')
+            return ret
+        eg._fetch = racing_fetch
+        eg.get_setting_data()
+        eg._fetch = fetch
+        n = self.requests()
+        eg.get_setting_data()
+        self.assertEqual(self.requests(), n + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
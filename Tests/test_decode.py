@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""
+    regression tests for the batch decoders
+
+    usage: python -m unittest Tests/test_decode.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from RainEagle.EagleDecode import decode_summation, decode_summations, \
+    decode_demand, decode_demands
+
+
+def summation(ts, delivered, received=0, multiplier=1, divisor=1000):
+    return {'TimeStamp': "0x{0:08x}".format(ts),
+            'SummationDelivered': "0x{0:016x}".format(delivered),
+            'SummationReceived': "0x{0:016x}".format(received),
+            'Multiplier': "0x{0:08x}".format(multiplier),
+            'Divisor': "0x{0:08x}".format(divisor)}
+
+
+class TestBatchDecode(unittest.TestCase):
+
+    def test_missing_multiplier(self):
+        rec = summation(0x1ab3d3a9, 0x21f1bf)
+        del rec['Multiplier']
+        cols = decode_summations([rec], use_numpy=False)
+        self.assertEqual(tuple(decode_summation(rec)),
+                         (cols.timestamp[0], cols.delivered[0],
+                          cols.received[0]))
+
+    def test_missing_divisor(self):
+        rec = summation(0x1ab3d3a9, 0x21f1bf)
+        del rec['Divisor']
+        cols = decode_summations([rec, summation(0x1ab3d3aa, 5)],
+                                 use_numpy=False)
+        self.assertEqual(cols.delivered[0], decode_summation(rec).delivered)
+
+    def test_summations_match_scalar(self):
+        rnd = random.Random(1)
+        recs = [summation(i, rnd.randrange(1 << 40), rnd.randrange(1 << 30),
+                          rnd.choice((0, 1, 3)), rnd.choice((0, 3, 1000)))
+                for i in range(2000)]
+        for use_numpy in (False, None) :
+            try :
+                cols = decode_summations(recs, use_numpy=use_numpy)
+            except ImportError :
+                continue
+            for rec, t, d, r in zip(recs, *cols) :
+                self.assertEqual(decode_summation(rec), (t, d, r))
+
+    def test_demands_match_scalar(self):
+        rnd = random.Random(2)
+        recs = [{'TimeStamp': "0x{0:08x}".format(i),
+                 'Demand': "0x{0:06x}".format(rnd.randrange(1 << 24)),
+                 'Multiplier': "0x00000001",
+                 'Divisor': "0x{0:08x}".format(rnd.choice((0, 3, 1000)))}
+                for i in range(2000)]
+        cols = decode_demands(recs, use_numpy=False)
+        for rec, t, d in zip(recs, *cols) :
+            self.assertEqual(decode_demand(rec), (t, d))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""
+    tests for BatchExporter
+
+    usage: python -m unittest Tests/test_export.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from RainEagle.EagleExport import BatchExporter
+
+
+class ListSink:
+    """
+        keeps what it is given, each write() waits for delay seconds
+        or until gate is set
+    """
+    def __init__(self, delay=0.0, gate=None):
+        self.delay = delay
+        self.gate = gate
+        self.batches = []
+        self.closed = False
+
+    def write(self, batch):
+        if self.gate is not None :
+            self.gate.wait()
+        if self.delay :
+            time.sleep(self.delay)
+        self.batches.append(batch)
+
+    def close(self):
+        self.closed = True
+
+
+class TestBatchExporter(unittest.TestCase):
+
+    def test_batches(self):
+        sink = ListSink()
+        with BatchExporter(sink, batch_size=3) as ex :
+            for i in range(7) :
+                ex.add(i, {'n': 1})
+            ex.flush()
+            self.assertEqual([len(b) for b in sink.batches], [3, 3, 1])
+            self.assertEqual((ex.written, ex.batches), (7, 3))
+        self.assertTrue(sink.closed)
+        self.assertEqual([rec for b in sink.batches for _, rec in b],
+                         list(range(7)))
+
+    def test_timed_flush(self):
+        sink = ListSink()
+        with BatchExporter(sink, batch_size=100, flush_interval=0.1) as ex :
+            ex.add(1)
+            time.sleep(0.5)
+            self.assertEqual(sink.batches, [[(None, 1)]])
+
+    def test_order_concurrent(self):
+        # readings of each producer must reach the sink in the order
+        # they were added, whether in full or timed out batches
+        sink = ListSink(delay=0.001)
+        ex = BatchExporter(sink, batch_size=7, flush_interval=0.002,
+                           max_pending=1)
+        n = 2000
+
+        def produce(p) :
+            for i in range(n) :
+                ex.add(i, {'p': p})
+                if i % 50 == 0 :
+                    time.sleep(0.002)
+
+        threads = [threading.Thread(target=produce, args=(p,)) for p in range(4)]
+        for t in threads :
+            t.start()
+        for t in threads :
+            t.join()
+        ex.close()
+        seen = dict()
+        for batch in sink.batches :
+            for tags, i in batch :
+                seen.setdefault(tags['p'], []).append(i)
+        self.assertEqual(sorted(seen), [0, 1, 2, 3])
+        for p, got in seen.items() :
+            self.assertEqual(got, list(range(n)))
+
+    def test_back_pressure(self):
+        gate = threading.Event()
+        sink = ListSink(gate=gate)
+        ex = BatchExporter(sink, batch_size=1, max_pending=2)
+        added = []
+
+        def produce() :
+            for i in range(10) :
+                ex.add(i)
+                added.append(i)
+
+        t = threading.Thread(target=produce, daemon=True)
+        t.start()
+        time.sleep(0.3)
+        # one batch in the sink, max_pending queued, one add() waiting
+        self.assertEqual(len(added), 3)
+        gate.set()
+        t.join(5)
+        ex.close()
+        self.assertEqual(len(added), 10)
+        self.assertEqual(ex.written, 10)
+
+    def test_sink_error(self):
+        class Broken(ListSink) :
+            def write(self, batch) :
+                raise IOError("disk full")
+
+        ex = BatchExporter(Broken(), batch_size=1)
+        ex.add(1)
+        with self.assertRaises(IOError) :
+            ex.flush()
+        ex.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
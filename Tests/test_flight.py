@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+"""
+    tests for SingleFlight / AsyncSingleFlight
+
+    usage: python -m unittest Tests/test_flight.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from RainEagle import deadline, DeadlineExceeded
+from RainEagle.EagleFlight import SingleFlight, AsyncSingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def run_threads(self, flight, fn, n=8, key="get_price"):
+        results = [None] * n
+        started = threading.Barrier(n)
+
+        def one(i) :
+            started.wait()
+            try :
+                results[i] = flight.do(key, fn)
+            except Exception as e :
+                results[i] = e
+
+        threads = [threading.Thread(target=one, args=(i,)) for i in range(n)]
+        for t in threads :
+            t.start()
+        for t in threads :
+            t.join()
+        return results
+
+    def test_collapse(self):
+        calls = []
+
+        def fn() :
+            calls.append(1)
+            time.sleep(0.2)
+            return {'price': '0.14'}
+
+        results = self.run_threads(SingleFlight(), fn)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sum(not shared for _, shared in results), 1)
+        self.assertTrue(all(r == {'price': '0.14'} for r, _ in results))
+
+    def test_error(self):
+        def fn() :
+            time.sleep(0.2)
+            raise IOError("gateway gone")
+
+        results = self.run_threads(SingleFlight(), fn)
+        self.assertTrue(all(isinstance(e, IOError) for e in results))
+        self.assertTrue(all(str(e) == "gateway gone" for e in results))
+        # each waiting caller raises its own copy
+        self.assertEqual(len(set(map(id, results))), len(results))
+
+    def test_after_call(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do("k", lambda: 1), (1, False))
+        self.assertEqual(flight.do("k", lambda: 2), (2, False))
+
+    def test_follower_deadline(self):
+        flight = SingleFlight()
+        leader = threading.Thread(target=flight.do,
+                                  args=("k", time.sleep, 1.0))
+        leader.start()
+        time.sleep(0.05)
+        t0 = time.monotonic()
+        with self.assertRaises(DeadlineExceeded) :
+            with deadline(0.1) :
+                flight.do("k", time.sleep, 1.0)
+        self.assertLess(time.monotonic() - t0, 0.5)
+        leader.join()
+
+
+class TestAsyncSingleFlight(unittest.TestCase):
+
+    def test_collapse_and_error(self):
+        calls = []
+
+        async def ok() :
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 42
+
+        async def bad() :
+            await asyncio.sleep(0.05)
+            raise IOError("gateway gone")
+
+        async def run() :
+            flight = AsyncSingleFlight()
+            res = await asyncio.gather(*[flight.do("a", ok) for _ in range(5)])
+            errs = await asyncio.gather(*[flight.do("b", bad) for _ in range(5)],
+                                        return_exceptions=True)
+            return res, errs
+
+        res, errs = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r for r, _ in res], [42] * 5)
+        self.assertTrue(all(isinstance(e, IOError) for e in errs))
+
+
+if __name__ == "__main__":
+    unittest.main()
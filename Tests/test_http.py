@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+"""
+    tests for the keep-alive HTTP transports
+
+    usage: python -m unittest Tests/test_http.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import socket
+import asyncio
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from RainEagle import Eagle
+from RainEagle.EagleHTTP import HTTPTransport
+from RainEagle.EagleAsync import AsyncHTTPTransport
+
+
+class DroppingServer:
+    """
+        keep-alive HTTP server that reads the requests numbered in
+        drop ( from 0 ) and then closes the connection without
+        answering, as a gateway that timed out an idle connection
+        while the request was on its way
+    """
+    def __init__(self, drop=()):
+        self.drop = set(drop)
+        self.bodies = []
+        self.soc = socket.socket()
+        self.soc.bind(("127.0.0.1", 0))
+        self.soc.listen(8)
+        self.addr = "127.0.0.1:{0}".format(self.soc.getsockname()[1])
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True :
+            try :
+                conn, _ = self.soc.accept()
+            except OSError :
+                return
+            threading.Thread(target=self._serve, args=(conn,),
+                             daemon=True).start()
+
+    def _serve(self, conn):
+        fp = conn.makefile("rb")
+        try :
+            while True :
+                line = fp.readline()
+                if not line :
+                    return
+                length = 0
+                while line not in (b"\r\n", b"") :
+                    line = fp.readline()
+                    if line.lower().startswith(b"content-length:") :
+                        length = int(line.split(b":")[1])
+                self.bodies.append(fp.read(length))
+                if len(self.bodies) - 1 in self.drop :
+                    return
+                conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}")
+        finally :
+            fp.close()
+            conn.close()
+
+    def close(self):
+        self.soc.close()
+
+
+class TestRetry(unittest.TestCase):
+
+    def setUp(self):
+        self.server = DroppingServer(drop=[1])
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_not_idempotent_sent_once(self):
+        tr = HTTPTransport()
+        self.assertEqual(tr.request(self.server.addr, b"first")[0], 200)
+        with self.assertRaises(ConnectionError) :
+            tr.request(self.server.addr, b"set_price")
+        self.assertEqual(self.server.bodies, [b"first", b"set_price"])
+        tr.close()
+
+    def test_idempotent_retried(self):
+        tr = HTTPTransport()
+        tr.request(self.server.addr, b"first")
+        self.assertEqual(tr.request(self.server.addr, b"get_price",
+                                    idempotent=True), (200, b"{}"))
+        self.assertEqual(self.server.bodies,
+                         [b"first", b"get_price", b"get_price"])
+        tr.close()
+
+    def test_async(self):
+        async def run() :
+            tr = AsyncHTTPTransport()
+            await tr.request(self.server.addr, b"first")
+            with self.assertRaises(ConnectionError) :
+                await tr.request(self.server.addr, b"set_price")
+            self.assertEqual((await tr.request(self.server.addr, b"get_price",
+                                               idempotent=True))[0], 200)
+            tr.close()
+        asyncio.run(run())
+        self.assertEqual(self.server.bodies, [b"first", b"set_price",
+                                              b"get_price"])
+
+    def test_eagle_set_sent_once(self):
+        eg = Eagle(addr=self.server.addr, macid="0xd8d5b90000001296",
+                   lazy=True, checkfirmware=False, identity_cache=None)
+        eg._send_http_comm("get_price")
+        with self.assertRaises(ConnectionError) :
+            eg._send_http_comm("set_price", Price="0x1", Trailing="0x2")
+        self.assertEqual(len(self.server.bodies), 2)
+        self.assertIn(b"set_price", self.server.bodies[1])
+        eg.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+"""
+    tests for UploadReceiver, against pushes of EagleSimulator
+
+    usage: python -m unittest Tests/test_receiver.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import asyncio
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from RainEagle import Eagle
+from RainEagle.EagleSim import EagleSimulator
+from RainEagle.EagleDecode import DemandRecord, SummationRecord
+from RainEagle.EagleExport import BatchExporter
+from RainEagle.EagleReceiver import UploadReceiver
+
+_body = (b'<rainforest macId="0xd8d5b90000001296" timestamp="1394422200s">\n'
+         b'<InstantaneousDemand>\n'
+         b'<DeviceMacId>0xd8d5b90000001296</DeviceMacId>\n'
+         b'<TimeStamp>0x1ab3d3a9</TimeStamp>\n'
+         b'<Demand>0x0001f4</Demand>\n'
+         b'<Multiplier>0x00000001</Multiplier>\n'
+         b'<Divisor>0x000003e8</Divisor>\n'
+         b'</InstantaneousDemand>\n'
+         b'</rainforest>\n')
+
+
+class ListSink:
+    def __init__(self):
+        self.rows = []
+
+    def write(self, batch):
+        self.rows.extend(batch)
+
+    def close(self):
+        pass
+
+
+async def post(port, body, headers=(), chunks=None):
+    """
+        POST body, in chunks ( transfer-encoding: chunked ) if given,
+        returns the status, or None if the connection was closed
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = ["POST / HTTP/1.1", "Host: 127.0.0.1"] + list(headers)
+    if chunks is None :
+        head.append("Content-Length: {0}".format(len(body)))
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+    else :
+        head.append("Transfer-Encoding: chunked")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode())
+        for i in range(0, len(body), chunks) :
+            part = body[i:i + chunks]
+            writer.write(b"%x\r\n%s\r\n" % (len(part), part))
+            await writer.drain()
+        writer.write(b"0\r\nX-Trailer: 1\r\n\r\n")
+    try :
+        line = await asyncio.wait_for(reader.readline(), 5)
+    finally :
+        writer.close()
+    if not line :
+        return None
+    return int(line.split()[1])
+
+
+class TestUploadReceiver(unittest.TestCase):
+
+    def run_receiver(self, test, **kwargs):
+        got = []
+        kwargs.setdefault('handler', lambda macid, rec: got.append((macid, rec)))
+
+        async def run() :
+            async with UploadReceiver(host="127.0.0.1", port=0, **kwargs) as rcv :
+                return await test(rcv)
+        return asyncio.run(run()), got
+
+    def test_sim_push(self):
+        exporter = BatchExporter(ListSink(), batch_size=100)
+        with EagleSimulator(gateways=1) as sim :
+            async def test(rcv) :
+                url = rcv.url("127.0.0.1")
+                loop = asyncio.get_running_loop()
+
+                def push() :
+                    eg = Eagle(lazy=True, checkfirmware=False,
+                               identity_cache=None, **sim.eagle_args())
+                    eg.set_cloud(url=url)
+                    eg.close()
+                    sim.push()
+                    return sim.push()
+                await loop.run_in_executor(None, push)
+                return rcv
+            rcv, got = self.run_receiver(test, exporter=exporter,
+                                         username="rain", password="eagle")
+        exporter.close()
+        self.assertEqual((rcv.posts, rcv.records, rcv.errors), (4, 4, 0))
+        self.assertEqual([type(r) for _, r in got],
+                         [DemandRecord, SummationRecord] * 2)
+        self.assertEqual(len(exporter.sink.rows), 4)
+        macid = sim.gateways[0].soc_macid
+        self.assertTrue(all(m == macid for m, _ in got))
+        self.assertEqual(exporter.sink.rows[0][0], {'macid': macid})
+
+    def test_chunked(self):
+        async def test(rcv) :
+            return await post(rcv.port, _body, chunks=37)
+        status, got = self.run_receiver(test)
+        self.assertEqual(status, 200)
+        self.assertEqual(len(got), 1)
+        self.assertEqual(got[0][0], "0xd8d5b90000001296")
+        self.assertEqual(got[0][1].demand, 0.5)
+
+    def test_auth(self):
+        async def test(rcv) :
+            return (await post(rcv.port, _body),
+                    await post(rcv.port, _body, ["Authorization: " + rcv._auth]),
+                    rcv.errors)
+        (denied, ok, errors), got = self.run_receiver(test, username="rain",
+                                                      password="eagle")
+        self.assertEqual((denied, ok, errors), (401, 200, 1))
+        self.assertEqual(len(got), 1)
+
+    def test_too_large(self):
+        async def test(rcv) :
+            return (await post(rcv.port, _body),
+                    await post(rcv.port, _body, chunks=64))
+        statuses, got = self.run_receiver(test, max_body=100)
+        self.assertEqual(statuses, (413, 413))
+        self.assertEqual(got, [])
+
+    def test_handler_error(self):
+        def handler(macid, rec) :
+            raise ValueError("bug")
+
+        async def test(rcv) :
+            return await post(rcv.port, _body), rcv.errors
+        (status, errors), _ = self.run_receiver(test, handler=handler)
+        self.assertEqual((status, errors), (500, 1))
+
+    def test_stalled_trailer(self):
+        async def test(rcv) :
+            reader, writer = await asyncio.open_connection("127.0.0.1", rcv.port)
+            writer.write(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+                         b"0\r\nX-Trailer: 1\r\n")
+            t0 = time.monotonic()
+            line = await asyncio.wait_for(reader.readline(), 5)
+            writer.close()
+            return line, time.monotonic() - t0
+        (line, elapsed), _ = self.run_receiver(test, timeout=0.2)
+        self.assertEqual(line, b"")
+        self.assertLess(elapsed, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
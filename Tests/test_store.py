@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+"""
+    tests for MeterSeries / MeterStore
+
+    usage: python -m unittest Tests/test_store.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from RainEagle.EagleStore import MeterSeries, MeterStore, HEADER_SIZE, \
+    RECORD_SIZE
+
+
+class TestMeterSeries(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, "meter.reh")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def series(self, n, step=4):
+        ser = MeterSeries(self.filename, index_step=step)
+        ser.append([(100 + 10 * i, float(i), 0.0) for i in range(n)])
+        return ser
+
+    def timestamps(self, ser, start=None, end=None):
+        return [rec.timestamp for rec in ser.range(start, end)]
+
+    def test_bisect(self):
+        ser = self.series(21)
+        ser.range()
+        # every record, between records, before and after all of them
+        for i in range(21) :
+            self.assertEqual(ser._bisect(100 + 10 * i), i)
+            self.assertEqual(ser._bisect(100 + 10 * i - 5), i)
+        self.assertEqual(ser._bisect(0), 0)
+        self.assertEqual(ser._bisect(1000), 21)
+
+    def test_range_bounds(self):
+        ser = self.series(21)
+        self.assertEqual(self.timestamps(ser), list(range(100, 310, 10)))
+        # start inclusive, end exclusive, across index blocks
+        self.assertEqual(self.timestamps(ser, 130, 180), [130, 140, 150, 160, 170])
+        self.assertEqual(self.timestamps(ser, 135, 175), [140, 150, 160, 170])
+        self.assertEqual(self.timestamps(ser, 300), [300])
+        self.assertEqual(self.timestamps(ser, None, 100), [])
+        self.assertEqual(self.timestamps(ser, 400), [])
+        self.assertEqual(self.timestamps(ser, 200, 150), [])
+
+    def test_empty(self):
+        ser = MeterSeries(self.filename)
+        self.assertEqual(len(ser), 0)
+        self.assertEqual(list(ser.range()), [])
+        self.assertIsNone(ser.last_timestamp())
+
+    def test_skips_old_records(self):
+        ser = self.series(3)
+        self.assertEqual(ser.append([(110, 9.0, 9.0), (120, 9.0, 9.0),
+                                     (130, 3.0, 0.0)]), 1)
+        self.assertEqual(self.timestamps(ser), [100, 110, 120, 130])
+        self.assertEqual(ser.range()[1].delivered, 1.0)
+
+    def test_torn_tail(self):
+        self.series(2)
+        with open(self.filename, "ab") as fp :
+            fp.write(b"\x01\x02\x03")
+        ser = MeterSeries(self.filename)
+        self.assertEqual(len(ser), 2)
+        self.assertEqual(ser.append([(300, 3.0, 0.0)]), 1)
+        self.assertEqual(os.path.getsize(self.filename),
+                         HEADER_SIZE + 3 * RECORD_SIZE)
+        recs = list(ser.range())
+        self.assertEqual([r.timestamp for r in recs], [100, 110, 300])
+        self.assertEqual(recs[-1].delivered, 3.0)
+
+    def test_two_writers(self):
+        a = self.series(2)
+        b = MeterSeries(self.filename)
+        a.append([(200, 2.0, 0.0)])
+        # b has not seen 200, the file has
+        self.assertEqual(b.append([(150, 1.5, 0.0), (250, 2.5, 0.0)]), 1)
+        self.assertEqual(self.timestamps(a), [100, 110, 200, 250])
+
+    def test_store(self):
+        store = MeterStore(self.dir)
+        store.append("d8:d5:b9:00:00:00:12:96", [(100, 1.0, 0.0)])
+        self.assertEqual(store.last_timestamp("d8:d5:b9:00:00:00:12:96"), 100)
+        self.assertEqual(len(store.range("d8:d5:b9:00:00:00:12:96")), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
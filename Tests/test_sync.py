@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+"""
+    tests for HistorySync, offline against EagleSimulator
+
+    usage: python -m unittest Tests/test_sync.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from RainEagle import Eagle
+from RainEagle.EagleSim import EagleSimulator
+from RainEagle.EagleSync import HistorySync, HistoryLog
+from RainEagle.EagleStore import MeterStore
+
+
+class TestHistorySync(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.sim = EagleSimulator(history_size=50).start()
+        self.eg = Eagle(checkfirmware=False, identity_cache=None,
+                        **self.sim.eagle_args())
+
+    def tearDown(self):
+        self.eg.close()
+        self.sim.stop()
+        shutil.rmtree(self.dir)
+
+    def stamps(self):
+        return list(self.sim.gateways[0].history_timestamps())
+
+    def test_sync(self):
+        hs = HistorySync(self.eg, path=self.dir)
+        new = hs.sync()
+        self.assertEqual([r.timestamp for r in new], self.stamps())
+        self.assertEqual(hs.high_water(self.eg.macid), new[-1].timestamp)
+        # nothing new, the record at the mark is not stored again
+        self.assertEqual(hs.sync(), [])
+        self.assertEqual(list(hs.store.read(self.eg.macid)), new)
+
+    def test_repeats(self):
+        # records repeated by the device are stored once
+        iter_history = self.eg.iter_history
+
+        def repeating(**kwargs) :
+            for rec in iter_history(**kwargs) :
+                yield rec
+                yield rec
+        self.eg.iter_history = repeating
+        new = HistorySync(self.eg, path=self.dir).sync()
+        self.assertEqual([r.timestamp for r in new], self.stamps())
+
+    def test_resume(self):
+        new = HistorySync(self.eg, path=self.dir).sync()
+        # drop the last records, as if stopped before they were fetched
+        log = HistoryLog(self.dir)
+        with open(log.filename(self.eg.macid)) as fp :
+            lines = fp.readlines()
+        with open(log.filename(self.eg.macid), "w") as fp :
+            fp.writelines(lines[:-5])
+        os.unlink(os.path.join(self.dir, "high_water.json"))
+
+        hs = HistorySync(self.eg, path=self.dir)
+        self.assertEqual(hs.high_water(self.eg.macid), new[-6].timestamp)
+        self.assertEqual(hs.sync(), new[-5:])
+        self.assertEqual(list(log.read(self.eg.macid)), new)
+
+    def test_mark_ahead_of_store(self):
+        # the mark wins over a store without last_timestamp()
+        class Store :
+            def __init__(self) :
+                self.records = []
+
+            def append(self, macid, records) :
+                self.records.extend(records)
+
+        store = Store()
+        HistorySync(self.eg, path=self.dir, store=store).sync()
+        n = len(store.records)
+        HistorySync(self.eg, path=self.dir, store=store).sync()
+        self.assertEqual(len(store.records), n)
+
+    def test_meter_store(self):
+        store = MeterStore(self.dir)
+        hs = HistorySync(self.eg, path=self.dir, store=store)
+        new = hs.sync()
+        self.assertEqual(hs.sync(), [])
+        self.assertEqual([r.timestamp for r in store.range(self.eg.macid)],
+                         [r.timestamp for r in new])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+    Long running poller for one or more Eagle gateways
+
+    writes one JSON line per new meter reading to stdout
+"""
+from __future__ import print_function
+
+__author__ = "Peter Shipley"
+__version__ = "0.1.8"
+
+
+from RainEagle import Eagle, HTTPTransport
+from RainEagle.EagleSchedule import PollScheduler
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+
+debug = 0
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+                    description="poll power meters and print readings as JSON lines")
+
+    parser.add_argument("-a", "--address", dest="addrs", action="append",
+                    help="hostname or IP device ( may be repeated )")
+
+    parser.add_argument("-f", "--file", dest="file",
+                    help="file of gateways, one per line : "
+                         "addr [username password [macid]]")
+
+    parser.add_argument("-d", "--debug", dest="debug",
+                    default=debug, action="count",
+                    help="print debug info")
+
+    parser.add_argument("-s", "--password", dest="password",
+                    default=os.getenv('EAGLE_LOCAL_PASSWORD', None),
+                    help="Password for HTTP Authorization")
+
+    parser.add_argument("-u", "--username", dest="username",
+                    default=os.getenv('EAGLE_LOCAL_USERNAME', None),
+                    help="Username for HTTP Authorization")
+
+    parser.add_argument("-t", "--timeout", dest="timeout", type=float,
+                    default=10,
+                    help="Socket timeout")
+
+    parser.add_argument("--min-interval", dest="min_interval", type=float,
+                    default=5,
+                    help="shortest poll interval in seconds")
+
+    parser.add_argument("--max-interval", dest="max_interval", type=float,
+                    default=300,
+                    help="longest poll interval in seconds")
+
+    parser.add_argument("--jitter", dest="jitter", type=float,
+                    default=0.1,
+                    help="fraction of random jitter added to each interval")
+
+    parser.add_argument("--backoff-max", dest="backoff_max", type=float,
+                    default=900,
+                    help="longest delay after failed polls")
+
+    parser.add_argument("-w", "--workers", dest="workers", type=int,
+                    default=8,
+                    help="number of polling threads")
+
+    parser.add_argument("-v", '--version', action='version',
+                    version="%(prog)s {0}".format(__version__) )
+
+    return parser
+
+
+def read_gateways(args):
+    gateways = []
+    for addr in args.addrs or [] :
+        gateways.append({'addr': addr, 'username': args.username,
+                         'password': args.password})
+    if args.file :
+        with open(args.file) as fp :
+            for line in fp :
+                f = line.split('#', 1)[0].split()
+                if not f :
+                    continue
+                gw = {'addr': f[0], 'username': args.username,
+                      'password': args.password}
+                if len(f) >= 3 :
+                    gw['username'], gw['password'] = f[1], f[2]
+                if len(f) >= 4 :
+                    gw['macid'] = f[3]
+                gateways.append(gw)
+    if not gateways and os.getenv('EAGLE_ADDR') :
+        gateways.append({'addr': os.getenv('EAGLE_ADDR'),
+                         'username': args.username,
+                         'password': args.password})
+    return gateways
+
+
+def main() :
+
+    parser = create_parser()
+    args = parser.parse_args()
+
+    gateways = read_gateways(args)
+    if not gateways :
+        parser.error("no gateways given")
+
+    out = sys.stdout
+    if args.debug :
+        # the debug output of Eagle is printed, keep it
+        # out of the JSON lines
+        sys.stdout = sys.stderr
+
+    transport = HTTPTransport(maxsize=1, timeout=args.timeout)
+    eagles = [Eagle(lazy=True, debug=args.debug, timeout=args.timeout,
+                    transport=transport, **gw) for gw in gateways]
+
+    lock = threading.Lock()
+
+    def emit(eg, r) :
+        line = json.dumps({
+            'addr': eg.addr,
+            'macid': eg.macid,
+            'time': int(time.time()),
+            'demand': r.get('demand'),
+            'demand_timestamp': r.get('demand_timestamp'),
+            'summation_delivered': r.get('summation_delivered'),
+            'summation_received': r.get('summation_received'),
+        }, separators=(',', ':'))
+        with lock :
+            out.write(line + "\n")
+            out.flush()
+
+    def failed(eg, e) :
+        if args.debug :
+            sys.stderr.write("{0} : {1!r}\n".format(eg.addr, e))
+
+    sched = PollScheduler(eagles, callback=emit, errback=failed,
+                          min_interval=args.min_interval,
+                          max_interval=args.max_interval,
+                          jitter=args.jitter,
+                          backoff_max=args.backoff_max,
+                          workers=args.workers)
+
+    def shutdown(signum, frame) :
+        sched.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    sched.run()
+    transport.close()
+    exit(0)
+
+
+#
+if __name__ == "__main__":
+    main()
+    exit(0)
@@ -1,18 +1,25 @@
-#!/usr/local/bin/python2.7
+#!/usr/bin/env python
 """
     A simple script get current meter values
+
+    with --watch INTERVAL it keeps running and writes one JSON line
+    per new meter reading:
+
+        {"timestamp":1394422200,"demand":0.5,"amps":2.083,"delivered":2224.0,"received":154.0}
 """
+from __future__ import print_function
 
 __author__ = "Peter Shipley"
 __version__ = "0.1.8"
 
 
 # import RainEagle
-from RainEagle import Eagle, to_epoch_1970
+from RainEagle import Eagle, decode_summation, decode_demand
+import sys
 import time
 import os
+import json
 import argparse
-from pprint import pprint
 
 debug = 0
 
@@ -33,18 +40,33 @@ def create_parser():
                     default=debug, action="count",
                     help="print debug info")
 
-    parser.add_argument("-m", "--mac", dest="mac",
+    parser.add_argument("-m", "--mac", dest="macid",
                     help="Eagle radio mac addrress")
     
     parser.add_argument("-s", "--password", dest="password",
                     help="Password for HTTP Authorization")
 
-    parser.add_argument("-t", "--timeout", dest="timeout",
+    parser.add_argument("-t", "--timeout", dest="timeout", type=float,
+                    default=10,
                     help="Socket timeout")
     
     parser.add_argument("-u", "--username", dest="username",
                     help="Username for HTTP Authorization")
 
+    parser.add_argument("--no-check-firmware", dest="checkfirmware",
+                    default=True, action="store_false",
+                    help="don't warn if the device firmware is outdated")
+
+    parser.add_argument("--no-identity-cache", dest="identity_cache",
+                    default=True, action="store_false",
+                    help="always look up the device macid "
+                         "( see RainEagle.IdentityCache )")
+
+    parser.add_argument("-w", "--watch", dest="watch", type=float,
+                    metavar="INTERVAL",
+                    help="poll every INTERVAL seconds, "
+                         "printing a JSON line per new reading")
+
     parser.add_argument("-v", '--version', action='version',
                     version="%(prog)s {0}".format(__version__) )
 
@@ -59,78 +81,105 @@ def main() :
     # print "Args = ", args, vars(args)
     # print "unknown = ", unknown
 
-    eg = Eagle(**vars(args))
+    eagle_args = vars(args)
+    interval = eagle_args.pop('watch')
+
+    # lazy : the macid comes from the identity cache
+    # or is looked up along with the first command
+    eg = Eagle(lazy=True, **eagle_args)
     # timeout=45,
 
+    if interval :
+        try :
+            watch(eg, interval)
+        except KeyboardInterrupt :
+            pass
+        finally :
+            eg.close()
+        exit(0)
+
     r = eg.get_device_data()
 
     print_instantdemand(r['InstantaneousDemand'])
-    print
+    print()
 
     print_currentsummation(r['CurrentSummation'])
-    print
+    print()
 
     exit(0)
 
 
-def twos_comp(val, bits=32):
-    """compute the 2's compliment of int value val"""
-    if( (val&(1<<(bits-1))) != 0 ):
-        val = val - (1<<bits)
-    return val
+def reading(usage) :
+    """
+        compact dict of a get_usage_data() result
+    """
+    demand = float(usage['demand'])
+    return {'timestamp': int(usage['demand_timestamp']),
+            'demand': demand,
+            'amps': round((demand * 1000) / 240, 3),
+            'delivered': float(usage['summation_delivered']),
+            'received': float(usage['summation_received'])}
+
+
+def watch(eg, interval, out=None) :
+    """
+        poll get_usage_data every interval seconds and write a JSON
+        line each time the meter timestamp has advanced
+
+        get_usage_data has the demand and both summations in one
+        request over the kept alive HTTP connection, where the
+        socket api would connect again for every command
+
+        errors talking to the device or decoding its reply are
+        reported on stderr and the next poll goes ahead
+    """
+    from xml.etree.ElementTree import ParseError
+    from http.client import HTTPException
+    out = out or sys.stdout
+    last = None
+    next_poll = time.monotonic()
+    while True :
+        try :
+            rec = reading(eg.get_usage_data())
+            if rec['timestamp'] != last :
+                last = rec['timestamp']
+                # one write per reading, flushed so readers of a pipe
+                # see each line as it comes
+                out.write(json.dumps(rec, separators=(',', ':')) + "\n")
+                out.flush()
+        except (IOError, KeyError, RuntimeError, TypeError, ValueError,
+                ParseError, HTTPException) as e :
+            print("meter_status: {0!r}".format(e), file=sys.stderr)
+
+        next_poll += interval
+        delay = next_poll - time.monotonic()
+        if delay > 0 :
+            time.sleep(delay)
+        else :
+            # fell behind ( slow device ), don't burst to catch up
+            next_poll = time.monotonic()
 
 
 def print_currentsummation(cs) :
 
-    multiplier = int(cs['Multiplier'], 16)
-    divisor = int(cs['Divisor'], 16)
-    delivered = int(cs['SummationDelivered'], 16)
-    received = int(cs['SummationReceived'], 16)
-
-    if multiplier == 0 :
-        multiplier = 1
-
-    if divisor == 0 :
-        divisor = 1
+    rec = decode_summation(cs)
 
-    reading_received = received * multiplier / float (divisor)
-    reading_delivered = delivered * multiplier / float (divisor)
-
-    if 'TimeStamp' in cs :
-        time_stamp = to_epoch_1970(cs['TimeStamp'])
-        print "{0:s} : ".format(time.asctime(time.localtime(time_stamp)))
-    print "\tReceived  = {0:10.3f} Kw".format(reading_received)
-    print "\tDelivered = {0:10.3f} Kw".format(reading_delivered)
-    print "\tMeter     = {0:10.3f} Kw".format( (reading_delivered - reading_received))
+    if rec.timestamp is not None :
+        print("{0:s} : ".format(time.asctime(time.localtime(rec.timestamp))))
+    print("\tReceived  = {0:10.3f} Kw".format(rec.received))
+    print("\tDelivered = {0:10.3f} Kw".format(rec.delivered))
+    print("\tMeter     = {0:10.3f} Kw".format((rec.delivered - rec.received)))
 
 
 def print_instantdemand(idemand) :
 
+    rec = decode_demand(idemand)
 
-    multiplier = int(idemand['Multiplier'], 16)
-    divisor = int(idemand['Divisor'], 16)
-
-#    demand = twos_comp(int(idemand['Demand'], 16))
-
-    demand = int(idemand['Demand'], 16)
-
-    if demand > 0x7FFFFFFF:
-        demand -= 0x100000000
-
-    if multiplier == 0 :
-        multiplier = 1
-
-    if divisor == 0 :
-        divisor = 1
-
-    reading = (demand * multiplier) / float (divisor)
-
-    if 'TimeStamp' in idemand :
-        time_stamp = to_epoch_1970(idemand['TimeStamp'])
-        print "{0:s} : ".format(time.asctime(time.localtime(time_stamp)))
+    if rec.timestamp is not None :
+        print("{0:s} : ".format(time.asctime(time.localtime(rec.timestamp))))
 
-    print "\tDemand    = {0:10.3f} Kw".format(reading)
-    print "\tAmps      = {0:10.3f}".format( ((reading * 1000) / 240))
+    print("\tDemand    = {0:10.3f} Kw".format(rec.demand))
+    print("\tAmps      = {0:10.3f}".format(((rec.demand * 1000) / 240)))
 
 
 #
@@ -23,7 +23,7 @@ setup(
     author='Peter Shipley',
     author_email='Peter.Shipley@gmail.com',
     packages=find_packages(),
-    scripts=[ 'bin/meter_status.py', 'bin/plot_power.py' ],
+    scripts=[ 'bin/meter_status.py', 'bin/plot_power.py', 'bin/eagle_daemon.py' ],
     data_files=[
         ('examples', ['bin/plot_power.py', 'bin/gnup_poweruse.txt']),
         ('bin', ['bin/meter_status.py']) ],